@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Tool-call latency with a new bigquery.Client() per call vs the shared, warm client.
+
+Each "call" does what a tool does before its job finishes: get a client and run a tiny
+parameterised query against the travel_requests table (LIMIT 0, no bytes billed beyond
+the 10 MB minimum of an on-demand query). The first call is reported separately because
+that is where credential discovery and the TLS handshake land.
+
+Needs Application Default Credentials with access to the table:
+    gcloud auth application-default login
+    python adk-agents/bench/bench_bigquery_client.py --calls 10 --json results.json
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import sys
+import time
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build-travel-agent")
+sys.path.insert(0, AGENT_DIR)
+bigquery_client = importlib.import_module("travel-agent.bigquery_client")
+from google.cloud import bigquery  # noqa: E402
+
+QUERY = f"SELECT request_id FROM `{bigquery_client.TABLE_REF_STR}` WHERE status = @status LIMIT 0"
+
+def tool_call(get_client):
+    started = time.perf_counter()
+    client = get_client()
+    job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("status", "STRING", "Aprobada")])
+    client.query(QUERY, job_config=job_config).result()
+    return (time.perf_counter() - started) * 1000
+
+def measure(label, get_client, calls):
+    latencies = [tool_call(get_client) for _ in range(calls)]
+    rest = latencies[1:] or latencies
+    result = {
+        "mode": label,
+        "first_call_ms": round(latencies[0], 1),
+        "median_ms": round(statistics.median(rest), 1),
+        "max_ms": round(max(rest), 1),
+    }
+    print(f"{label:>10} first={result['first_call_ms']:>8.1f} ms  median={result['median_ms']:>8.1f} ms  max={result['max_ms']:>8.1f} ms")
+    return result
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=10)
+    parser.add_argument("--json", dest="json_output", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = [measure("per-call", lambda: bigquery.Client(project=bigquery_client.BIGQUERY_PROJECT_ID), args.calls)]
+    warm_up_ms = bigquery_client.warm_up()
+    results.append(measure("shared", bigquery_client.get_bigquery_client, args.calls))
+
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump({"calls": args.calls, "warm_up_ms": warm_up_ms, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Cold start of the ADK server: time from process launch to the first answered request.
+
+Launches `python -m uvicorn main:app` from build-travel-agent/ --runs times per
+configuration (web UI on and off, see SERVE_WEB_INTERFACE in main.py) and measures:
+    ready          first successful GET /list-apps (the app is imported and serving)
+    first_session  ready + creation of the first session (opens the session database)
+    first_run      first_session + one /run answered by the intent router (loads the
+                   agent; no model call, so no credentials are needed)
+Each run uses the SQLite storage backend and a fresh session database in a temporary
+directory, with the BigQuery warm-up disabled. Reports median and p95 of each, plus the
+startup phases the server logged (see startup_profile.py) for the last run. If /run fails
+(for instance an ADK release that rejects the app name), the error is reported and the
+other measurements are kept.
+
+--importtime runs `python -X importtime -c "import main"` once and lists the modules with
+the highest cumulative import time.
+
+    python adk-agents/bench/bench_cold_start.py --runs 5
+    python adk-agents/bench/bench_cold_start.py --importtime --json results.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build-travel-agent")
+APP_NAME = "travel-agent"
+FIRST_MESSAGE = "¿Cuántas solicitudes aprobadas hay?"
+POLL_INTERVAL_SECONDS = 0.02
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def http(method, url, body=None, timeout=30):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read() or b"null")
+
+def server_env(work_dir, web):
+    env = dict(os.environ)
+    env.update({
+        "TRAVEL_STORAGE_BACKEND": "sqlite",
+        "SQLITE_DB_PATH": os.path.join(work_dir, "travel_requests.db"),
+        "SESSION_SERVICE_URI": f"sqlite:///{os.path.join(work_dir, 'sessions.db')}",
+        "SERVE_WEB_INTERFACE": "true" if web else "false",
+        "WARM_UP_BIGQUERY": "false",
+        "TOOL_TELEMETRY_LOG_EVENTS": "false",
+        "PYTHONUNBUFFERED": "1",
+    })
+    env.setdefault("GOOGLE_API_KEY", "cold-start-bench")  # Never used: the router answers without the model
+    return env
+
+def read_startup_profile(log_path):
+    with open(log_path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if '"startup_profile"' in line:
+                try:
+                    return json.loads(line)
+                except ValueError:
+                    return None
+    return None
+
+def cold_start(web, timeout):
+    work_dir = tempfile.mkdtemp(prefix="travel-cold-start-")
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    log_path = os.path.join(work_dir, "server.log")
+    with open(log_path, "w") as log:
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+            cwd=AGENT_DIR, env=server_env(work_dir, web), stdout=log, stderr=subprocess.STDOUT,
+        )
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server.returncode}, see {log_path}")
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError(f"Server not ready after {timeout}s, see {log_path}")
+            try:
+                http("GET", f"{base_url}/list-apps", timeout=1)
+                break
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(POLL_INTERVAL_SECONDS)
+        result = {"ready_ms": round((time.perf_counter() - started) * 1000, 1)}
+        session = http("POST", f"{base_url}/apps/{APP_NAME}/users/bench/sessions", {})
+        result["first_session_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        try:
+            http("POST", f"{base_url}/run", {
+                "app_name": APP_NAME, "user_id": "bench", "session_id": session["id"],
+                "new_message": {"role": "user", "parts": [{"text": FIRST_MESSAGE}]},
+            })
+            result["first_run_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        except urllib.error.HTTPError as e:
+            result["first_run_error"] = f"{e.code} {e.read().decode('utf-8', 'replace')[:200]}"
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    result["startup_profile"] = read_startup_profile(log_path)
+    return result
+
+def summarize(label, runs, metric):
+    values = [run[metric] for run in runs if metric in run]
+    if not values: return {}
+    return {f"{label}_p50_ms": round(statistics.median(values), 1), f"{label}_p95_ms": round(percentile(values, 0.95), 1)}
+
+def run_config(web, args):
+    label = "web-ui" if web else "api-only"
+    runs = [cold_start(web, args.timeout) for _ in range(args.runs)]
+    result = {"config": label}
+    for metric in ("ready", "first_session", "first_run"):
+        result.update(summarize(metric, runs, f"{metric}_ms"))
+    errors = sorted({run["first_run_error"] for run in runs if "first_run_error" in run})
+    if errors: result["first_run_errors"] = errors
+    result["startup_profile"] = runs[-1]["startup_profile"]
+    print(f"{label:>8}  " + "  ".join(
+        f"{metric} p50={result[f'{metric}_p50_ms']:.1f} p95={result[f'{metric}_p95_ms']:.1f} ms"
+        for metric in ("ready", "first_session", "first_run") if f"{metric}_p50_ms" in result
+    ))
+    for error in errors:
+        print(f"{'':>10}/run failed: {error}")
+    for phase in (result["startup_profile"] or {}).get("phases", []):
+        print(f"{'':>10}{phase['phase']:<22} {phase['ms']:>7.1f} ms  {phase['modules_imported']:>5} modules")
+    return result
+
+def import_time(top):
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=AGENT_DIR,
+        env=server_env(tempfile.mkdtemp(prefix="travel-cold-start-"), web=False), capture_output=True, text=True,
+    ).stderr
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line: continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append({"module": name.strip(), "cumulative_ms": round(int(cumulative_us) / 1000, 1), "self_ms": round(int(self_us) / 1000, 1)})
+    modules.sort(key=lambda module: module["cumulative_ms"], reverse=True)
+    print("Slowest imports (cumulative):")
+    for module in modules[:top]:
+        print(f"  {module['cumulative_ms']:>8.1f} ms  {module['module']}")
+    return modules[:top]
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts per configuration")
+    parser.add_argument("--configs", nargs="+", choices=["web-ui", "api-only"], default=["web-ui", "api-only"])
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for the server to become ready")
+    parser.add_argument("--importtime", action="store_true", help="Also list the slowest imports of main.py")
+    parser.add_argument("--top", type=int, default=25, help="Modules listed with --importtime")
+    parser.add_argument("--json", dest="json_output", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = [run_config(config == "web-ui", args) for config in args.configs]
+    imports = import_time(args.top) if args.importtime else None
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump({"runs": args.runs, "results": results, "slowest_imports": imports}, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Concurrent sessions on one instance: synchronous tools vs the async tool versions.
+
+Every session issues --calls status lookups in a row through ADK's FunctionTool, all on a
+single event loop (as under uvicorn). With synchronous tools each BigQuery job blocks the
+loop, so sessions run one after another; the async versions wait in the tool executor and the
+loop keeps serving the other sessions, up to BIGQUERY_MAX_CONCURRENT_JOBS jobs at a time.
+A heartbeat task measures event-loop lag (how late a 10 ms timer fires).
+
+The in-memory index and the status-query cache are disabled so every call runs a job.
+By default the jobs go to the real table (needs Application Default Credentials):
+    python adk-agents/bench/bench_concurrent_sessions.py --sessions 1 8 32 --json results.json
+--stub-bigquery-ms replaces the BigQuery client with an in-process stub whose jobs take
+that long, to look at the event loop without credentials or slot noise:
+    python adk-agents/bench/bench_concurrent_sessions.py --stub-bigquery-ms 300
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ["TRAVEL_INDEX_ENABLED"] = "false"
+os.environ["STATUS_CACHE_ENABLED"] = "false"
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build-travel-agent")
+sys.path.insert(0, AGENT_DIR)
+agent = importlib.import_module("travel-agent.agent")
+async_tools = importlib.import_module("travel-agent.async_tools")
+bigquery_client = importlib.import_module("travel-agent.bigquery_client")
+from google.adk.tools import FunctionTool  # noqa: E402
+
+class _StubJob:
+    job_id = "stub"
+    errors = None
+    total_bytes_processed = 0
+    slot_millis = 0
+    cache_hit = False
+
+    def __init__(self, latency_s):
+        self._latency_s = latency_s
+
+    def result(self, **kwargs):
+        time.sleep(self._latency_s)  # blocks the thread, like the real client's HTTP wait
+        return []
+
+class _StubClient:
+    def __init__(self, latency_ms):
+        self._latency_s = latency_ms / 1000
+
+    def query(self, query, job_config=None):
+        return _StubJob(self._latency_s)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+async def heartbeat(lags, stop):
+    while not stop.is_set():
+        expected = time.perf_counter() + 0.01
+        await asyncio.sleep(0.01)
+        lags.append((time.perf_counter() - expected) * 1000)
+
+async def session(tool, calls, started, durations):
+    for _ in range(calls):
+        await tool.run_async(args={"search_term": "Aprobada"}, tool_context=None)
+    # Measured from when all sessions arrive, so it includes time spent waiting for the event loop
+    durations.append((time.perf_counter() - started) * 1000)
+
+async def run_mode(label, tool, sessions, calls):
+    durations, lags, stop = [], [], asyncio.Event()
+    jobs_before = bigquery_client.get_bigquery_job_stats()
+    monitor = asyncio.create_task(heartbeat(lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(session(tool, calls, started, durations) for _ in range(sessions)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+    jobs_after = bigquery_client.get_bigquery_job_stats()
+    result = {
+        "mode": label,
+        "sessions": sessions,
+        "calls_per_second": round(sessions * calls / elapsed, 1),
+        "session_p50_ms": round(statistics.median(durations), 1),
+        "session_p95_ms": round(percentile(durations, 0.95), 1),
+        "max_loop_lag_ms": round(max(lags), 1) if lags else round(elapsed * 1000, 1),
+        "queued_jobs": jobs_after["queued"] - jobs_before["queued"],
+    }
+    print(
+        f"{label:>6} sessions={sessions:>4}  {result['calls_per_second']:>7.1f} calls/s  "
+        f"session p50={result['session_p50_ms']:>8.1f} ms  p95={result['session_p95_ms']:>8.1f} ms  "
+        f"max loop lag={result['max_loop_lag_ms']:>8.1f} ms  queued jobs={result['queued_jobs']}"
+    )
+    return result
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--calls", type=int, default=3, help="Tool calls per session")
+    parser.add_argument("--stub-bigquery-ms", type=float, help="Use an in-process BigQuery stub with this job latency")
+    parser.add_argument("--json", dest="json_output", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.stub_bigquery_ms is not None:
+        bigquery_client._client = _StubClient(args.stub_bigquery_ms)
+    else:
+        bigquery_client.warm_up()
+
+    sync_tool = FunctionTool(agent.get_travel_requests_by_status)
+    async_tool = FunctionTool(async_tools.make_async_tool(agent.get_travel_requests_by_status))
+    results = []
+    for sessions in args.sessions:
+        results.append(asyncio.run(run_mode("sync", sync_tool, sessions, args.calls)))
+        results.append(asyncio.run(run_mode("async", async_tool, sessions, args.calls)))
+
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump({
+                "calls_per_session": args.calls,
+                "stub_bigquery_ms": args.stub_bigquery_ms,
+                "max_concurrent_jobs": bigquery_client.BIGQUERY_MAX_CONCURRENT_JOBS,
+                "tool_executor_workers": async_tools.TOOL_EXECUTOR_WORKERS,
+                "results": results,
+            }, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Per-turn input size and latency over a long session, with and without history compaction.
+
+Plays --turns status lookups in one session (the kind of session a manager keeps open all
+morning), once with the agent as-is and once without history compaction (see
+travel-agent/history_compaction.py): no summaries of past tool results and no summary of
+older turns. Reports, per turn, the prompt tokens the model received and the turn latency.
+Without compaction the prompt grows by a full page of tool JSON every turn; with it, it
+should stay roughly flat. Tools run against a temporary SQLite store seeded with --rows
+requests and the intent router is disabled, so every turn reaches the model.
+
+By default the model is Gemini (GOOGLE_API_KEY, or GOOGLE_GENAI_USE_VERTEXAI with Application
+Default Credentials). --dry-run uses an in-process stub that calls the status tool on every
+turn and estimates tokens at 4 characters per token, without credentials:
+    python adk-agents/bench/bench_history_compaction.py --dry-run --turns 30
+    python adk-agents/bench/bench_history_compaction.py --turns 20 --json results.json
+"""
+import argparse
+import asyncio
+import datetime
+import importlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+os.environ["TRAVEL_STORAGE_BACKEND"] = "sqlite"
+os.environ["SQLITE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="travel-bench-"), "travel_requests.db")
+os.environ["INTENT_ROUTER_ENABLED"] = "false"
+os.environ["STATUS_CACHE_ENABLED"] = "false"
+os.environ["TOOL_TELEMETRY_LOG_EVENTS"] = "false"
+os.environ["CONTEXT_CACHE_ENABLED"] = "false"
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build-travel-agent")
+sys.path.insert(0, AGENT_DIR)
+agent = importlib.import_module("travel-agent.agent")
+storage = importlib.import_module("travel-agent.storage")
+history_compaction = importlib.import_module("travel-agent.history_compaction")
+from google.adk.apps import App  # noqa: E402
+from google.adk.apps.app import EventsCompactionConfig  # noqa: E402
+from google.adk.models import BaseLlm, LlmResponse  # noqa: E402
+from google.adk.runners import InMemoryRunner  # noqa: E402
+from google.genai import types  # noqa: E402
+
+STATUSES = ["Registrada", "Pendiente de Aprobación", "Aprobada", "Rechazada", "Reservada", "Completada", "Cancelada"]
+CITIES = ["Madrid", "Barcelona", "Sevilla", "Valencia", "Bilbao", "Lisboa", "París", "Londres"]
+SEARCH_TERMS = ["Aprobada", "pendientes", "Cancelada", "Reservada", "Rechazada"]
+
+def seed_store(rows):
+    store = storage.get_store()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for n in range(rows):
+        start = datetime.date(2027, 1, 1) + datetime.timedelta(days=random.randrange(300))
+        store.insert_request({
+            "request_id": str(uuid.uuid4()), "timestamp": now - datetime.timedelta(seconds=n),
+            "employee_first_name": "Bench", "employee_last_name": "Bench", "employee_id": f"EMP{n % 200:04d}",
+            "origin_city": random.choice(CITIES), "destination_city": random.choice(CITIES),
+            "start_date": start.isoformat(), "end_date": (start + datetime.timedelta(days=3)).isoformat(),
+            "transport_mode": random.choice(["Avión", "Tren", "Coche"]), "car_type": None,
+            "reason": "Reunión trimestral con el equipo comercial de la delegación", "status": random.choice(STATUSES),
+        })
+
+def request_chars(llm_request):
+    system = str(llm_request.config.system_instruction or "")
+    contents = json.dumps([content.model_dump(exclude_none=True) for content in llm_request.contents], ensure_ascii=False, default=str)
+    return len(system) + len(contents)
+
+class _StubModel(BaseLlm):
+    """Calls the status tool for every user message and answers with a fixed text once it has the result."""
+    model: str = "stub"
+    requests: list = []
+
+    async def generate_content_async(self, llm_request, stream=False):
+        tokens = request_chars(llm_request) // 4
+        self.requests.append(tokens)
+        usage = types.GenerateContentResponseUsageMetadata(prompt_token_count=tokens, candidates_token_count=10)
+        # The per-request instruction (see _dynamic_instruction in agent.py) may follow the last message
+        last_part = next(
+            part for content in reversed(llm_request.contents) for part in content.parts
+            if part.function_response or (part.text or "").startswith("Muéstrame")
+        ) if llm_request.config.tools else None
+        if not llm_request.config.tools:
+            # History summarization request (see EventsCompactionConfig)
+            reply = types.Part(text="Resumen: el usuario consultó solicitudes por estado.")
+        elif last_part.function_response is None:
+            term = last_part.text.rsplit(" ", 1)[-1]
+            reply = types.Part(function_call=types.FunctionCall(name="get_travel_requests_by_status", args={"search_term": term}))
+        else:
+            reply = types.Part(text="Aquí tienes las solicitudes.")
+        yield LlmResponse(content=types.Content(role="model", parts=[reply]), usage_metadata=usage)
+
+async def run_mode(label, compaction_config, stub, turns):
+    root_agent = agent.company_travel_agent
+    updates = {} if compaction_config else {"before_model_callback": None}
+    if stub is not None: updates["model"] = stub
+    root_agent = root_agent.clone(update=updates)
+    app = App(name="travel-agent", root_agent=root_agent, events_compaction_config=compaction_config)
+    runner = InMemoryRunner(app=app)
+    session = await runner.session_service.create_session(app_name="travel-agent", user_id="bench")
+    results = []
+    for number in range(1, turns + 1):
+        message = types.Content(role="user", parts=[types.Part(text=f"Muéstrame las solicitudes {SEARCH_TERMS[number % len(SEARCH_TERMS)]}")])
+        prompt_tokens = []
+        started = time.perf_counter()
+        async for event in runner.run_async(user_id="bench", session_id=session.id, new_message=message):
+            if event.usage_metadata and event.author == root_agent.name:
+                prompt_tokens.append(event.usage_metadata.prompt_token_count or 0)
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        turn = {"turn": number, "model_calls": len(prompt_tokens), "prompt_tokens": sum(prompt_tokens), "latency_ms": latency_ms}
+        results.append(turn)
+        print(f"{label:>13} turn {number:>3}  calls={turn['model_calls']}  prompt={turn['prompt_tokens']:>7}  latency={latency_ms:>8.1f} ms")
+    first, last = results[0], results[-1]
+    growth = round(last["prompt_tokens"] / first["prompt_tokens"], 2) if first["prompt_tokens"] else None
+    peak = max(turn["prompt_tokens"] for turn in results)
+    print(f"{label:>13} last/first prompt tokens: {growth}  peak: {peak}")
+    return {"mode": label, "turns": results, "prompt_growth": growth, "peak_prompt_tokens": peak}
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=500, help="Synthetic requests seeded into SQLite")
+    parser.add_argument("--token-threshold", type=int, default=history_compaction.HISTORY_COMPACTION_TOKEN_THRESHOLD,
+                        help="Prompt tokens that trigger a summary of older turns")
+    parser.add_argument("--retained-events", type=int, default=history_compaction.HISTORY_COMPACTION_RETAINED_EVENTS,
+                        help="Recent events kept verbatim when older turns are summarized")
+    parser.add_argument("--dry-run", action="store_true", help="Use a stub model and estimate tokens from request sizes")
+    parser.add_argument("--json", dest="json_output", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    random.seed(42)
+    seed_store(args.rows)
+    compaction_config = EventsCompactionConfig(token_threshold=args.token_threshold, event_retention_size=args.retained_events)
+    results = [
+        asyncio.run(run_mode(label, config, _StubModel() if args.dry_run else None, args.turns))
+        for label, config in (("no-compaction", None), ("compaction", compaction_config))
+    ]
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump({
+                "model": agent.MODEL_ID, "dry_run": args.dry_run, "turns": args.turns,
+                "token_threshold": args.token_threshold, "retained_events": args.retained_events,
+                "results": results,
+            }, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
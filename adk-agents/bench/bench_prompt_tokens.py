@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Input tokens and latency per turn: monolithic prompt vs static prefix + dynamic suffix.
+
+Plays the same scripted conversation through three layouts of the travel agent:
+  monolithic   the whole prompt (with today's date) as one system instruction, no caching
+  split        static system instruction + per-request date in the contents, no caching
+  split+cache  as split, with the App's model-side context cache (see CONTEXT_CACHE_* in agent.py)
+and reports, per turn, the prompt tokens sent, how many of them the model served from the
+cache and the turn latency, as reported by the model's usage metadata. Needs Gemini
+credentials (GOOGLE_API_KEY, or GOOGLE_GENAI_USE_VERTEXAI with Application Default
+Credentials). Tools run against a temporary SQLite store and the intent router is disabled,
+so every turn reaches the model.
+
+--dry-run replaces the model with an in-process stub and reports the size of each request
+instead (characters, and tokens estimated at 4 characters per token), without credentials:
+    python adk-agents/bench/bench_prompt_tokens.py --dry-run
+    python adk-agents/bench/bench_prompt_tokens.py --json results.json
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ["TRAVEL_STORAGE_BACKEND"] = "sqlite"
+os.environ["SQLITE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="travel-bench-"), "travel_requests.db")
+os.environ["INTENT_ROUTER_ENABLED"] = "false"
+os.environ["TOOL_TELEMETRY_LOG_EVENTS"] = "false"
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build-travel-agent")
+sys.path.insert(0, AGENT_DIR)
+agent = importlib.import_module("travel-agent.agent")
+from google.adk.agents.context_cache_config import ContextCacheConfig  # noqa: E402
+from google.adk.apps import App  # noqa: E402
+from google.adk.models import BaseLlm, LlmResponse  # noqa: E402
+from google.adk.runners import InMemoryRunner  # noqa: E402
+from google.genai import types  # noqa: E402
+
+TURNS = [
+    "Hola, ¿qué puedes hacer por mí?",
+    "¿Qué solicitudes aprobadas hay?",
+    "¿Cuántas solicitudes pendientes hay?",
+    "Quiero registrar un viaje de Madrid a Lisboa del 10 al 12 de diciembre",
+    "¿Qué estados puede tener una solicitud?",
+    "Gracias, eso es todo",
+]
+
+def layouts():
+    monolithic = agent.company_travel_agent.clone(update={
+        "static_instruction": None,
+        "instruction": agent.TRAVEL_AGENT_STATIC_INSTRUCTION + "\n" + agent._dynamic_instruction(None),
+    })
+    cache = ContextCacheConfig(
+        cache_intervals=agent.CONTEXT_CACHE_INTERVALS,
+        ttl_seconds=agent.CONTEXT_CACHE_TTL_SECONDS,
+        min_tokens=agent.CONTEXT_CACHE_MIN_TOKENS,
+    )
+    return [
+        ("monolithic", monolithic, None),
+        ("split", agent.company_travel_agent, None),
+        ("split+cache", agent.company_travel_agent, cache),
+    ]
+
+class _StubModel(BaseLlm):
+    """Answers every request with a fixed text and records its size."""
+    model: str = "stub"
+    requests: list = []
+
+    async def generate_content_async(self, llm_request, stream=False):
+        system = str(llm_request.config.system_instruction or "")
+        tools = json.dumps([tool.model_dump(exclude_none=True) for tool in llm_request.config.tools or []], default=str)
+        contents = "".join(part.text or "" for content in llm_request.contents for part in content.parts or [])
+        self.requests.append({"system_chars": len(system), "tools_chars": len(tools), "contents_chars": len(contents)})
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text="De acuerdo.")]))
+
+async def run_layout(label, root_agent, cache_config, stub):
+    if stub is not None:
+        root_agent = root_agent.clone(update={"model": stub})
+    runner = InMemoryRunner(app=App(name="travel-agent", root_agent=root_agent, context_cache_config=cache_config))
+    session = await runner.session_service.create_session(app_name="travel-agent", user_id="bench")
+    turns = []
+    for number, text in enumerate(TURNS, start=1):
+        turn = {"turn": number, "model_calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0}
+        if stub is not None: stub.requests.clear()
+        started = time.perf_counter()
+        message = types.Content(role="user", parts=[types.Part(text=text)])
+        async for event in runner.run_async(user_id="bench", session_id=session.id, new_message=message):
+            usage = event.usage_metadata
+            if usage is None: continue
+            turn["model_calls"] += 1
+            turn["prompt_tokens"] += usage.prompt_token_count or 0
+            turn["cached_tokens"] += usage.cached_content_token_count or 0
+            turn["output_tokens"] += usage.candidates_token_count or 0
+        turn["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if stub is not None:
+            turn["model_calls"] = len(stub.requests)
+            for key in ("system_chars", "tools_chars", "contents_chars"):
+                turn[key] = sum(request[key] for request in stub.requests)
+            # Without caching every character is billed again on each call
+            turn["prompt_tokens"] = (turn["system_chars"] + turn["tools_chars"] + turn["contents_chars"]) // 4
+            # System instruction and tool declarations are what the cache can hold
+            turn["cached_tokens"] = (turn["system_chars"] + turn["tools_chars"]) // 4 if cache_config and number > 1 else 0
+        turn["billed_input_tokens"] = turn["prompt_tokens"] - turn["cached_tokens"]
+        turns.append(turn)
+        print(
+            f"{label:>12} turn {number}  calls={turn['model_calls']}  prompt={turn['prompt_tokens']:>6}  "
+            f"cached={turn['cached_tokens']:>6}  billed={turn['billed_input_tokens']:>6}  latency={turn['latency_ms']:>8.1f} ms"
+        )
+    totals = {key: sum(turn[key] for turn in turns) for key in ("prompt_tokens", "cached_tokens", "billed_input_tokens")}
+    totals["latency_ms"] = round(sum(turn["latency_ms"] for turn in turns), 1)
+    print(f"{label:>12} total   prompt={totals['prompt_tokens']}  cached={totals['cached_tokens']}  "
+          f"billed={totals['billed_input_tokens']}  latency={totals['latency_ms']} ms")
+    return {"layout": label, "turns": turns, "totals": totals}
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Use a stub model and estimate tokens from request sizes")
+    parser.add_argument("--json", dest="json_output", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = [
+        asyncio.run(run_layout(label, root_agent, cache_config, _StubModel() if args.dry_run else None))
+        for label, root_agent, cache_config in layouts()
+    ]
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump({"model": agent.MODEL_ID, "dry_run": args.dry_run, "turns": TURNS, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
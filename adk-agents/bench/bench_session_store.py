@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Event appends and session loads per second: ADK's stock SQLite session store vs the tuned one.
+
+Runs --conversations concurrent conversations on one event loop, as under uvicorn. Every turn
+does what the ADK server does per /run: load the session, append the user message and append
+the agent's reply (a tool result of --payload-bytes and a text answer). Sessions grow turn by
+turn, so later loads read more events. Reports appends/s, loads/s, p50/p95 latency of each
+operation and the size of the database file for each store (see session_store.py). Each
+store gets a fresh database in a temporary directory.
+
+    python adk-agents/bench/bench_session_store.py --conversations 1 16 64 --turns 10
+    python adk-agents/bench/bench_session_store.py --json results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build-travel-agent")
+sys.path.insert(0, AGENT_DIR)
+import session_store  # noqa: E402
+from google.adk.events import Event  # noqa: E402
+from google.adk.sessions.sqlite_session_service import SqliteSessionService  # noqa: E402
+from google.genai import types  # noqa: E402
+
+APP_NAME = "travel-agent"
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def build_service(store, db_path):
+    if store == "stock":
+        return SqliteSessionService(db_path)
+    return session_store.TunedSqliteSessionService(db_path, eviction_interval_seconds=0)
+
+def turn_events(invocation_id, turn, payload):
+    return [
+        Event(invocation_id=invocation_id, author="user", content=types.Content(role="user", parts=[types.Part(text=f"Muéstrame las solicitudes aprobadas ({turn})")])),
+        Event(invocation_id=invocation_id, author="CompanyTravelAgent", content=types.Content(role="user", parts=[
+            types.Part(function_response=types.FunctionResponse(name="get_travel_requests_by_status", response={"result": payload})),
+        ])),
+        Event(invocation_id=invocation_id, author="CompanyTravelAgent", content=types.Content(role="model", parts=[types.Part(text="He encontrado 10 solicitudes.")])),
+    ]
+
+async def conversation(service, user_id, turns, payload, loads, appends):
+    session = await service.create_session(app_name=APP_NAME, user_id=user_id)
+    for turn in range(turns):
+        started = time.perf_counter()
+        session = await service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session.id)
+        loads.append((time.perf_counter() - started) * 1000)
+        for event in turn_events(f"inv-{user_id}-{turn}", turn, payload):
+            started = time.perf_counter()
+            await service.append_event(session, event)
+            appends.append((time.perf_counter() - started) * 1000)
+
+async def run_store(store, conversations, args):
+    db_path = os.path.join(tempfile.mkdtemp(prefix="travel-sessions-"), "sessions.db")
+    service = build_service(store, db_path)
+    payload = "x" * args.payload_bytes
+    loads, appends = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(conversation(service, f"user{n}", args.turns, payload, loads, appends) for n in range(conversations)))
+    elapsed = time.perf_counter() - started
+    if hasattr(service, "close"):
+        await service.close()
+    result = {
+        "store": store,
+        "conversations": conversations,
+        "appends_per_second": round(len(appends) / elapsed, 1),
+        "loads_per_second": round(len(loads) / elapsed, 1),
+        "append_p50_ms": round(statistics.median(appends), 2),
+        "append_p95_ms": round(percentile(appends, 0.95), 2),
+        "load_p50_ms": round(statistics.median(loads), 2),
+        "load_p95_ms": round(percentile(loads, 0.95), 2),
+        "db_bytes": os.path.getsize(db_path) + (os.path.getsize(db_path + "-wal") if os.path.exists(db_path + "-wal") else 0),
+    }
+    print(
+        f"{store:>6} conversations={conversations:>4}  appends/s={result['appends_per_second']:>8.1f}  "
+        f"loads/s={result['loads_per_second']:>7.1f}  append p50={result['append_p50_ms']:>6.2f} p95={result['append_p95_ms']:>7.2f} ms  "
+        f"load p50={result['load_p50_ms']:>6.2f} p95={result['load_p95_ms']:>7.2f} ms"
+    )
+    return result
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--turns", type=int, default=10, help="Turns per conversation")
+    parser.add_argument("--payload-bytes", type=int, default=4000, help="Size of the tool result stored each turn")
+    parser.add_argument("--stores", nargs="+", choices=["stock", "tuned"], default=["stock", "tuned"])
+    parser.add_argument("--json", dest="json_output", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = [asyncio.run(run_store(store, conversations, args)) for conversations in args.conversations for store in args.stores]
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump({"config": vars(args), "pool_size": session_store.SESSION_DB_POOL_SIZE, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
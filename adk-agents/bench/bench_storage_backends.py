@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Same tool workload against each storage backend (see travel-agent/storage.py).
+
+Runs --threads workers, each doing --iterations rounds of the read tools (a status page, a
+count and an employee lookup), and reports per-tool p50/p95 latency and throughput per
+backend. The in-memory index and the status-query cache are disabled so every call reaches
+the backend. The SQLite database is created in a temporary directory and seeded with
+--rows synthetic requests.
+
+--include-writes adds an insert and a status update per round. Against BigQuery that
+writes synthetic rows to the real table, so it is off by default.
+
+    python adk-agents/bench/bench_storage_backends.py --backends sqlite --threads 8
+    python adk-agents/bench/bench_storage_backends.py --backends sqlite bigquery --json results.json
+"""
+import argparse
+import collections
+import concurrent.futures
+import datetime
+import importlib
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+os.environ["TRAVEL_INDEX_ENABLED"] = "false"
+os.environ["STATUS_CACHE_ENABLED"] = "false"
+os.environ["TOOL_TELEMETRY_LOG_EVENTS"] = "false"
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build-travel-agent")
+sys.path.insert(0, AGENT_DIR)
+agent = importlib.import_module("travel-agent.agent")
+storage = importlib.import_module("travel-agent.storage")
+
+STATUSES = ["Registrada", "Pendiente de Aprobación", "Aprobada", "Rechazada", "Reservada", "Completada", "Cancelada"]
+CITIES = ["Madrid", "Barcelona", "Sevilla", "Valencia", "Bilbao", "Lisboa", "París", "Londres"]
+EMPLOYEES = [f"EMP{n:04d}" for n in range(200)]
+SEARCH_TERMS = ["Aprobada", "pendientes", "Cancelada", "Reservada"]
+
+def synthetic_request(timestamp):
+    start = datetime.date(2027, 1, 1) + datetime.timedelta(days=random.randrange(300))
+    return {
+        "request_id": str(uuid.uuid4()), "timestamp": timestamp,
+        "employee_first_name": "Bench", "employee_last_name": "Bench", "employee_id": random.choice(EMPLOYEES),
+        "origin_city": random.choice(CITIES), "destination_city": random.choice(CITIES),
+        "start_date": start.isoformat(), "end_date": (start + datetime.timedelta(days=3)).isoformat(),
+        "transport_mode": random.choice(["Avión", "Tren", "Coche"]), "car_type": None,
+        "reason": "bench", "status": random.choice(STATUSES),
+    }
+
+def build_store(backend, rows):
+    if backend == "bigquery":
+        return storage.BigQueryStore()
+    store = storage.SQLiteStore(os.path.join(tempfile.mkdtemp(prefix="travel-bench-"), "travel_requests.db"))
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for n in range(rows):
+        store.insert_request(synthetic_request(now - datetime.timedelta(seconds=n)))
+    return store
+
+def workload_round(include_writes, timings):
+    def timed(name, fn, *args):
+        started = time.perf_counter()
+        fn(*args)
+        timings[name].append((time.perf_counter() - started) * 1000)
+
+    timed("get_travel_requests_by_status", agent.get_travel_requests_by_status, random.choice(SEARCH_TERMS))
+    timed("count_travel_requests_by_status", agent.count_travel_requests_by_status, random.choice(SEARCH_TERMS))
+    timed("get_travel_requests_by_employee", agent.get_travel_requests_by_employee, random.choice(EMPLOYEES))
+    if include_writes:
+        row = synthetic_request(datetime.datetime.now(datetime.timezone.utc))
+        started = time.perf_counter()
+        storage.get_store().insert_request(row)
+        timings["insert_request"].append((time.perf_counter() - started) * 1000)
+        timed("update_travel_request_status", agent.update_travel_request_status, row["request_id"], "Aprobada")
+
+def run_backend(backend, args):
+    storage._store = build_store(backend, args.rows)
+    timings = collections.defaultdict(list)
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.threads) as pool:
+        for future in [pool.submit(workload_round, args.include_writes, timings) for _ in range(args.threads * args.iterations)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+    result = {"backend": backend, "calls_per_second": round(sum(len(v) for v in timings.values()) / elapsed, 1), "tools": {}}
+    print(f"{backend}: {result['calls_per_second']} calls/s")
+    for name, values in timings.items():
+        ordered = sorted(values)
+        result["tools"][name] = {
+            "p50_ms": round(statistics.median(ordered), 2),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        }
+        print(f"  {name:<34} p50={result['tools'][name]['p50_ms']:>9.2f} ms  p95={result['tools'][name]['p95_ms']:>9.2f} ms")
+    return result
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=["sqlite", "bigquery"], default=["sqlite"])
+    parser.add_argument("--rows", type=int, default=5000, help="Synthetic requests seeded into SQLite")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=25, help="Workload rounds per thread")
+    parser.add_argument("--include-writes", action="store_true")
+    parser.add_argument("--json", dest="json_output", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    random.seed(42)
+    results = [run_backend(backend, args) for backend in args.backends]
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
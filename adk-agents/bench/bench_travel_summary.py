@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Aggregated questions ("how many requests per status and destination?"): paging vs the summary tool.
+
+Seeds a temporary SQLite store with --rows requests and answers the same question two ways:
+    paging   what the model had to do before: page through get_travel_requests_by_status for
+             every status (page_size 50) and count the rows itself
+    summary  one get_travel_request_summary call (see travel-agent/travel_summary.py), first
+             when the summary table has to be built and then served from memory
+Reports tool calls, characters of tool output the model has to read (~4 per token) and
+wall time for each, and checks that both give the same counts. With BigQuery every paging
+call is also a query job, so the gap is wider than here.
+
+    python adk-agents/bench/bench_travel_summary.py --rows 500 5000
+    python adk-agents/bench/bench_travel_summary.py --json results.json
+"""
+import argparse
+import collections
+import datetime
+import importlib
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+os.environ["TRAVEL_STORAGE_BACKEND"] = "sqlite"
+os.environ["STATUS_CACHE_ENABLED"] = "false"
+os.environ["TOOL_TELEMETRY_LOG_EVENTS"] = "false"
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "build-travel-agent")
+sys.path.insert(0, AGENT_DIR)
+agent = importlib.import_module("travel-agent.agent")
+storage = importlib.import_module("travel-agent.storage")
+travel_summary = importlib.import_module("travel-agent.travel_summary")
+
+CITIES = ["Madrid", "Barcelona", "Sevilla", "Valencia", "Bilbao", "Lisboa", "París", "Londres", "Roma", "Berlín"]
+PAGE_SIZE = 50
+
+def seed_store(store, rows):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for n in range(rows):
+        start = datetime.date(2027, 1, 1) + datetime.timedelta(days=random.randrange(365))
+        store.insert_request({
+            "request_id": str(uuid.uuid4()), "timestamp": now - datetime.timedelta(seconds=n),
+            "employee_first_name": "Bench", "employee_last_name": "Bench", "employee_id": f"EMP{n % 200:04d}",
+            "origin_city": random.choice(CITIES), "destination_city": random.choice(CITIES),
+            "start_date": start.isoformat(), "end_date": (start + datetime.timedelta(days=3)).isoformat(),
+            "transport_mode": random.choice(["Avión", "Tren", "Autobús", "Coche"]), "car_type": None,
+            "reason": "Reunión trimestral con el equipo comercial de la delegación", "status": random.choice(agent.VALID_STATUSES),
+        })
+
+def by_paging():
+    calls = chars = 0
+    seen = {}  # request_id -> request: "Pendiente de Aprobación" also matches 'Registrada' (see _resolve_status_filter)
+    for status in agent.VALID_STATUSES:
+        cursor = None
+        while True:
+            result = agent.get_travel_requests_by_status(status, page_size=PAGE_SIZE, cursor=cursor, fields=["destination_city", "status"])
+            calls += 1
+            chars += len(result)
+            page = json.loads(result)
+            seen.update((request["request_id"], request) for request in page["requests"])
+            cursor = page.get("next_cursor")
+            if not cursor: break
+    by_status = collections.Counter(request["status"] for request in seen.values())
+    by_destination = collections.Counter(request["destination_city"] for request in seen.values())
+    return calls, chars, dict(by_status), dict(by_destination)
+
+def run(rows, repeats):
+    # A fresh store per row count (SQLITE_DB_PATH is read when storage.py is imported)
+    storage.SQLITE_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="travel-bench-"), "travel_requests.db")
+    storage._store = None
+    travel_summary._summary = None
+    seed_store(storage.get_store(), rows)
+
+    started = time.perf_counter()
+    calls, chars, paged_status, paged_destination = by_paging()
+    paging_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    result = agent.get_travel_request_summary(top=len(CITIES))
+    first_ms = (time.perf_counter() - started) * 1000
+    warm = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        agent.get_travel_request_summary(top=len(CITIES))
+        warm.append((time.perf_counter() - started) * 1000)
+    summary = json.loads(result)
+    matches = summary["by_status"] == paged_status and summary["by_destination_city"] == paged_destination
+
+    report = {
+        "rows": rows,
+        "paging": {"tool_calls": calls, "output_chars": chars, "wall_ms": round(paging_ms, 1)},
+        "summary": {"tool_calls": 1, "output_chars": len(result), "first_call_ms": round(first_ms, 2), "warm_p50_ms": round(statistics.median(warm), 3)},
+        "counts_match": matches,
+    }
+    print(
+        f"rows={rows:>6}  paging: calls={calls:>4} chars={chars:>9} wall={paging_ms:>8.1f} ms   "
+        f"summary: calls=1 chars={len(result):>5} first={first_ms:>6.2f} ms warm p50={report['summary']['warm_p50_ms']:.3f} ms   "
+        f"counts match: {matches}"
+    )
+    return report
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[500, 5000], help="Synthetic requests seeded into SQLite")
+    parser.add_argument("--repeats", type=int, default=50, help="Warm summary calls measured")
+    parser.add_argument("--json", dest="json_output", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    random.seed(42)
+    results = [run(rows, args.repeats) for rows in args.rows]
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump({"page_size": PAGE_SIZE, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,25 +1,61 @@
+import startup_profile # First, so the startup profile covers every import below
 import os
-import uvicorn
+import sys
+import time
+import json
+import importlib
+import threading
 from fastapi import FastAPI, Request, Response # Import Response
+startup_profile.mark("import_fastapi")
 from google.adk.cli.fast_api import get_fast_api_app
-import json
+startup_profile.mark("import_adk_fast_api")
+import session_store
+startup_profile.mark("import_session_store")
 
 # Get the directory where main.py is located
 AGENT_DIR = os.path.dirname(os.path.abspath(__file__))
-# Example session DB URL (e.g., SQLite)
-SESSION_DB_URL = "sqlite:///./sessions.db"
+# Session DB URL (e.g., SQLite); sqlite:// URLs use the tuned store in session_store.py
+SESSION_DB_URL = session_store.SESSION_SERVICE_URI
 # Example allowed origins for CORS
 ALLOWED_ORIGINS = ["http://localhost", "http://localhost:8080", "*"]
-# Set web=True if you intend to serve a web interface, False otherwise
-SERVE_WEB_INTERFACE = True # <-- Disable web interface
+# Set web=True if you intend to serve a web interface, False otherwise.
+# SERVE_WEB_INTERFACE=false in production skips mounting the ADK dev UI at startup.
+SERVE_WEB_INTERFACE = os.environ.get("SERVE_WEB_INTERFACE", "true").lower() == "true"
+
+# WAL, pooled connections, hot-session cache and TTL eviction (SESSION_STORE_TUNED=false for ADK's stock store)
+session_store.register_session_store()
 
 # Call the function to get the FastAPI app instance
 app: FastAPI = get_fast_api_app(
-    agent_dir=AGENT_DIR,
-    session_db_url=SESSION_DB_URL,
+    agents_dir=AGENT_DIR,
+    session_service_uri=SESSION_DB_URL,
     allow_origins=ALLOWED_ORIGINS,
     web=SERVE_WEB_INTERFACE,
 )
+startup_profile.mark("get_fast_api_app")
+
+def _agent_module(name):
+    # The package directory contains a hyphen, so it cannot be imported with a plain import statement
+    if AGENT_DIR not in sys.path: sys.path.insert(0, AGENT_DIR)
+    return importlib.import_module(f"travel-agent.{name}")
+
+# --- Storage warm-up ---
+# Creates the shared BigQuery client, fetches an access token and opens the HTTPS
+# connection at startup (or opens the local SQLite database, see storage.py), so the first
+# tool call does not pay for it inside a user turn.
+# Runs in a background thread: a failure (e.g. no credentials locally) never blocks startup.
+WARM_UP_BIGQUERY = os.environ.get("WARM_UP_BIGQUERY", "true").lower() == "true"
+
+def _warm_up_bigquery():
+    started = time.perf_counter()
+    _agent_module("storage").get_store().warm_up()
+    # Starts the bootstrap of the in-memory request index (no-op if TRAVEL_INDEX_ENABLED=false)
+    _agent_module("request_index").get_request_index()
+    # Off the startup path: ADK imports the agent package on the first request, so this also preloads it
+    startup_profile.mark("agent_warm_up", since=started)
+
+# Started at the end of this module, once the startup phases have been measured
+# -------------------------------------
 
 # --- Keep endpoint to inspect routes for debugging ---
 @app.get("/routes", tags=["Admin"], summary="List all registered API routes")
@@ -43,7 +79,64 @@ async def get_registered_routes():
     )
 # -------------------------------------
 
+# --- Per-tool execution profile ---
+@app.get("/stats/tools", tags=["Admin"], summary="Per-tool latency and BigQuery cost summary")
+async def get_tool_telemetry():
+    """Returns, for each tool: calls, errors, wall/queue time, BigQuery jobs, bytes processed,
+       slot-milliseconds, BigQuery cache hits and where reads were served from.
+       Individual calls are logged as structured "tool_call" events with the ADK session ID."""
+    summary = _agent_module("telemetry").get_tool_telemetry_summary()
+    return Response(content=json.dumps(summary, indent=2, default=str), media_type="application/json")
+# -------------------------------------
+
+# --- Session store ---
+@app.get("/stats/sessions", tags=["Admin"], summary="Session store cache, pool and eviction counters")
+async def get_session_store_stats():
+    """Returns hot-session cache hits/misses, appended events, pooled connections, sessions
+       deleted by TTL eviction and the size of the database file and its WAL."""
+    stats = session_store.get_session_store_stats()
+    return Response(content=json.dumps(stats, indent=2, default=str), media_type="application/json")
+# -------------------------------------
+
+# --- Tool data-path stats ---
+@app.get("/stats", tags=["Admin"], summary="Status-query cache, request index, travel summary, ingestion, intent-router, history-compaction and BigQuery job counters")
+async def get_tool_stats():
+    """Returns hit ratio / BigQuery bytes saved by the status-query cache, in-memory index
+       freshness, when the aggregated travel summary was last refreshed, write-behind
+       ingestion counters, how many turns the intent router answered without the model,
+       how much past tool output was compacted out of model requests and how often tool
+       jobs waited for a BigQuery slot."""
+    ingestion_buffer = _agent_module("ingestion").get_write_behind_buffer()
+    request_index = _agent_module("request_index").get_request_index()
+    stats = {
+        "storage_backend": _agent_module("storage").STORAGE_BACKEND,
+        "status_query_cache": _agent_module("query_cache").get_status_query_cache_stats(),
+        "request_index": request_index.stats() if request_index else {"enabled": False},
+        "travel_summary": _agent_module("travel_summary").get_travel_summary_stats(),
+        "ingestion": ingestion_buffer.stats() if ingestion_buffer else {"mode": "sync"},
+        "intent_router": _agent_module("intent_router").get_intent_router_stats(),
+        "history_compaction": _agent_module("history_compaction").get_history_compaction_stats(),
+        "bigquery_jobs": _agent_module("bigquery_client").get_bigquery_job_stats(),
+    }
+    return Response(content=json.dumps(stats, indent=2, default=str), media_type="application/json")
+# -------------------------------------
+
+# --- Startup profile ---
+@app.get("/stats/startup", tags=["Admin"], summary="Startup phase timings and imported packages")
+async def get_startup_profile():
+    """Returns interpreter start-up time, how long each startup phase of main.py took and which
+       packages it imported (also logged once at startup as a "startup_profile" entry)."""
+    return Response(content=json.dumps(startup_profile.get_startup_report(), indent=2, default=str), media_type="application/json")
+# -------------------------------------
+
+startup_profile.mark("admin_routes")
+startup_profile.log_report()
+
+if WARM_UP_BIGQUERY:
+    threading.Thread(target=_warm_up_bigquery, name="bigquery-warm-up", daemon=True).start()
+
 if __name__ == "__main__":
+    import uvicorn
     # Use the PORT environment variable provided by Cloud Run, defaulting to 8080
     print(f"Starting Uvicorn on 0.0.0.0:{os.environ.get('PORT', 8080)}")
     uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 8080)))
@@ -0,0 +1,259 @@
+# Session store for the ADK server: ADK's SQLite session service tuned for one long-lived instance.
+#
+# The stock service opens a new SQLite connection for every operation, uses the default
+# rollback journal (every event append is a synchronous write to local disk) and never
+# deletes anything, so sessions.db grows forever. TunedSqliteSessionService keeps the same
+# schema and behaviour and adds:
+# - WAL journal with synchronous=NORMAL and a busy timeout;
+# - a pool of persistent connections;
+# - a write-through LRU of hot sessions: a session loaded or created here stays in memory,
+#   each appended event is written to SQLite and then applied to the cached copy, and the
+#   next turn of the conversation is served without reading and re-parsing every event;
+# - a background thread that deletes sessions idle for longer than SESSION_TTL_SECONDS
+#   (their events go with them), returns the freed pages to the filesystem and truncates the WAL.
+#
+# The cache is per process: it is only coherent while this process is the only writer of the
+# database file, which is the case with the single uvicorn worker of the Dockerfile.
+import asyncio
+import collections
+import contextlib
+import copy
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from typing import Any, Dict, Optional
+
+import aiosqlite
+from google.adk.sessions import sqlite_session_service
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.adk.sessions.state import State
+
+SESSION_SERVICE_URI = os.environ.get("SESSION_SERVICE_URI", "sqlite:///./sessions.db")
+# Set to false to use ADK's stock SQLite session service
+SESSION_STORE_TUNED = os.environ.get("SESSION_STORE_TUNED", "true").lower() == "true"
+SESSION_DB_POOL_SIZE = int(os.environ.get("SESSION_DB_POOL_SIZE", "8"))
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "256"))  # Sessions kept in memory
+SESSION_TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))  # Idle time before a session is deleted
+SESSION_EVICTION_INTERVAL_SECONDS = int(os.environ.get("SESSION_EVICTION_INTERVAL_SECONDS", "600"))
+SESSION_EVICTION_BATCH = 500  # Sessions deleted per transaction, to keep the write lock short
+
+_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+)
+
+def _snapshot(session):
+    """Copy of a session that can be handed out or cached without sharing its mutable parts.
+    Events are not modified once appended, so the list is copied but the events are shared."""
+    return session.model_copy(update={"events": list(session.events), "state": copy.deepcopy(session.state)})
+
+class TunedSqliteSessionService(sqlite_session_service.SqliteSessionService):
+    def __init__(self, db_path: str, pool_size: int = SESSION_DB_POOL_SIZE, cache_size: int = SESSION_CACHE_SIZE,
+                 ttl_seconds: int = SESSION_TTL_SECONDS, eviction_interval_seconds: int = SESSION_EVICTION_INTERVAL_SECONDS):
+        super().__init__(db_path)
+        self._pool_size = pool_size
+        self._cache_size = cache_size
+        self._ttl_seconds = ttl_seconds
+        self._idle_connections = []
+        self._pool_slots = None  # asyncio.Semaphore, created on first use inside the server's event loop
+        self._lock = threading.Lock()
+        self._sessions = collections.OrderedDict()  # (app_name, user_id, session_id) -> Session, in LRU order
+        self._counters = {
+            "cache_hits": 0, "cache_misses": 0, "cache_evictions": 0, "connections_opened": 0,
+            "events_appended": 0, "expired_sessions_deleted": 0, "eviction_runs": 0, "last_eviction": None,
+        }
+        self._stop = threading.Event()
+        self._evictor = None
+        if self._db_path not in ("", ":memory:"):
+            self._prepare_database()
+            if eviction_interval_seconds > 0:
+                self._evictor = threading.Thread(
+                    target=self._eviction_loop, args=(eviction_interval_seconds,), name="session-evictor", daemon=True
+                )
+                self._evictor.start()
+
+    # --- Connections ---
+    def _prepare_database(self):
+        # WAL and incremental auto-vacuum are stored in the database file, so this only does work once
+        with contextlib.closing(sqlite3.connect(self._db_connect_path, uri=self._db_connect_uri)) as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")  # Needed for an existing file to switch auto-vacuum mode
+            conn.executescript(sqlite_session_service.CREATE_SCHEMA_SQL)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_update_time ON sessions (update_time)")
+        self._schema_ready = True
+
+    async def _connect(self):
+        conn = aiosqlite.connect(self._db_connect_path, uri=self._db_connect_uri)
+        setattr(getattr(conn, "_thread", conn), "daemon", True)  # Like ADK: do not block interpreter exit
+        await conn
+        conn.row_factory = aiosqlite.Row
+        for pragma in _PRAGMAS:
+            await conn.execute(pragma)
+        with self._lock:
+            self._counters["connections_opened"] += 1
+        return conn
+
+    @contextlib.asynccontextmanager
+    async def _get_db_connection(self):
+        if self._db_path in ("", ":memory:"):
+            async with super()._get_db_connection() as conn:
+                yield conn
+            return
+        if self._pool_slots is None:
+            self._pool_slots = asyncio.Semaphore(self._pool_size)
+        async with self._pool_slots:
+            conn = self._idle_connections.pop() if self._idle_connections else await self._connect()
+            try:
+                yield conn
+            except BaseException:
+                try:
+                    await conn.rollback()
+                    self._idle_connections.append(conn)
+                except Exception:
+                    await conn.close()  # Do not hand a broken connection to the next caller
+                raise
+            self._idle_connections.append(conn)
+
+    async def close(self) -> None:
+        self._stop.set()
+        while self._idle_connections:
+            await self._idle_connections.pop().close()
+        await super().close()
+
+    # --- Hot-session cache ---
+    def _cache_put(self, key, session):
+        with self._lock:
+            self._sessions[key] = _snapshot(session)
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self._cache_size:
+                self._sessions.popitem(last=False)
+                self._counters["cache_evictions"] += 1
+
+    def _cache_drop(self, app_name, user_id=None):
+        with self._lock:
+            for key in [key for key in self._sessions if key[0] == app_name and user_id in (None, key[1])]:
+                del self._sessions[key]
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[Dict[str, Any]] = None, session_id: Optional[str] = None):
+        session = await super().create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+        self._cache_put((app_name, user_id, session.id), session)
+        return session
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig] = None):
+        key = (app_name, user_id, session_id)
+        if config is None:
+            with self._lock:
+                cached = self._sessions.get(key)
+                if cached is not None:
+                    self._sessions.move_to_end(key)
+                    self._counters["cache_hits"] += 1
+                    return _snapshot(cached)
+                self._counters["cache_misses"] += 1
+        session = await super().get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+        # Partial loads (config with a limit or a timestamp) are not cached
+        if session is not None and config is None:
+            self._cache_put(key, session)
+        return session
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        with self._lock:
+            self._sessions.pop((app_name, user_id, session_id), None)
+
+    async def append_event(self, session, event):
+        event = await super().append_event(session, event)
+        if event.partial:
+            return event
+        delta = event.actions.state_delta if event.actions else None
+        if delta and any(key.startswith((State.APP_PREFIX, State.USER_PREFIX)) for key in delta):
+            # App and user state are shared with other sessions, whose cached copies are now stale
+            self._cache_drop(session.app_name, None if any(key.startswith(State.APP_PREFIX) for key in delta) else session.user_id)
+        key = (session.app_name, session.user_id, session.id)
+        with self._lock:
+            self._counters["events_appended"] += 1
+            cached = self._sessions.get(key)
+            if cached is not None:
+                cached.events.append(event)
+                self._update_session_state(cached, event)
+                cached.last_update_time = session.last_update_time
+        return event
+
+    # --- TTL eviction ---
+    def _eviction_loop(self, interval_seconds):
+        while not self._stop.wait(interval_seconds):
+            try:
+                self.evict_expired()
+            except Exception as e:
+                print(f"[LOG session_store]: Session eviction failed: {e}")
+
+    def evict_expired(self) -> int:
+        """Deletes sessions idle for longer than the TTL and gives the freed space back. Returns how many were deleted."""
+        cutoff = time.time() - self._ttl_seconds
+        deleted = 0
+        with contextlib.closing(sqlite3.connect(self._db_connect_path, uri=self._db_connect_uri, timeout=30)) as conn:
+            conn.execute("PRAGMA foreign_keys = ON")
+            while True:
+                expired = conn.execute(
+                    "SELECT app_name, user_id, id FROM sessions WHERE update_time < ? LIMIT ?", (cutoff, SESSION_EVICTION_BATCH)
+                ).fetchall()
+                if not expired: break
+                with conn:
+                    conn.executemany("DELETE FROM sessions WHERE app_name=? AND user_id=? AND id=?", expired)
+                with self._lock:
+                    for key in expired:
+                        self._sessions.pop(tuple(key), None)
+                deleted += len(expired)
+            if deleted:
+                conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        with self._lock:
+            self._counters["expired_sessions_deleted"] += deleted
+            self._counters["eviction_runs"] += 1
+            self._counters["last_eviction"] = time.time()
+        if deleted:
+            print(f"[LOG session_store]: Deleted {deleted} sessions idle for more than {self._ttl_seconds}s.")
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["cache_hits"] + self._counters["cache_misses"]
+            stats = dict(
+                self._counters,
+                cached_sessions=len(self._sessions),
+                cache_hit_ratio=round(self._counters["cache_hits"] / lookups, 3) if lookups else None,
+                pool_size=self._pool_size,
+                idle_connections=len(self._idle_connections),
+                ttl_seconds=self._ttl_seconds,
+            )
+        if self._db_path not in ("", ":memory:") and os.path.exists(self._db_path):
+            stats["db_bytes"] = os.path.getsize(self._db_path)
+            wal_path = self._db_path + "-wal"
+            stats["wal_bytes"] = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+        return stats
+
+_service = None
+
+def _tuned_sqlite_factory(uri: str, **kwargs: Any):
+    global _service
+    # Same URI handling as ADK's sqlite:// factory: sqlite:///./sessions.db, sqlite:////abs/path.db
+    db_path = urllib.parse.urlparse(uri).path
+    if db_path.startswith("/"): db_path = db_path[1:]
+    if not db_path:
+        from google.adk.sessions import InMemorySessionService
+        return InMemorySessionService()
+    _service = TunedSqliteSessionService(db_path)
+    return _service
+
+def register_session_store() -> None:
+    """Makes sqlite:// session URIs use TunedSqliteSessionService. Call before get_fast_api_app()."""
+    if not SESSION_STORE_TUNED: return
+    from google.adk.cli.service_registry import get_service_registry
+    get_service_registry().register_session_service("sqlite", _tuned_sqlite_factory)
+
+def get_session_store_stats() -> Dict[str, Any]:
+    return dict(_service.stats(), tuned=True) if _service else {"tuned": False}
@@ -0,0 +1,80 @@
+# Startup profile of the ADK server: how long each startup phase took and which packages it imported.
+#
+# main.py imports this module first, then marks the end of each phase (its own imports, ADK's
+# FastAPI app, the agent warm-up). The report is logged once as a structured "startup_profile"
+# entry and served at /stats/startup. For a per-module breakdown run
+#   python -X importtime -c "import main"
+# or adk-agents/bench/bench_cold_start.py --importtime.
+import collections
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+STARTUP_PROFILE_ENABLED = os.environ.get("STARTUP_PROFILE", "true").lower() == "true"
+STARTUP_PROFILE_TOP_PACKAGES = 8  # Packages listed per phase, by number of modules imported
+
+def _process_age_ms() -> Optional[float]:
+    """Time since the process started (interpreter start-up included), from /proc on Linux."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime_seconds = float(f.read().split()[0])
+        return (uptime_seconds - start_ticks / os.sysconf("SC_CLK_TCK")) * 1000
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _package(module_name):
+    # google.* is a namespace shared by ADK, genai, auth and the Cloud clients: keep two levels
+    parts = module_name.split(".")
+    return ".".join(parts[:2]) if parts[0] == "google" and len(parts) > 1 else parts[0]
+
+class StartupProfile:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._interpreter_ms = _process_age_ms()
+        self._started = time.perf_counter()
+        self._last_mark = self._started
+        self._known_modules = set(sys.modules)
+        self._phases = []
+
+    def mark(self, phase: str, since: Optional[float] = None) -> None:
+        """Closes a phase: time since the previous mark (or since `since`, a perf_counter value) and the modules it imported."""
+        now = time.perf_counter()
+        with self._lock:
+            new_modules = [name for name in list(sys.modules) if name not in self._known_modules]
+            self._known_modules.update(new_modules)
+            packages = collections.Counter(_package(name) for name in new_modules)
+            self._phases.append({
+                "phase": phase,
+                "ms": round((now - (self._last_mark if since is None else since)) * 1000, 1),
+                "modules_imported": len(new_modules),
+                "top_packages": dict(packages.most_common(STARTUP_PROFILE_TOP_PACKAGES)),
+            })
+            if since is None: self._last_mark = now
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "interpreter_start_ms": round(self._interpreter_ms, 1) if self._interpreter_ms is not None else None,
+                "main_import_ms": round((self._last_mark - self._started) * 1000, 1),
+                "modules_loaded": len(sys.modules),
+                "phases": list(self._phases),
+            }
+
+    def log_report(self) -> None:
+        print(json.dumps({"severity": "INFO", "message": "startup_profile", **self.report()}), flush=True)
+
+_profile = StartupProfile() if STARTUP_PROFILE_ENABLED else None
+
+def mark(phase: str, since: Optional[float] = None) -> None:
+    if _profile: _profile.mark(phase, since)
+
+def log_report() -> None:
+    if _profile: _profile.log_report()
+
+def get_startup_report() -> Dict[str, Any]:
+    return _profile.report() if _profile else {"enabled": False}
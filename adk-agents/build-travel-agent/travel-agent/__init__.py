@@ -1,2 +1,2 @@
 # This file makes the directory a Python package
-from .agent import agent
\ No newline at end of file
+from .agent import agent, app
@@ -1,24 +1,47 @@
 # mi_agente_de_viajes/sistema_de_reservas/agent.py
 import json # Added import for json
 from google.adk.agents import LlmAgent
+from google.adk.agents.context_cache_config import ContextCacheConfig
+from google.adk.apps import App
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 
-# Importaciones para BigQuery
-from google.cloud import bigquery
+import os
 import uuid
 import datetime
 
+from .async_tools import ASYNC_TOOLS_ENABLED, make_async_tool
+from .history_compaction import build_events_compaction_config, get_history_compactor
+from .ingestion import get_write_behind_buffer
+from .intent_router import build_intent_router
+from . import pagination
+from .query_cache import get_status_query_cache
+from .request_index import get_fresh_request_index, get_request_index
+from .storage import StorageError, get_store
+from .telemetry import bind_tool_session, instrument_tool, record_data_source
+from .travel_summary import TRAVEL_SUMMARY_TOP, get_travel_summary, mark_travel_summary_stale
+
 # --- Configuración del Modelo ---
 MODEL_ID = "gemini-2.0-flash-001" # Consistent model ID
-
-# --- Configuración de BigQuery ---
-BIGQUERY_PROJECT_ID = "fon-test-project"
-BIGQUERY_DATASET_ID = "foncorp_travel_data"
-BIGQUERY_TABLE_ID = "travel_requests"
+# Caché de contexto del modelo: la parte estática del prompt y las declaraciones de herramientas se
+# envían una vez y se reutilizan en los turnos siguientes de la sesión (ADK la crea desde el 2º turno
+# y solo si el prefijo alcanza el mínimo de tokens del modelo).
+CONTEXT_CACHE_ENABLED = os.environ.get("CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+CONTEXT_CACHE_TTL_SECONDS = int(os.environ.get("CONTEXT_CACHE_TTL_SECONDS", "1800"))
+CONTEXT_CACHE_INTERVALS = int(os.environ.get("CONTEXT_CACHE_INTERVALS", "10")) # Turnos que reutilizan una caché antes de renovarla
+CONTEXT_CACHE_MIN_TOKENS = int(os.environ.get("CONTEXT_CACHE_MIN_TOKENS", "0"))
+
+# --- Configuración del almacenamiento: ver storage.py y bigquery_client.py ---
+STATUS_QUERY_LIMIT = 10 # Máximo de solicitudes devueltas por get_travel_requests_by_employee
+_EMPLOYEE_QUERY_COLUMNS = [
+    "request_id", "employee_first_name", "employee_last_name", "origin_city", "destination_city",
+    "start_date", "end_date", "transport_mode", "car_type", "reason", "status",
+]
 
 # --- Definición del Prompt ---
-TRAVEL_AGENT_INSTRUCTION = f"""
+# Parte estática: idéntica en todas las llamadas, así el modelo puede servirla desde su caché de
+# contexto (ver CONTEXT_CACHE_ENABLED). Lo que cambia por petición va en _dynamic_instruction.
+TRAVEL_AGENT_STATIC_INSTRUCTION = """
 Eres un amigable y eficiente asistente de viajes para los empleados de la empresa Foncorp.
 Cuando un empleado inicie una conversación contigo, salúdalo cordialmente y preséntate indicando claramente qué puedes hacer por él en formato de lista.
 
@@ -26,6 +49,8 @@ Tus responsabilidades principales son:
 - Registrar nuevas solicitudes de viaje.
 - Consultar el estado de las solicitudes de viaje existentes.
 - Actualizar el estado de una solicitud de viaje específica.
+- Consultar las solicitudes de viaje de un empleado.
+- Dar recuentos agregados de las solicitudes (por estado, destino, medio de transporte y mes).
 
 Estados Comunes de Solicitudes y sus Significados (para tu conocimiento interno y para interpretar consultas):
 - 'Registrada': Solicitudes nuevas. Si el usuario pregunta por "pendientes", "nuevas", o "sin revisar", podría referirte a este estado o a una combinación con 'Pendiente de Aprobación'.
@@ -41,8 +66,8 @@ Instrucciones para las herramientas:
 1. Para registrar una nueva solicitud de viaje:
    - Recopila la siguiente información esencial: Nombre del empleado (pila), Apellidos del empleado, ID de empleado, Ciudad de Origen del viaje, Ciudad de Destino del viaje, Fecha de inicio (formato YYYY-MM-DD), Fecha de fin (formato YYYY-MM-DD), Medio de Transporte Preferido (Avión, Tren, Autobús, Coche), Tipo de Coche si aplica (Particular o Alquiler), y Motivo del viaje.
    - **Validación de Fechas Importante:**
-     - Ambas fechas, inicio y fin, DEBEN ser futuras a la fecha actual ({datetime.datetime.now().strftime('%Y-%m-%d')}).
-     - Si el usuario proporciona solo día y mes (ej. "15 de junio"), asume el año actual ({datetime.datetime.now().year}) para completar la fecha. Verifica que esta fecha resultante sea futura.
+     - Ambas fechas, inicio y fin, DEBEN ser futuras a la fecha actual (se indica aparte en cada petición).
+     - Si el usuario proporciona solo día y mes (ej. "15 de junio"), asume el año actual para completar la fecha. Verifica que esta fecha resultante sea futura.
      - La fecha de fin no puede ser anterior a la fecha de inicio.
      - Si alguna fecha es inválida (pasada, o fin antes que inicio), NO llames a la herramienta. En su lugar, explica el problema al usuario y PÍDELE que proporcione fechas válidas. Por ejemplo: "Lo siento, la fecha [fecha inválida] ya ha pasado. Por favor, proporciona una fecha futura." o "La fecha de regreso no puede ser anterior a la de salida. Por favor, revisa las fechas."
    - Cuando tengas TODA la información válida (incluyendo fechas futuras y correctas), llama a la herramienta 'request_travel_booking_logic'.
@@ -54,7 +79,7 @@ Instrucciones para las herramientas:
      2. **Llama INMEDIATAMENTE a la herramienta `get_travel_requests_by_status`** con este `search_term`.
      3. **NO GENERES NINGUNA RESPUESTA AL USUARIO ANTES DE RECIBIR EL RESULTADO DE LA HERRAMIENTA.** Espera la cadena JSON de la herramienta.
      4. **Una vez que la herramienta devuelva el JSON, analiza su contenido y USA ÚNICAMENTE ESE CONTENIDO para formular tu respuesta completa y final al usuario en este mismo turno.**
-        - La herramienta devolverá datos como una cadena JSON: `{{"search_term": "...", "count": N, "requests": [{{"request_id": "...", ...}}], "message": "... opcional ..."}}` o `{{"message": "No se encontraron..."}}` o `{{"error": "..."}}`.
+        - La herramienta devolverá datos como una cadena JSON: `{"search_term": "...", "count": N, "requests": [{"request_id": "...", ...}], "message": "... opcional ..."}` o `{"message": "No se encontraron..."}` o `{"error": "..."}`.
         - Si el JSON tiene `"count" > 0` y una lista de `"requests"`: Responde con algo como: "He encontrado [count] solicitudes [search_term]. Aquí están:
           - ID: [request_id_1], Empleado: [employee_name_1], Destino: [destination_city_1], Fechas: [start_date_1] a [end_date_1], Motivo: [reason_1]
           - ID: [request_id_2], Empleado: [employee_name_2], Destino: [destination_city_2], Fechas: [start_date_2] a [end_date_2], Motivo: [reason_2]
@@ -62,6 +87,9 @@ Instrucciones para las herramientas:
         - Si el JSON tiene un `"message"` (ej. no se encontraron resultados): Responde directamente con ese mensaje. Por ejemplo: "No se encontraron solicitudes para el término: [search_term]."
         - Si el JSON tiene un `"error"`: Responde informando del error. Por ejemplo: "Hubo un error al consultar las solicitudes: [error_message]."
      5. **ASEGÚRATE de que tu respuesta al usuario sea la presentación directa de los datos (o mensaje de no datos/error) recibidos de la herramienta, sin comentarios adicionales tuyos antes de presentar estos datos.**
+   - **Paginación:** Si el JSON incluye `"next_cursor"`, hay más solicitudes. Indícalo al final ("Hay más solicitudes; ¿quieres ver las siguientes?"). Si el usuario quiere verlas, vuelve a llamar a `get_travel_requests_by_status` con el mismo `search_term` y `cursor` igual a ese `next_cursor`. No inventes ni modifiques cursores.
+   - **Campos:** Si el usuario solo necesita ciertos datos (ej. "solo los IDs y destinos"), pasa `fields` con esos campos (ej. `["request_id", "destination_city"]`).
+   - **Recuentos:** Si el usuario solo pregunta cuántas solicitudes hay (ej. "¿cuántas pendientes hay?"), llama a `count_travel_requests_by_status` con el `search_term`; devuelve `{"search_term": "...", "total": N}`. No listes las solicitudes para contarlas.
 
 3. Para actualizar el estado de una solicitud de viaje:
    - Necesitarás el ID de la solicitud ('request_id') y el nuevo estado ('new_status').
@@ -69,12 +97,34 @@ Instrucciones para las herramientas:
    - Llama a la herramienta 'update_travel_request_status' con los argumentos: request_id (str) y new_status (str).
    - Después de llamar a la herramienta, informa al usuario del resultado que devuelva la herramienta (confirmación o error).
 
+4. Para consultar las solicitudes de un empleado concreto:
+   - Necesitarás el ID de empleado ('employee_id'). Pídeselo al usuario si no lo proporciona.
+   - Llama a la herramienta 'get_travel_requests_by_employee' con el argumento: employee_id (str).
+   - La herramienta devuelve el mismo formato JSON que 'get_travel_requests_by_status' (con `"employee_id"` en lugar de `"search_term"`). Presenta los resultados igual que en el punto 2.
+
+5. Para actualizar el estado de varias solicitudes a la vez (ej. "aprueba todas las pendientes de Madrid"):
+   - Obtén primero los IDs con 'get_travel_requests_by_status' o 'get_travel_requests_by_employee' y quédate con los que cumplan los criterios del usuario (ej. destino Madrid).
+   - Muestra al usuario la lista de IDs afectados y pídele confirmación antes de continuar.
+   - Llama UNA SOLA VEZ a la herramienta 'bulk_update_travel_request_status' con los argumentos: request_ids (lista de str) y new_status (str). NO llames a 'update_travel_request_status' una vez por solicitud.
+   - La herramienta devuelve un JSON con `"updated"` (con el estado anterior de cada una), `"already_in_status"` y `"not_found"`. Resume el resultado al usuario.
+
+6. Para preguntas agregadas (ej. "¿cuántas solicitudes hay por estado?", "¿a qué destinos viajamos más este mes?", "¿cuántos viajes en tren hay aprobados?"):
+   - Llama UNA SOLA VEZ a la herramienta 'get_travel_request_summary'. NO pagines 'get_travel_requests_by_status' para contar filas tú mismo.
+   - Filtros opcionales: search_term (estado o término, como en el punto 2), month (YYYY-MM, mes de inicio del viaje; para "este mes" usa el mes de la fecha actual), destination_city, transport_mode y top (destinos a devolver, por defecto 10).
+   - La herramienta devuelve `{"total": N, "by_status": {...}, "by_destination_city": {...}, "by_transport_mode": {...}, "by_month": {...}, "refreshed_at": "..."}`, con los recuentos ya ordenados de mayor a menor (los meses, cronológicamente). Responde con esas cifras sin recalcularlas.
+   - Los recuentos se actualizan cada pocos minutos: si el usuario necesita la cifra exacta de un único estado en este momento, usa 'count_travel_requests_by_status'.
+
 Reglas Generales:
 - NO inventes información para las herramientas. Pide al usuario cualquier dato que falte.
 - Sé siempre cortés y profesional.
-- La fecha actual es: {datetime.datetime.now().strftime('%Y-%m-%d')}. Considera esto para inferir años si el usuario solo da día y mes para las fechas de viaje.
+- Usa la fecha actual (se indica aparte en cada petición) para inferir años si el usuario solo da día y mes para las fechas de viaje.
 """
 
+def _dynamic_instruction(context) -> str:
+    """Parte dinámica del prompt, calculada en cada llamada al modelo (la fecha no queda fija al importar)."""
+    today = datetime.date.today()
+    return f"La fecha actual es: {today.strftime('%Y-%m-%d')} (año {today.year})."
+
 # --- (Opcional) Pydantic para claridad de argumentos ---
 class _TravelBookingArgsSchema(BaseModel):
     employee_first_name: str = Field(description="Nombre del empleado (pila).")
@@ -90,13 +140,24 @@ class _TravelBookingArgsSchema(BaseModel):
 
 class _GetTravelRequestsArgsSchema(BaseModel):
     search_term: str = Field(description="El estado o término de búsqueda para las solicitudes (ej. 'Cancelada', 'Pendiente', 'Registrada').")
+    page_size: int = Field(default=10, description="Solicitudes por página (máximo 50).")
+    cursor: Optional[str] = Field(default=None, description="El 'next_cursor' de la página anterior.")
+    fields: Optional[List[str]] = Field(default=None, description="Campos a devolver de cada solicitud.")
+
+class _BulkUpdateTravelRequestsArgsSchema(BaseModel):
+    request_ids: List[str] = Field(description="IDs de las solicitudes a actualizar.")
+    new_status: str = Field(description="Nuevo estado para todas las solicitudes.")
+
+class _GetEmployeeRequestsArgsSchema(BaseModel):
+    employee_id: str = Field(description="ID del empleado cuyas solicitudes se quieren consultar.")
 
 class _UpdateTravelRequestArgsSchema(BaseModel):
     request_id: str = Field(description="ID de la solicitud a actualizar.")
     new_status: str = Field(description="Nuevo estado para la solicitud.")
 
 
-# --- Lógica de la Herramienta 1: Registrar Solicitud (Usa DML INSERT) ---
+# --- Lógica de la Herramienta 1: Registrar Solicitud ---
+@instrument_tool
 def request_travel_booking_logic(
     employee_first_name: str,
     employee_last_name: str,
@@ -140,165 +201,267 @@ def request_travel_booking_logic(
         return "Error en la herramienta: El formato de las fechas no es válido. Utiliza YYYY-MM-DD."
 
     try:
-        client = bigquery.Client()
         request_id_val = str(uuid.uuid4())
         current_timestamp = datetime.datetime.now(datetime.timezone.utc)
         initial_status = "Registrada"
-        table_ref_str = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
-
-        query = f"""
-            INSERT INTO `{table_ref_str}` (
-                request_id, timestamp, employee_first_name, employee_last_name, employee_id,
-                origin_city, destination_city, start_date, end_date,
-                transport_mode, car_type, reason, status
-            ) VALUES (
-                @request_id, @timestamp, @employee_first_name, @employee_last_name, @employee_id,
-                @origin_city, @destination_city, @start_date, @end_date,
-                @transport_mode, @car_type, @reason, @status
-            )
-        """
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("request_id", "STRING", request_id_val),
-                bigquery.ScalarQueryParameter("timestamp", "TIMESTAMP", current_timestamp.isoformat()),
-                bigquery.ScalarQueryParameter("employee_first_name", "STRING", employee_first_name),
-                bigquery.ScalarQueryParameter("employee_last_name", "STRING", employee_last_name),
-                bigquery.ScalarQueryParameter("employee_id", "STRING", employee_id),
-                bigquery.ScalarQueryParameter("origin_city", "STRING", origin_city),
-                bigquery.ScalarQueryParameter("destination_city", "STRING", destination_city),
-                bigquery.ScalarQueryParameter("start_date", "DATE", start_date),
-                bigquery.ScalarQueryParameter("end_date", "DATE", end_date),
-                bigquery.ScalarQueryParameter("transport_mode", "STRING", transport_mode),
-                bigquery.ScalarQueryParameter("car_type", "STRING", car_type),
-                bigquery.ScalarQueryParameter("reason", "STRING", reason),
-                bigquery.ScalarQueryParameter("status", "STRING", initial_status),
-            ]
+        full_name = f"{employee_first_name} {employee_last_name}"
+        request_details = (
+            f"Para {full_name} (ID: {employee_id}) desde {origin_city} a {destination_city} "
+            f"({start_date} a {end_date}), usando {transport_mode}"
+            f"{f' ({car_type})' if car_type and transport_mode.lower() == 'coche' else ''}. Motivo: {reason}."
         )
-        query_job = client.query(query, job_config=job_config)
-        query_job.result()
 
-        if query_job.errors:
-            error_messages = "; ".join([str(error["message"]) for error in query_job.errors])
-            print(f"[LOG request_travel_booking_logic - ERROR BQ DML]: {error_messages}")
-            return f"Error al registrar la solicitud (DML): {error_messages}."
+        new_row = {
+            "request_id": request_id_val, "timestamp": current_timestamp,
+            "employee_first_name": employee_first_name, "employee_last_name": employee_last_name,
+            "employee_id": employee_id, "origin_city": origin_city, "destination_city": destination_city,
+            "start_date": start_date, "end_date": end_date, "transport_mode": transport_mode,
+            "car_type": car_type, "reason": reason, "status": initial_status,
+        }
+
+        ingestion_buffer = get_write_behind_buffer()
+        if ingestion_buffer is not None:
+            # Modo write-behind: la fila queda en el búfer duradero y se carga por lotes (ver ingestion.py).
+            # La caché de estados, el índice y el resumen se actualizan al cargarse el lote, cuando la fila ya cuenta
+            ingestion_buffer.append(dict(new_row, timestamp=current_timestamp.isoformat()))
+            confirmation_message = f"¡Solicitud registrada! ID: {request_id_val}. {request_details}"
+            print(f"[LOG request_travel_booking_logic]: {confirmation_message} (en cola de ingesta)")
+            return confirmation_message
+
+        try:
+            inserted_rows = get_store().insert_request(new_row)
+        except StorageError as e:
+            print(f"[LOG request_travel_booking_logic - ERROR DML]: {e}")
+            return f"Error al registrar la solicitud (DML): {e}."
+
+        if inserted_rows > 0:
+            status_cache = get_status_query_cache()
+            if status_cache: status_cache.invalidate(statuses=[initial_status])
+            mark_travel_summary_stale()
+            request_index = get_request_index()
+            if request_index: request_index.upsert(new_row)
+            confirmation_message = f"¡Solicitud registrada (DML)! ID: {request_id_val}. {request_details}"
+            print(f"[LOG request_travel_booking_logic]: {confirmation_message}")
+            return confirmation_message
         else:
-            if query_job.num_dml_affected_rows is not None and query_job.num_dml_affected_rows > 0:
-                full_name = f"{employee_first_name} {employee_last_name}"
-                confirmation_message = (
-                    f"¡Solicitud registrada (DML)! ID: {request_id_val}. "
-                    f"Para {full_name} (ID: {employee_id}) desde {origin_city} a {destination_city} "
-                    f"({start_date} a {end_date}), usando {transport_mode}"
-                    f"{f' ({car_type})' if car_type and transport_mode.lower() == 'coche' else ''}. Motivo: {reason}."
-                )
-                print(f"[LOG request_travel_booking_logic]: {confirmation_message}")
-                return confirmation_message
-            else:
-                print(f"[LOG request_travel_booking_logic - ERROR BQ DML]: No se afectaron filas.")
-                return "Error al registrar la solicitud: no se insertaron filas."
+            print(f"[LOG request_travel_booking_logic - ERROR DML]: No se afectaron filas.")
+            return "Error al registrar la solicitud: no se insertaron filas."
     except Exception as e:
         print(f"[LOG request_travel_booking_logic - ERROR]: {e}")
         return f"Error técnico al registrar la solicitud: {e}."
 
+def _format_request_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Convierte una fila (almacenamiento, índice en memoria o búfer de ingesta) al formato JSON de las herramientas."""
+    employee_full_name = f"{row.get('employee_first_name') or ''} {row.get('employee_last_name') or ''}".strip()
+    return {
+        "request_id": str(row.get("request_id") or "N/A"),
+        "employee_name": str(employee_full_name or "N/A"),
+        "origin_city": str(row.get("origin_city") or "N/A"),
+        "destination_city": str(row.get("destination_city") or "N/A"),
+        "start_date": str(row["start_date"]) if row.get("start_date") else "N/A",
+        "end_date": str(row["end_date"]) if row.get("end_date") else "N/A",
+        "transport_mode": str(row.get("transport_mode") or "N/A"),
+        "car_type": str(row["car_type"]) if row.get("car_type") else None,
+        "reason": str(row.get("reason") or "N/A"),
+        "status": str(row.get("status") or "N/A"),
+        "employee_id": str(row.get("employee_id") or "N/A"),
+    }
+
 # --- Lógica de la Herramienta 2: Consultar Solicitudes por Estado (Devuelve JSON) ---
-def get_travel_requests_by_status(search_term: str) -> str:
-    """Consulta solicitudes de viaje por estado o término.
+def _resolve_status_filter(search_term: str) -> Tuple[List[str], bool]:
+    """Traduce el término de búsqueda a los estados que se consultan y a si se comparan sin
+    distinguir mayúsculas. Devuelve una lista vacía si el término no se puede interpretar.
+    """
+    statuses = []
+    processed_search_term = search_term.lower().strip()
+
+    if "pendiente" in processed_search_term or \
+       "sin aprobar" in processed_search_term or \
+       "nuevas" in processed_search_term or \
+       ("registrada" in processed_search_term and "aprobaci" not in processed_search_term) :
+        statuses.append("Registrada")
+        if "aprobaci" in processed_search_term or "pendiente" in processed_search_term :
+             statuses.append("Pendiente de Aprobación")
+        return statuses, True
+
+    exact_final_statuses = ["aprobada", "rechazada", "reservada", "completada", "cancelada"]
+    if processed_search_term:
+        capitalized_search = search_term.strip().capitalize()
+        if capitalized_search in [s.capitalize() for s in exact_final_statuses]:
+             search_term_final = capitalized_search
+        else:
+             search_term_final = search_term.strip()
+        statuses.append(search_term_final)
+    return statuses, False
+
+def _uninterpreted_search_term(search_term: str) -> str:
+    print(f"[LOG get_travel_requests_by_status]: Término no interpretado '{search_term}'.")
+    return json.dumps({
+        "error": f"No pude interpretar el término de búsqueda de estado: '{search_term}'. Intenta usar uno de los estados conocidos (Registrada, Pendiente de Aprobación, Aprobada, Rechazada, Reservada, Completada, Cancelada)."
+    })
+
+@instrument_tool
+def get_travel_requests_by_status(
+    search_term: str,
+    page_size: int = pagination.DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+) -> str:
+    """Consulta solicitudes de viaje por estado o término, de la más reciente a la más antigua, por páginas.
     Devuelve los resultados como una cadena JSON.
-    El JSON contendrá las solicitudes o un mensaje de 'no encontrado' o de error.
+    El JSON contendrá las solicitudes o un mensaje de 'no encontrado' o de error. Si hay más
+    resultados, incluye `next_cursor`: pásalo como `cursor` para obtener la página siguiente.
     Args:
         search_term (str): El estado exacto (ej. 'Registrada', 'Aprobada') o un término general (ej. 'pendientes').
+        page_size (int, optional): Solicitudes por página (máximo 50, por defecto 10).
+        cursor (str, optional): El `next_cursor` devuelto por la página anterior.
+        fields (List[str], optional): Campos a devolver de cada solicitud (request_id siempre se incluye).
+            Válidos: request_id, employee_name, employee_id, origin_city, destination_city, start_date,
+            end_date, transport_mode, car_type, reason, status. Por defecto, todos salvo employee_id.
     Returns:
         str: Una cadena JSON con las solicitudes encontradas, o un mensaje si no hay ninguna/error.
     """
     try:
-        client = bigquery.Client()
-        table_ref_str = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
-        status_conditions = []
-        query_params = []
-        param_counter = 0
-        processed_search_term = search_term.lower().strip()
-
-        if "pendiente" in processed_search_term or \
-           "sin aprobar" in processed_search_term or \
-           "nuevas" in processed_search_term or \
-           ("registrada" in processed_search_term and "aprobaci" not in processed_search_term) :
-            param_counter += 1
-            status_conditions.append(f"LOWER(status) = LOWER(@status_param_{param_counter})")
-            query_params.append(bigquery.ScalarQueryParameter(f"status_param_{param_counter}", "STRING", "Registrada"))
-            if "aprobaci" in processed_search_term or "pendiente" in processed_search_term :
-                 param_counter += 1
-                 if not any(p.value.lower() == "pendiente de aprobación" for p in query_params):
-                    status_conditions.append(f"LOWER(status) = LOWER(@status_param_{param_counter})")
-                    query_params.append(bigquery.ScalarQueryParameter(f"status_param_{param_counter}", "STRING", "Pendiente de Aprobación"))
-        
-        exact_final_statuses = ["aprobada", "rechazada", "reservada", "completada", "cancelada"]
-        if processed_search_term in exact_final_statuses or \
-           (not status_conditions and processed_search_term):
-            capitalized_search = search_term.strip().capitalize()
-            if capitalized_search in [s.capitalize() for s in exact_final_statuses]:
-                 search_term_final = capitalized_search
-            else:
-                 search_term_final = search_term.strip()
-            status_conditions = []
-            query_params = []
-            param_counter = 0
-            param_counter += 1
-            status_conditions.append(f"status = @status_param_{param_counter}")
-            query_params.append(bigquery.ScalarQueryParameter(f"status_param_{param_counter}", "STRING", search_term_final))
-
-        if not status_conditions:
-             print(f"[LOG get_travel_requests_by_status]: Término no interpretado '{search_term}'.")
-             return json.dumps({
-                 "error": f"No pude interpretar el término de búsqueda de estado: '{search_term}'. Intenta usar uno de los estados conocidos (Registrada, Pendiente de Aprobación, Aprobada, Rechazada, Reservada, Completada, Cancelada)."
-             })
-
-        where_clause = " OR ".join(status_conditions)
-        query = f"""
-            SELECT request_id, employee_first_name, employee_last_name,
-                   origin_city, destination_city, start_date, end_date, transport_mode, car_type, reason, status
-            FROM `{table_ref_str}` WHERE {where_clause} ORDER BY timestamp DESC LIMIT 10
-        """
-        job_config = bigquery.QueryJobConfig(query_parameters=query_params)
-        query_job = client.query(query, job_config=job_config)
-        results = query_job.result()
-
-        if results.total_rows == 0:
+        status_values, case_insensitive = _resolve_status_filter(search_term)
+        if not status_values:
+             return _uninterpreted_search_term(search_term)
+
+        page_size = max(1, min(int(page_size or pagination.DEFAULT_PAGE_SIZE), pagination.MAX_PAGE_SIZE))
+        try:
+            output_fields = pagination.resolve_fields(fields)
+        except ValueError as e:
+            return json.dumps({"error": str(e)})
+        fingerprint = pagination.filter_fingerprint("case_insensitive" if case_insensitive else "exact", status_values)
+        try:
+            after = pagination.decode_cursor(cursor, fingerprint) if cursor else None
+        except pagination.InvalidCursorError as e:
+            return json.dumps({"error": f"{e} Repite la búsqueda sin cursor."})
+
+        # Se pide una fila de más para saber si existe una página siguiente
+        fetch_limit = page_size + 1
+        request_index = get_fresh_request_index()
+        status_cache = get_status_query_cache()
+        cache_key = (case_insensitive, tuple(status_values), fetch_limit, after, tuple(output_fields))
+        if request_index is not None:
+            rows = request_index.find_by_status(status_values, case_insensitive=case_insensitive, limit=fetch_limit, after=after)
+            record_data_source("index")
+            print(f"[LOG get_travel_requests_by_status]: Resultado del índice en memoria para '{search_term}'.")
+        elif status_cache and (rows := status_cache.get(cache_key)) is not None:
+            record_data_source("status_cache")
+            print(f"[LOG get_travel_requests_by_status]: Resultado en caché para '{search_term}'.")
+        else:
+            generation = status_cache.generation() if status_cache else None
+            store = get_store()
+            rows, bytes_processed = store.find_by_status(
+                status_values, case_insensitive, pagination.select_columns(output_fields), fetch_limit, after,
+            )
+            record_data_source(store.name)
+            if status_cache:
+                status_cache.put(cache_key, status_values, rows, bytes_processed, generation)
+
+        ingestion_buffer = get_write_behind_buffer()
+        if ingestion_buffer is not None:
+            # Solicitudes aceptadas que aún están en el búfer de ingesta, con el mismo filtro y cursor
+            requested_statuses = {value.lower() for value in status_values}
+            pending = [
+                row for row in ingestion_buffer.pending_rows()
+                if row["status"].lower() in requested_statuses and (after is None or pagination.keyset(row) < after)
+            ]
+            if pending:
+                pending_ids = {row["request_id"] for row in pending}
+                rows = sorted(pending + [row for row in rows if row["request_id"] not in pending_ids], key=pagination.keyset, reverse=True)
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if not rows:
             print(f"[LOG get_travel_requests_by_status]: No se encontraron solicitudes para '{search_term}'.")
             return json.dumps({
                 "search_term": search_term,
                 "count": 0,
                 "requests": [],
-                "message": f"No se encontraron solicitudes de viaje para el término: '{search_term}'."
+                "message": f"No se encontraron solicitudes de viaje para el término: '{search_term}'" + (" en páginas posteriores." if after else ".")
             })
 
-        output_requests = []
-        for row in results:
-            employee_full_name = f"{row.employee_first_name or ''} {row.employee_last_name or ''}".strip()
-            request_data = {
-                "request_id": str(row.request_id or "N/A"),
-                "employee_name": str(employee_full_name or "N/A"),
-                "origin_city": str(row.origin_city or "N/A"),
-                "destination_city": str(row.destination_city or "N/A"),
-                "start_date": str(row.start_date) if row.start_date else "N/A",
-                "end_date": str(row.end_date) if row.end_date else "N/A",
-                "transport_mode": str(row.transport_mode or "N/A"),
-                "car_type": str(row.car_type or "N/A") if row.car_type else None,
-                "reason": str(row.reason or "N/A"),
-                "status": str(row.status or "N/A")
-            }
-            output_requests.append(request_data)
-        
+        output_requests = [pagination.project_row(_format_request_row(row), output_fields) for row in rows]
         print(f"[LOG DE HERRAMIENTA get_travel_requests_by_status]: JSON generado para '{search_term}'.")
-        return json.dumps({
+        response = {
             "search_term": search_term,
-            "count": results.total_rows,
-            "requests": output_requests
-        })
+            "count": len(output_requests),
+            "requests": output_requests,
+        }
+        if has_more: response["next_cursor"] = pagination.encode_cursor(rows[-1], fingerprint)
+        return json.dumps(response)
 
     except Exception as e:
         print(f"[LOG DE HERRAMIENTA get_travel_requests_by_status - ERROR]: {e}")
         return json.dumps({"error": f"Error técnico al consultar las solicitudes de viaje: {e}."})
 
+@instrument_tool
+def count_travel_requests_by_status(search_term: str) -> str:
+    """Cuenta las solicitudes de viaje de un estado o término sin devolverlas.
+    Args:
+        search_term (str): El estado exacto (ej. 'Registrada', 'Aprobada') o un término general (ej. 'pendientes').
+    Returns:
+        str: Una cadena JSON con el total (`{"search_term": "...", "total": N}`) o un error.
+    """
+    try:
+        status_values, case_insensitive = _resolve_status_filter(search_term)
+        if not status_values:
+             return _uninterpreted_search_term(search_term)
+
+        request_index = get_fresh_request_index()
+        if request_index is not None:
+            total = request_index.count_by_status(status_values, case_insensitive=case_insensitive)
+            record_data_source("index")
+        else:
+            store = get_store()
+            total = store.count_by_status(status_values, case_insensitive)
+            record_data_source(store.name)
+
+        ingestion_buffer = get_write_behind_buffer()
+        if ingestion_buffer is not None:
+            requested_statuses = {value.lower() for value in status_values}
+            total += sum(1 for row in ingestion_buffer.pending_rows() if row["status"].lower() in requested_statuses)
+
+        print(f"[LOG count_travel_requests_by_status]: {total} solicitudes para '{search_term}'.")
+        return json.dumps({"search_term": search_term, "total": total})
+    except Exception as e:
+        print(f"[LOG count_travel_requests_by_status - ERROR]: {e}")
+        return json.dumps({"error": f"Error técnico al contar las solicitudes de viaje: {e}."})
+
 # --- Lógica de la Herramienta 3: Actualizar Estado de Solicitud ---
+VALID_STATUSES = ["Registrada", "Pendiente de Aprobación", "Aprobada", "Rechazada", "Reservada", "Completada", "Cancelada"]
+
+_STATUS_MAP = {
+    "registrada": "Registrada",
+    "pendiente de aprobación": "Pendiente de Aprobación",
+    "pendiente": "Pendiente de Aprobación",
+    "aprobada": "Aprobada",
+    "rechazada": "Rechazada",
+    "reservada": "Reservada",
+    "completada": "Completada",
+    "cancelada": "Cancelada"
+}
+
+def _normalize_status(new_status: str) -> Optional[str]:
+    """Devuelve el estado válido correspondiente a new_status, o None si no es válido."""
+    final_status = _STATUS_MAP.get(new_status.lower().strip())
+    if not final_status:
+        capitalized_status_direct = new_status.strip().capitalize()
+        if capitalized_status_direct in VALID_STATUSES:
+             final_status = capitalized_status_direct
+    return final_status
+
+def _after_status_update(changed_request_ids: List[str], final_status: str, updated_at: datetime.datetime) -> None:
+    """Propaga un UPDATE confirmado a la caché de consultas, al resumen agregado y al índice en memoria."""
+    status_cache = get_status_query_cache()
+    if status_cache: status_cache.invalidate(statuses=[final_status], request_ids=changed_request_ids)
+    mark_travel_summary_stale()
+    request_index = get_request_index()
+    if request_index:
+        for changed_id in changed_request_ids: request_index.apply_status_update(changed_id, final_status, updated_at)
+
+@instrument_tool
 def update_travel_request_status(request_id: str, new_status: str) -> str:
     """Actualiza el estado de una solicitud de viaje específica en BigQuery.
     Args:
@@ -307,80 +470,227 @@ def update_travel_request_status(request_id: str, new_status: str) -> str:
     Returns:
         str: Mensaje de confirmación o error.
     """
-    valid_statuses = ["Registrada", "Pendiente de Aprobación", "Aprobada", "Rechazada", "Reservada", "Completada", "Cancelada"]
-    
-    status_map = {
-        "registrada": "Registrada",
-        "pendiente de aprobación": "Pendiente de Aprobación",
-        "pendiente": "Pendiente de Aprobación",
-        "aprobada": "Aprobada",
-        "rechazada": "Rechazada",
-        "reservada": "Reservada",
-        "completada": "Completada",
-        "cancelada": "Cancelada"
-    }
-    normalized_new_status = new_status.lower().strip()
-    final_status = status_map.get(normalized_new_status)
-
+    final_status = _normalize_status(new_status)
     if not final_status:
-        capitalized_status_direct = new_status.strip().capitalize()
-        if capitalized_status_direct in valid_statuses:
-             final_status = capitalized_status_direct
-        else:
-            return f"Error: '{new_status}' no es un estado válido. Válidos: {', '.join(valid_statuses)}."
+        return f"Error: '{new_status}' no es un estado válido. Válidos: {', '.join(VALID_STATUSES)}."
 
     try:
-        client = bigquery.Client()
-        table_ref_str = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
-        query = f"""
-            UPDATE `{table_ref_str}`
-            SET status = @new_status_param, timestamp = @current_timestamp_param
-            WHERE request_id = @request_id_param
-        """
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("new_status_param", "STRING", final_status),
-                bigquery.ScalarQueryParameter("request_id_param", "STRING", request_id),
-                bigquery.ScalarQueryParameter("current_timestamp_param", "TIMESTAMP", datetime.datetime.now(datetime.timezone.utc).isoformat())
-            ]
-        )
-        query_job = client.query(query, job_config=job_config)
-        query_job.result()
-
-        if query_job.num_dml_affected_rows is not None and query_job.num_dml_affected_rows > 0:
-            success_message = f"Solicitud ID '{request_id}' actualizada a '{final_status}'."
+        ingestion_buffer = get_write_behind_buffer()
+        if ingestion_buffer is not None and ingestion_buffer.is_pending(request_id):
+            # La fila aún no está en BigQuery: se carga ya para que el UPDATE la encuentre
+            if not ingestion_buffer.flush_now():
+                return f"La solicitud ID '{request_id}' aún se está registrando. Inténtalo de nuevo en unos segundos."
+
+        updated_at = datetime.datetime.now(datetime.timezone.utc)
+        previous_status, changed_rows = get_store().update_status(request_id, final_status, updated_at)
+
+        if changed_rows and changed_rows > 0:
+            _after_status_update([request_id], final_status, updated_at)
+            success_message = f"Solicitud ID '{request_id}' actualizada de '{previous_status}' a '{final_status}'."
             print(f"[LOG update_travel_request_status]: {success_message}")
             return success_message
+        elif previous_status is None:
+            not_found_message = f"No se encontró solicitud con ID '{request_id}'."
+        elif previous_status == final_status:
+            not_found_message = f"La solicitud ID '{request_id}' ya estaba en estado '{final_status}'. No se realizaron cambios."
         else:
-            check_query = f"SELECT status FROM `{table_ref_str}` WHERE request_id = @request_id_param"
-            check_job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("request_id_param", "STRING", request_id)])
-            check_job = client.query(check_query, job_config=check_job_config)
-            check_results = list(check_job.result())
-            if not check_results:
-                 not_found_message = f"No se encontró solicitud con ID '{request_id}'."
-            elif check_results[0].status == final_status:
-                 not_found_message = f"La solicitud ID '{request_id}' ya estaba en estado '{final_status}'. No se realizaron cambios."
-            else:
-                 not_found_message = f"No se pudo actualizar la solicitud ID '{request_id}'. Razón desconocida."
-            print(f"[LOG update_travel_request_status]: {not_found_message}")
-            return not_found_message
+            not_found_message = f"No se pudo actualizar la solicitud ID '{request_id}'. Razón desconocida."
+        print(f"[LOG update_travel_request_status]: {not_found_message}")
+        return not_found_message
     except Exception as e:
         error_message = f"Error técnico al actualizar estado de '{request_id}': {e}"
         print(f"[LOG update_travel_request_status - ERROR]: {error_message}")
         return error_message
 
+# --- Lógica de la Herramienta 4: Consultar Solicitudes de un Empleado (Devuelve JSON) ---
+@instrument_tool
+def get_travel_requests_by_employee(employee_id: str) -> str:
+    """Consulta las solicitudes de viaje más recientes de un empleado.
+    Devuelve los resultados como una cadena JSON.
+    Args:
+        employee_id (str): ID del empleado.
+    Returns:
+        str: Una cadena JSON con las solicitudes encontradas, o un mensaje si no hay ninguna/error.
+    """
+    try:
+        employee_id = employee_id.strip()
+        request_index = get_fresh_request_index()
+        if request_index is not None:
+            rows = request_index.find_by_employee(employee_id, STATUS_QUERY_LIMIT)
+            record_data_source("index")
+            print(f"[LOG get_travel_requests_by_employee]: Resultado del índice en memoria para '{employee_id}'.")
+        else:
+            store = get_store()
+            rows = store.find_by_employee(employee_id, _EMPLOYEE_QUERY_COLUMNS, STATUS_QUERY_LIMIT)
+            record_data_source(store.name)
+
+        ingestion_buffer = get_write_behind_buffer()
+        if ingestion_buffer is not None:
+            pending = [row for row in ingestion_buffer.pending_rows() if row.get("employee_id") == employee_id]
+            pending_ids = {row["request_id"] for row in pending}
+            rows = (pending + [row for row in rows if row["request_id"] not in pending_ids])[:STATUS_QUERY_LIMIT]
+
+        if not rows:
+            print(f"[LOG get_travel_requests_by_employee]: No se encontraron solicitudes para '{employee_id}'.")
+            return json.dumps({
+                "employee_id": employee_id,
+                "count": 0,
+                "requests": [],
+                "message": f"No se encontraron solicitudes de viaje para el empleado con ID '{employee_id}'."
+            })
+
+        output_requests = [pagination.project_row(_format_request_row(row), pagination.DEFAULT_FIELDS) for row in rows]
+        print(f"[LOG DE HERRAMIENTA get_travel_requests_by_employee]: JSON generado para '{employee_id}'.")
+        return json.dumps({
+            "employee_id": employee_id,
+            "count": len(output_requests),
+            "requests": output_requests
+        })
+
+    except Exception as e:
+        print(f"[LOG DE HERRAMIENTA get_travel_requests_by_employee - ERROR]: {e}")
+        return json.dumps({"error": f"Error técnico al consultar las solicitudes del empleado: {e}."})
+
+# --- Lógica de la Herramienta 5: Actualizar el Estado de Varias Solicitudes ---
+BULK_UPDATE_MAX_REQUESTS = 200
+
+@instrument_tool
+def bulk_update_travel_request_status(request_ids: List[str], new_status: str) -> str:
+    """Actualiza el estado de varias solicitudes de viaje en un único job de BigQuery.
+    Args:
+        request_ids (List[str]): IDs de las solicitudes a actualizar.
+        new_status (str): Nuevo estado para todas ellas (ej. 'Aprobada', 'Rechazada').
+    Returns:
+        str: Una cadena JSON con las solicitudes actualizadas, las que ya estaban en ese estado y las no encontradas, o un error.
+    """
+    final_status = _normalize_status(new_status)
+    if not final_status:
+        return json.dumps({"error": f"'{new_status}' no es un estado válido. Válidos: {', '.join(VALID_STATUSES)}."})
+    unique_ids = list(dict.fromkeys(request_id.strip() for request_id in request_ids if request_id and request_id.strip()))
+    if not unique_ids:
+        return json.dumps({"error": "No se indicó ningún ID de solicitud."})
+    if len(unique_ids) > BULK_UPDATE_MAX_REQUESTS:
+        return json.dumps({"error": f"Se pueden actualizar como máximo {BULK_UPDATE_MAX_REQUESTS} solicitudes a la vez."})
+
+    try:
+        ingestion_buffer = get_write_behind_buffer()
+        if ingestion_buffer is not None and any(ingestion_buffer.is_pending(request_id) for request_id in unique_ids):
+            if not ingestion_buffer.flush_now():
+                return json.dumps({"error": "Algunas solicitudes aún se están registrando. Inténtalo de nuevo en unos segundos."})
+
+        updated_at = datetime.datetime.now(datetime.timezone.utc)
+        previous_statuses = get_store().bulk_update_status(unique_ids, final_status, updated_at)
+
+        updated = [request_id for request_id in unique_ids if request_id in previous_statuses and previous_statuses[request_id] != final_status]
+        unchanged = [request_id for request_id in unique_ids if previous_statuses.get(request_id) == final_status]
+        not_found = [request_id for request_id in unique_ids if request_id not in previous_statuses]
+        if updated: _after_status_update(updated, final_status, updated_at)
+
+        print(f"[LOG bulk_update_travel_request_status]: {len(updated)} actualizadas a '{final_status}', {len(unchanged)} sin cambios, {len(not_found)} no encontradas.")
+        return json.dumps({
+            "new_status": final_status,
+            "updated": [{"request_id": request_id, "previous_status": previous_statuses[request_id]} for request_id in updated],
+            "already_in_status": unchanged,
+            "not_found": not_found,
+        })
+    except Exception as e:
+        print(f"[LOG bulk_update_travel_request_status - ERROR]: {e}")
+        return json.dumps({"error": f"Error técnico al actualizar las solicitudes: {e}."})
+
+# --- Lógica de la Herramienta 6: Resumen Agregado (Devuelve JSON) ---
+_SUMMARY_MONTH_FORMAT = "%Y-%m"
+
+@instrument_tool
+def get_travel_request_summary(
+    search_term: Optional[str] = None,
+    month: Optional[str] = None,
+    destination_city: Optional[str] = None,
+    transport_mode: Optional[str] = None,
+    top: int = TRAVEL_SUMMARY_TOP,
+) -> str:
+    """Recuentos de solicitudes de viaje por estado, destino, medio de transporte y mes de inicio, en una sola llamada.
+    Sale de un resumen precalculado que se actualiza cada pocos minutos (ver `refreshed_at`).
+    Args:
+        search_term (str, optional): Solo las solicitudes de este estado o término (ej. 'Aprobada', 'pendientes').
+        month (str, optional): Solo los viajes que empiezan en este mes (YYYY-MM).
+        destination_city (str, optional): Solo los viajes a esta ciudad.
+        transport_mode (str, optional): Solo los viajes con este medio de transporte (ej. 'Tren').
+        top (int, optional): Destinos a devolver, de más a menos solicitudes (por defecto 10).
+    Returns:
+        str: Una cadena JSON con `total`, `by_status`, `by_destination_city`, `by_transport_mode`, `by_month` y `refreshed_at`, o un error.
+    """
+    try:
+        statuses, case_insensitive = (None, False)
+        if search_term:
+            statuses, case_insensitive = _resolve_status_filter(search_term)
+            if not statuses:
+                return _uninterpreted_search_term(search_term)
+        if month:
+            try:
+                month = datetime.datetime.strptime(month.strip(), _SUMMARY_MONTH_FORMAT).strftime(_SUMMARY_MONTH_FORMAT)
+            except ValueError:
+                return json.dumps({"error": f"El mes '{month}' no es válido. Utiliza YYYY-MM."})
+        top = max(1, int(top or TRAVEL_SUMMARY_TOP))
+
+        counts, refreshed_at = get_travel_summary().summarize(
+            statuses, case_insensitive, month=month or None, destination_city=destination_city or None,
+            transport_mode=transport_mode or None, top=top,
+        )
+        record_data_source("travel_summary")
+        filters = {"search_term": search_term, "month": month, "destination_city": destination_city, "transport_mode": transport_mode}
+        response = {
+            "filters": {key: value for key, value in filters.items() if value},
+            **counts,
+            "refreshed_at": refreshed_at.isoformat() if refreshed_at else None,
+        }
+        print(f"[LOG get_travel_request_summary]: {response['total']} solicitudes con filtros {response['filters']}.")
+        return json.dumps(response)
+    except Exception as e:
+        print(f"[LOG get_travel_request_summary - ERROR]: {e}")
+        return json.dumps({"error": f"Error técnico al obtener el resumen de solicitudes: {e}."})
+
 # --- Definición del Agente ---
+# Consultas por estado y cambios de estado por ID inequívocos se resuelven sin el modelo (ver intent_router.py)
+intent_router = build_intent_router(get_travel_requests_by_status, count_travel_requests_by_status, update_travel_request_status)
+# Resume en cada petición al modelo las respuestas de herramientas de turnos anteriores (ver history_compaction.py)
+history_compactor = get_history_compactor()
+
+TRAVEL_AGENT_TOOLS = [
+    request_travel_booking_logic,
+    get_travel_requests_by_status,
+    count_travel_requests_by_status,
+    get_travel_requests_by_employee,
+    update_travel_request_status,
+    bulk_update_travel_request_status,
+    get_travel_request_summary,
+]
+
 company_travel_agent = LlmAgent(
     name="CompanyTravelAgent",
     description="Agente para gestionar solicitudes de viaje: registrar, consultar y actualizar estados en BigQuery.",
-    instruction=TRAVEL_AGENT_INSTRUCTION,
+    static_instruction=TRAVEL_AGENT_STATIC_INSTRUCTION, # Instrucción de sistema: fija, cacheable
+    instruction=_dynamic_instruction, # Se añade al contenido de cada petición
     model=MODEL_ID,
-    tools=[
-        request_travel_booking_logic,
-        get_travel_requests_by_status,
-        update_travel_request_status
-    ],
+    # Con ASYNC_TOOLS_ENABLED, las herramientas no bloquean el bucle de eventos (ver async_tools.py)
+    tools=[make_async_tool(tool) for tool in TRAVEL_AGENT_TOOLS] if ASYNC_TOOLS_ENABLED else TRAVEL_AGENT_TOOLS,
+    before_agent_callback=intent_router.before_agent_callback if intent_router else None,
+    # Asocia las métricas de cada herramienta a la sesión de ADK (ver telemetry.py)
+    before_tool_callback=bind_tool_session,
+    before_model_callback=history_compactor.before_model_callback if history_compactor else None,
 )
 
 # ADK buscará esta variable 'agent' por defecto en el paquete.
 agent = company_travel_agent
+
+# Si el paquete expone 'app', ADK la usa en lugar de 'agent' (necesaria para la caché de contexto
+# y para el resumen de turnos antiguos)
+app = App(
+    name="travel-agent",
+    root_agent=company_travel_agent,
+    events_compaction_config=build_events_compaction_config(),
+    context_cache_config=ContextCacheConfig(
+        cache_intervals=CONTEXT_CACHE_INTERVALS,
+        ttl_seconds=CONTEXT_CACHE_TTL_SECONDS,
+        min_tokens=CONTEXT_CACHE_MIN_TOKENS,
+    ) if CONTEXT_CACHE_ENABLED else None,
+)
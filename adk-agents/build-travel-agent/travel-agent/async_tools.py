@@ -0,0 +1,42 @@
+# mi_agente_de_viajes/sistema_de_reservas/async_tools.py
+# Versiones asíncronas de las herramientas del agente.
+#
+# ADK ejecuta las herramientas síncronas dentro del bucle de eventos del servidor FastAPI:
+# mientras una herramienta espera a `query_job.result()`, ninguna otra sesión de la
+# instancia avanza. Las versiones asíncronas envían el trabajo a un pool de hilos propio y
+# esperan su resultado con `await`, así el bucle sigue atendiendo otras sesiones. El número
+# de jobs de BigQuery simultáneos lo limita aparte BIGQUERY_MAX_CONCURRENT_JOBS (ver
+# bigquery_client.py): las lecturas servidas por el índice o la caché no ocupan hueco.
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+from .telemetry import note_executor_wait
+
+ASYNC_TOOLS_ENABLED = os.environ.get("ASYNC_TOOLS_ENABLED", "true").lower() == "true"
+# Hilos para herramientas en curso a la vez (incluidas las que esperan hueco de BigQuery)
+TOOL_EXECUTOR_WORKERS = int(os.environ.get("TOOL_EXECUTOR_WORKERS", "32"))
+
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=TOOL_EXECUTOR_WORKERS, thread_name_prefix="travel-tool")
+
+async def run_in_tool_executor(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Ejecuta fn en el pool de herramientas sin bloquear el bucle de eventos (conserva las contextvars)."""
+    context = contextvars.copy_context()
+    submitted = time.perf_counter()
+    def run():
+        note_executor_wait((time.perf_counter() - submitted) * 1000)
+        return fn(*args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_executor, context.run, run)
+
+def make_async_tool(tool: Callable[..., str]) -> Callable[..., Awaitable[str]]:
+    """Versión asíncrona de una herramienta. Conserva nombre, firma y docstring, que es lo que ADK
+    usa para declarar la herramienta al modelo.
+    """
+    @functools.wraps(tool)
+    async def async_tool(*args, **kwargs):
+        return await run_in_tool_executor(tool, *args, **kwargs)
+    return async_tool
@@ -0,0 +1,110 @@
+# mi_agente_de_viajes/sistema_de_reservas/bigquery_client.py
+# Cliente de BigQuery compartido por todas las herramientas del agente.
+# Crear un bigquery.Client() por llamada repite el descubrimiento de credenciales y abre
+# una sesión HTTP nueva (TLS incluido) dentro del turno que espera el usuario.
+import contextlib
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from .telemetry import record_queue_wait
+
+# --- Configuración de BigQuery ---
+BIGQUERY_PROJECT_ID = "fon-test-project"
+BIGQUERY_DATASET_ID = "foncorp_travel_data"
+BIGQUERY_TABLE_ID = "travel_requests"
+TABLE_REF_STR = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}"
+# Recuentos precalculados de travel_requests (ver travel_summary.py)
+BIGQUERY_SUMMARY_TABLE_ID = "travel_requests_summary"
+SUMMARY_TABLE_REF_STR = f"{BIGQUERY_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_SUMMARY_TABLE_ID}"
+
+# Conexiones keep-alive hacia bigquery.googleapis.com (una por llamada concurrente de herramienta)
+BIGQUERY_HTTP_POOL_SIZE = int(os.environ.get("BIGQUERY_HTTP_POOL_SIZE", "10"))
+_BIGQUERY_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+# Jobs de las herramientas en curso a la vez en esta instancia; el resto espera turno
+BIGQUERY_MAX_CONCURRENT_JOBS = int(os.environ.get("BIGQUERY_MAX_CONCURRENT_JOBS", "8"))
+
+if TYPE_CHECKING:
+    from google.cloud import bigquery
+
+_client = None
+_client_lock = threading.Lock()
+
+def _build_client():
+    # google-cloud-bigquery y google-auth tardan en importarse; se cargan al crear el cliente
+    import google.auth
+    import requests.adapters
+    from google.auth.transport.requests import AuthorizedSession
+    from google.cloud import bigquery
+
+    credentials, _ = google.auth.default(scopes=_BIGQUERY_SCOPES)
+    http_session = AuthorizedSession(credentials)
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=BIGQUERY_HTTP_POOL_SIZE,
+        pool_maxsize=BIGQUERY_HTTP_POOL_SIZE,
+    )
+    http_session.mount("https://", adapter)
+    return bigquery.Client(project=BIGQUERY_PROJECT_ID, credentials=credentials, _http=http_session)
+
+def get_bigquery_client() -> "bigquery.Client":
+    """Devuelve el cliente de BigQuery del proceso, creándolo la primera vez.
+    bigquery.Client es seguro entre hilos; las herramientas pueden compartirlo.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                started = time.perf_counter()
+                _client = _build_client()
+                print(f"[LOG get_bigquery_client]: Cliente creado en {(time.perf_counter() - started) * 1000:.0f} ms.")
+    return _client
+
+def warm_up() -> Optional[float]:
+    """Prepara el cliente antes del primer turno: crea el cliente, obtiene el token de
+    acceso y abre la conexión con una lectura de metadatos de la tabla (no lanza ningún job).
+    Returns:
+        float: Milisegundos empleados, o None si falló (el fallo no es fatal: la primera
+        herramienta volverá a intentarlo).
+    """
+    started = time.perf_counter()
+    try:
+        client = get_bigquery_client()
+        client.get_table(TABLE_REF_STR)
+    except Exception as e:
+        print(f"[LOG warm_up - ERROR]: No se pudo preparar BigQuery: {e}")
+        return None
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"[LOG warm_up]: BigQuery preparado en {elapsed_ms:.0f} ms.")
+    return elapsed_ms
+
+# --- Límite de jobs concurrentes ---
+_job_slots = threading.BoundedSemaphore(BIGQUERY_MAX_CONCURRENT_JOBS)
+_job_stats_lock = threading.Lock()
+_job_counters = {"jobs": 0, "queued": 0, "queue_ms": 0.0, "active": 0, "max_active": 0}
+
+@contextlib.contextmanager
+def bigquery_job_slot():
+    """Ocupa uno de los BIGQUERY_MAX_CONCURRENT_JOBS huecos mientras dura un job (envío y lectura
+    del resultado). Si no hay hueco libre, el hilo espera a que termine otro job.
+    """
+    started = time.perf_counter()
+    queued = not _job_slots.acquire(blocking=False)
+    if queued: _job_slots.acquire()
+    if queued: record_queue_wait((time.perf_counter() - started) * 1000)
+    with _job_stats_lock:
+        _job_counters["jobs"] += 1
+        _job_counters["active"] += 1
+        _job_counters["max_active"] = max(_job_counters["max_active"], _job_counters["active"])
+        if queued:
+            _job_counters["queued"] += 1
+            _job_counters["queue_ms"] += (time.perf_counter() - started) * 1000
+    try:
+        yield
+    finally:
+        with _job_stats_lock: _job_counters["active"] -= 1
+        _job_slots.release()
+
+def get_bigquery_job_stats() -> Dict[str, Any]:
+    with _job_stats_lock:
+        return dict(_job_counters, queue_ms=round(_job_counters["queue_ms"], 1), max_concurrent_jobs=BIGQUERY_MAX_CONCURRENT_JOBS)
@@ -0,0 +1,113 @@
+# mi_agente_de_viajes/sistema_de_reservas/history_compaction.py
+# Compactación del historial de las sesiones largas.
+#
+# En cada /run ADK envía al modelo todo el historial de la sesión, incluido el JSON completo
+# de cada consulta anterior (hasta 10 solicitudes con todos sus campos). En una sesión larga
+# de un responsable, cada turno pesaba más que el anterior. Dos niveles:
+# - HistoryCompactor.before_model_callback sustituye, en la petición al modelo, las
+#   respuestas de herramientas de turnos anteriores por un resumen (recuento, IDs y cursor).
+#   El historial guardado no cambia y las respuestas del turno en curso van completas. El
+#   resumen es siempre el mismo para una misma respuesta, así el prefijo sigue siendo
+#   cacheable (ver CONTEXT_CACHE_ENABLED en agent.py).
+# - build_events_compaction_config(): cuando el prompt de un turno supera
+#   HISTORY_COMPACTION_TOKEN_THRESHOLD tokens, ADK resume con el modelo del agente los eventos
+#   antiguos y conserva sin resumir los últimos HISTORY_COMPACTION_RETAINED_EVENTS.
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from google.adk.apps.app import EventsCompactionConfig
+from google.genai import types
+
+HISTORY_COMPACTION_ENABLED = os.environ.get("HISTORY_COMPACTION_ENABLED", "true").lower() == "true"
+# Respuestas de herramientas más cortas que esto se dejan como están (recuentos, cambios de estado...)
+HISTORY_COMPACTION_MIN_RESULT_CHARS = int(os.environ.get("HISTORY_COMPACTION_MIN_RESULT_CHARS", "300"))
+HISTORY_COMPACTION_TOKEN_THRESHOLD = int(os.environ.get("HISTORY_COMPACTION_TOKEN_THRESHOLD", "8000"))
+HISTORY_COMPACTION_RETAINED_EVENTS = int(os.environ.get("HISTORY_COMPACTION_RETAINED_EVENTS", "8"))
+
+_COMPACTED_NOTE = "Resultado de un turno anterior resumido. Si necesitas los detalles, vuelve a llamar a la herramienta."
+
+def summarize_tool_result(response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Resumen de una respuesta de herramienta ya presentada al usuario (None si no merece la pena).
+
+    ADK envuelve el texto que devuelven las herramientas en {"result": "..."}.
+    """
+    result = response.get("result") if isinstance(response, dict) else None
+    if not isinstance(result, str) or len(result) < HISTORY_COMPACTION_MIN_RESULT_CHARS:
+        return None
+    try:
+        data = json.loads(result)
+    except ValueError:
+        data = None
+    if isinstance(data, dict) and isinstance(data.get("requests"), list):
+        summary = {key: data[key] for key in ("search_term", "employee_id", "count", "next_cursor") if key in data}
+        summary["request_ids"] = [request["request_id"] for request in data["requests"] if request.get("request_id")]
+    else:
+        summary = {"result_excerpt": result[:HISTORY_COMPACTION_MIN_RESULT_CHARS] + "…"}
+    summary["compacted"] = _COMPACTED_NOTE
+    return summary
+
+class HistoryCompactor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {"model_requests": 0, "tool_results_compacted": 0, "chars_before": 0, "chars_after": 0}
+
+    def before_model_callback(self, callback_context, llm_request) -> None:
+        """before_model_callback de ADK: resume las respuestas de herramientas de invocaciones anteriores.
+
+        ADK quita los IDs de las llamadas antes de este punto, así que las respuestas del turno en
+        curso se identifican por posición: son las últimas de la petición.
+        """
+        invocation_id = callback_context.invocation_id
+        current = sum(
+            len(event.get_function_responses())
+            for event in callback_context.session.events if event.invocation_id == invocation_id
+        )
+        positions = [
+            (content_index, part_index)
+            for content_index, content in enumerate(llm_request.contents)
+            for part_index, part in enumerate(content.parts or [])
+            if part.function_response is not None
+        ]
+        compacted = before = after = 0
+        for content_index, part_index in positions[:max(0, len(positions) - current)]:
+            part = llm_request.contents[content_index].parts[part_index]
+            summary = summarize_tool_result(part.function_response.response)
+            if summary is None: continue
+            before += len(part.function_response.response["result"])
+            after += len(json.dumps(summary, ensure_ascii=False))
+            # Las partes de la petición son copias, pero comparten los campos anidados con los eventos de la sesión
+            part.function_response = types.FunctionResponse(id=part.function_response.id, name=part.function_response.name, response=summary)
+            compacted += 1
+        with self._lock:
+            self._counters["model_requests"] += 1
+            self._counters["tool_results_compacted"] += compacted
+            self._counters["chars_before"] += before
+            self._counters["chars_after"] += after
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(
+                self._counters,
+                chars_saved=self._counters["chars_before"] - self._counters["chars_after"],
+                token_threshold=HISTORY_COMPACTION_TOKEN_THRESHOLD,
+                retained_events=HISTORY_COMPACTION_RETAINED_EVENTS,
+            )
+
+_compactor = HistoryCompactor() if HISTORY_COMPACTION_ENABLED else None
+
+def get_history_compactor() -> Optional[HistoryCompactor]:
+    return _compactor
+
+def build_events_compaction_config() -> Optional[EventsCompactionConfig]:
+    """Resumen de turnos antiguos por umbral de tokens para la App (None si HISTORY_COMPACTION_ENABLED=false)."""
+    if not HISTORY_COMPACTION_ENABLED: return None
+    return EventsCompactionConfig(
+        token_threshold=HISTORY_COMPACTION_TOKEN_THRESHOLD,
+        event_retention_size=HISTORY_COMPACTION_RETAINED_EVENTS,
+    )
+
+def get_history_compaction_stats() -> Dict[str, Any]:
+    return dict(_compactor.stats(), enabled=True) if _compactor else {"enabled": False}
@@ -0,0 +1,291 @@
+# mi_agente_de_viajes/sistema_de_reservas/ingestion.py
+# Ingesta diferida ("write-behind") de nuevas solicitudes de viaje.
+#
+# En modo write_behind, request_travel_booking_logic no espera a un INSERT DML: añade la
+# fila a un búfer local en disco (JSONL con fsync) y devuelve el request_id al momento.
+# Un hilo en segundo plano congela el búfer en lotes y los carga con jobs de carga
+# (load jobs), que no consumen cuota de DML concurrente y, a diferencia de la inserción
+# en streaming, dejan las filas disponibles de inmediato para el UPDATE de estados.
+#
+# Semántica al menos una vez, con clave request_id:
+# - Cada lote congelado tiene un job_id determinista. Si el proceso cae después de que
+#   BigQuery acepte el job pero antes de borrar el fichero, el reintento choca con el mismo
+#   job_id (409) y se da el lote por cargado en lugar de duplicarlo. Un error de red o de
+#   sondeo tampoco cambia el job_id: solo lo hace un job que BigQuery da por fallido.
+# - Al arrancar se recuperan el búfer activo y los lotes pendientes del directorio.
+# - Dentro de un lote, un request_id repetido solo se carga una vez.
+# - Un lote que falla INGESTION_MAX_LOAD_ATTEMPTS veces (p. ej. filas que no encajan en el
+#   esquema) pasa al directorio de descartes (INGESTION_DEAD_LETTER_DIR) para revisarlo a
+#   mano, y deja de bloquear a los siguientes, que se siguen cargando.
+#
+# El directorio debe sobrevivir al proceso para que el búfer sea duradero: en Cloud Run,
+# /tmp vive en memoria; monte un volumen y apunte INGESTION_BUFFER_DIR a él. El hilo de
+# vaciado necesita CPU fuera de las peticiones (--no-cpu-throttling).
+import atexit
+import concurrent.futures
+import datetime
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .bigquery_client import TABLE_REF_STR, get_bigquery_client
+from .query_cache import get_status_query_cache
+from .request_index import get_request_index
+from .storage import bigquery_backend
+from .travel_summary import mark_travel_summary_stale
+
+# --- Configuración de la ingesta ---
+# "sync" (INSERT DML dentro del turno, comportamiento original) o "write_behind"
+INGESTION_MODE = os.environ.get("TRAVEL_REQUEST_INGESTION_MODE", "sync").lower()
+INGESTION_BUFFER_DIR = os.environ.get("INGESTION_BUFFER_DIR", "/tmp/travel-agent-ingestion")
+INGESTION_FLUSH_INTERVAL_SECONDS = float(os.environ.get("INGESTION_FLUSH_INTERVAL_SECONDS", "10"))
+INGESTION_MAX_BATCH_ROWS = int(os.environ.get("INGESTION_MAX_BATCH_ROWS", "500"))
+# Tiempo máximo que un vaciado síncrono (flush_now) espera al job de carga
+INGESTION_LOAD_TIMEOUT_SECONDS = float(os.environ.get("INGESTION_LOAD_TIMEOUT_SECONDS", "60"))
+# Jobs de carga fallidos tras los que un lote se aparta al directorio de descartes
+INGESTION_MAX_LOAD_ATTEMPTS = int(os.environ.get("INGESTION_MAX_LOAD_ATTEMPTS", "5"))
+INGESTION_DEAD_LETTER_DIR = os.environ.get("INGESTION_DEAD_LETTER_DIR", os.path.join(INGESTION_BUFFER_DIR, "dead-letter"))
+
+_ACTIVE_FILE = "active.jsonl"
+_BATCH_PREFIX = "batch-"
+
+class WriteBehindBuffer:
+    """Búfer JSONL duradero con un hilo que lo vacía a BigQuery por lotes."""
+    def __init__(self, buffer_dir, flush_interval_seconds, max_batch_rows, max_load_attempts, dead_letter_dir):
+        self._dir = buffer_dir
+        self._dead_letter_dir = dead_letter_dir
+        self._max_load_attempts = max_load_attempts
+        self._flush_interval = flush_interval_seconds
+        self._max_batch_rows = max_batch_rows
+        self._lock = threading.Lock()          # protege el fichero activo y el índice de pendientes
+        self._flush_lock = threading.Lock()    # un único vaciado a la vez
+        self._wake = threading.Event()
+        self._pending = {}                     # request_id -> fila aún no confirmada en BigQuery
+        self._active_rows = 0
+        self._thread = None
+        self._schema = None
+        self._counters = {"appended": 0, "loaded_rows": 0, "loaded_batches": 0, "duplicate_jobs": 0, "failed_loads": 0, "load_errors": 0,
+                          "dead_letter_batches": 0, "dead_letter_rows": 0}
+        os.makedirs(self._dir, exist_ok=True)
+        self._recover()
+
+    # --- Escritura ---
+    def append(self, row: Dict[str, Any]) -> None:
+        """Añade la fila al búfer y la persiste (fsync) antes de devolver."""
+        line = json.dumps(row, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            with open(self._path(_ACTIVE_FILE), "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending[row["request_id"]] = row
+            self._active_rows += 1
+            self._counters["appended"] += 1
+            # Rotar aquí garantiza que ningún lote supera INGESTION_MAX_BATCH_ROWS
+            batch_full = self._active_rows >= self._max_batch_rows
+            if batch_full: self._rotate_active_locked()
+        self._ensure_thread()
+        if batch_full: self._wake.set()
+
+    # --- Lectura de filas aún no cargadas ---
+    def pending_rows(self) -> List[Dict[str, Any]]:
+        """Filas aceptadas pero todavía no visibles en BigQuery, de la más reciente a la más antigua."""
+        with self._lock:
+            return sorted(self._pending.values(), key=lambda row: row["timestamp"], reverse=True)
+
+    def is_pending(self, request_id: str) -> bool:
+        with self._lock:
+            return request_id in self._pending
+
+    # --- Vaciado ---
+    def flush_now(self) -> bool:
+        """Congela el búfer y carga todos los lotes pendientes. Devuelve True si no queda nada pendiente."""
+        with self._flush_lock:
+            self._freeze_active()
+            # Un lote que falla no detiene a los demás: cada uno se reintenta en el siguiente ciclo
+            loaded = [self._load_batch(batch_name) for batch_name in self._batch_files()]
+            return all(loaded)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="ingestion-flusher", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=self._flush_interval)
+            self._wake.clear()
+            try:
+                self.flush_now()
+            except Exception as e:  # el hilo nunca debe morir: el siguiente ciclo reintenta
+                print(f"[LOG ingestion - ERROR]: Fallo inesperado al vaciar el búfer: {e}")
+
+    def _freeze_active(self):
+        with self._lock: self._rotate_active_locked()
+
+    def _rotate_active_locked(self):
+        # Las filas nuevas van a un fichero activo nuevo; el congelado ya no cambia
+        if os.path.exists(self._path(_ACTIVE_FILE)):
+            os.replace(self._path(_ACTIVE_FILE), self._path(f"{_BATCH_PREFIX}{time.time_ns()}-a0.jsonl"))
+        self._active_rows = 0
+
+    def _load_batch(self, batch_name) -> bool:
+        from google.api_core import exceptions as google_exceptions
+        rows = self._read_rows(batch_name)
+        if rows:
+            stem = batch_name[:-len(".jsonl")]
+            job_id = f"travel_requests_ingest_{stem.replace('-', '_')}"
+            try:
+                client = get_bigquery_client()
+                job = client.load_table_from_json(rows, TABLE_REF_STR, job_id=job_id, job_config=self._load_job_config(client))
+                job.result(timeout=INGESTION_LOAD_TIMEOUT_SECONDS)
+            except concurrent.futures.TimeoutError:
+                # El job sigue en curso: se conserva el job_id para no cargar el lote dos veces
+                print(f"[LOG ingestion]: El job {job_id} sigue en curso; se comprobará en el siguiente ciclo.")
+                return False
+            except google_exceptions.Conflict:
+                # El job ya existe: un intento anterior llegó a BigQuery antes de la caída
+                job = client.get_job(job_id)
+                with self._lock: self._counters["duplicate_jobs"] += 1
+                try:
+                    job.result(timeout=INGESTION_LOAD_TIMEOUT_SECONDS)
+                except concurrent.futures.TimeoutError:
+                    return False
+                except Exception as e:
+                    return self._handle_load_error(batch_name, job_id, f"{job_id} (existente): {e}")
+            except Exception as e:
+                return self._handle_load_error(batch_name, job_id, f"{job_id}: {e}")
+            print(f"[LOG ingestion]: Lote {batch_name} cargado ({len(rows)} filas, job {job_id}).")
+            # Las consultas en caché de esos estados y el resumen no incluyen las filas recién cargadas
+            status_cache = get_status_query_cache()
+            if status_cache: status_cache.invalidate(statuses={row["status"] for row in rows})
+            mark_travel_summary_stale()
+        request_index = get_request_index()
+        with self._lock:
+            # Bajo el mismo lock: la fila pasa de pendiente al índice sin quedar fuera de ambos.
+            # Sin esto no aparecería hasta la siguiente sincronización, o hasta la recarga completa
+            # si se cargó más de INDEX_SYNC_OVERLAP_SECONDS después de su timestamp
+            for row in rows:
+                self._pending.pop(row["request_id"], None)
+                if request_index: request_index.upsert(dict(row, timestamp=datetime.datetime.fromisoformat(row["timestamp"])))
+            self._counters["loaded_rows"] += len(rows)
+            self._counters["loaded_batches"] += 1
+        os.remove(self._path(batch_name))
+        return True
+
+    def _handle_load_error(self, batch_name, job_id, detail):
+        # Un error de red o de sondeo no dice nada del job: puede haber terminado bien en BigQuery.
+        # Solo un job terminado con error_result justifica un job_id nuevo; con cualquier otro
+        # estado se conserva el job_id y el siguiente ciclo lo resuelve (409 y get_job) sin duplicar filas
+        if self._job_failed(job_id): return self._record_failure(batch_name, detail)
+        print(f"[LOG ingestion - ERROR]: Error al cargar el lote {batch_name}: {detail}. Se reintentará con el mismo job.")
+        with self._lock: self._counters["load_errors"] += 1
+        return False
+
+    def _job_failed(self, job_id) -> bool:
+        from google.api_core import exceptions as google_exceptions
+        try:
+            job = get_bigquery_client().get_job(job_id)
+        except google_exceptions.NotFound:
+            return False  # el job no llegó a crearse: el mismo job_id sigue libre
+        except Exception as e:
+            print(f"[LOG ingestion - ERROR]: No se pudo consultar el job {job_id}: {e}")
+            return False
+        return job.state == "DONE" and job.error_result is not None
+
+    def _record_failure(self, batch_name, detail):
+        print(f"[LOG ingestion - ERROR]: No se pudo cargar el lote {batch_name}: {detail}")
+        with self._lock: self._counters["failed_loads"] += 1
+        prefix, _, attempt = batch_name[:-len(".jsonl")].rpartition("-a")
+        attempts = int(attempt or 0) + 1
+        if attempts >= self._max_load_attempts:
+            self._dead_letter(batch_name, attempts)
+        else:
+            # Un job fallido no puede reutilizar su job_id: el siguiente intento usa uno nuevo
+            os.replace(self._path(batch_name), self._path(f"{prefix}-a{attempts}.jsonl"))
+        return False
+
+    def _dead_letter(self, batch_name, attempts):
+        # Sus filas ya no llegarán a BigQuery por esta vía: dejan de servirse como pendientes
+        rows = self._read_rows(batch_name)
+        os.makedirs(self._dead_letter_dir, exist_ok=True)
+        os.replace(self._path(batch_name), os.path.join(self._dead_letter_dir, batch_name))
+        with self._lock:
+            for row in rows: self._pending.pop(row["request_id"], None)
+            self._counters["dead_letter_batches"] += 1
+            self._counters["dead_letter_rows"] += len(rows)
+        print(
+            f"[LOG ingestion - ERROR]: Lote {batch_name} descartado tras {attempts} intentos "
+            f"({len(rows)} filas); movido a {self._dead_letter_dir} para revisión manual."
+        )
+
+    def _load_job_config(self, client):
+        from google.cloud import bigquery
+        # Esquema de la tabla (una sola lectura): evita la autodetección de tipos en cada carga
+        if self._schema is None: self._schema = client.get_table(TABLE_REF_STR).schema
+        return bigquery.LoadJobConfig(
+            schema=self._schema,
+            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        )
+
+    # --- Recuperación y utilidades ---
+    def _recover(self):
+        for name in [_ACTIVE_FILE] + self._batch_files():
+            for row in self._read_rows(name): self._pending[row["request_id"]] = row
+        if self._pending:
+            print(f"[LOG ingestion]: Recuperadas {len(self._pending)} filas pendientes de {self._dir}.")
+            self._active_rows = len(self._read_rows(_ACTIVE_FILE))
+            self._ensure_thread()
+            self._wake.set()
+
+    def _read_rows(self, name) -> List[Dict[str, Any]]:
+        rows_by_id = {}
+        try:
+            with open(self._path(name), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # línea truncada por una caída durante la escritura
+                    rows_by_id[row["request_id"]] = row
+        except FileNotFoundError:
+            pass
+        return list(rows_by_id.values())
+
+    def _batch_files(self):
+        # El nombre lleva time_ns, así que el orden alfabético es el orden de llegada
+        return sorted(name for name in os.listdir(self._dir) if name.startswith(_BATCH_PREFIX) and name.endswith(".jsonl"))
+
+    def _path(self, name):
+        return os.path.join(self._dir, name)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, pending_rows=len(self._pending), dead_letter_dir=self._dead_letter_dir)
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+def write_behind_enabled() -> bool:
+    # Los jobs de carga son de BigQuery; con el backend local las inserciones ya son inmediatas
+    return INGESTION_MODE == "write_behind" and bigquery_backend()
+
+def get_write_behind_buffer() -> Optional[WriteBehindBuffer]:
+    """Búfer del proceso (None en modo sync). Se crea, y recupera lo pendiente, en la primera llamada."""
+    global _buffer
+    if not write_behind_enabled(): return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = WriteBehindBuffer(
+                    INGESTION_BUFFER_DIR, INGESTION_FLUSH_INTERVAL_SECONDS, INGESTION_MAX_BATCH_ROWS,
+                    INGESTION_MAX_LOAD_ATTEMPTS, INGESTION_DEAD_LETTER_DIR,
+                )
+                # Último vaciado al apagar (SIGTERM de Cloud Run); lo que no llegue se recupera al arrancar
+                atexit.register(_buffer.flush_now)
+    return _buffer
@@ -0,0 +1,211 @@
+# mi_agente_de_viajes/sistema_de_reservas/intent_router.py
+# Ruta rápida sin modelo para las peticiones más frecuentes.
+#
+# "Muéstrame las solicitudes aprobadas" costaba dos pasadas de Gemini: una para elegir
+# get_travel_requests_by_status y otra para dar formato al JSON, aunque la interpretación
+# del término ya es por reglas. Este router se ejecuta como before_agent_callback: si el
+# mensaje completo encaja en uno de los patrones (consulta o recuento por estado, página
+# siguiente de una consulta suya, o cambio de estado de una solicitud por su ID) llama a la
+# herramienta directamente y responde con una plantilla; la respuesta queda en el historial
+# de la sesión como cualquier otra respuesta del agente.
+#
+# Los patrones cubren el mensaje entero (tras quitar tildes, mayúsculas y cortesías): si hay
+# cualquier otra cosa (un destino, un nombre, dos IDs, una pregunta adicional...) la petición
+# es ambigua y sigue el camino normal del modelo.
+import json
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from google.genai import types
+
+from .async_tools import run_in_tool_executor
+from .telemetry import bind_session
+
+INTENT_ROUTER_ENABLED = os.environ.get("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+
+# Estado de la sesión: cursor de la última consulta respondida por el router, para "ver más"
+_STATE_SEARCH_TERM = "intent_router_search_term"
+_STATE_NEXT_CURSOR = "intent_router_next_cursor"
+
+# Término (sin tildes, en singular) -> (search_term para la herramienta, etiqueta singular, etiqueta plural)
+_LOOKUP_TERMS = {
+    "registrada": ("Registrada", "registrada", "registradas"),
+    "pendiente": ("pendientes", "pendiente", "pendientes"),
+    "nueva": ("nuevas", "nueva", "nuevas"),
+    "sin aprobar": ("sin aprobar", "sin aprobar", "sin aprobar"),
+    "aprobada": ("Aprobada", "aprobada", "aprobadas"),
+    "rechazada": ("Rechazada", "rechazada", "rechazadas"),
+    "reservada": ("Reservada", "reservada", "reservadas"),
+    "completada": ("Completada", "completada", "completadas"),
+    "cancelada": ("Cancelada", "cancelada", "canceladas"),
+}
+# Estado destino de un cambio de estado (sin tildes) -> estado válido
+_UPDATE_STATUSES = {
+    "registrada": "Registrada",
+    "pendiente de aprobacion": "Pendiente de Aprobación",
+    "pendiente": "Pendiente de Aprobación",
+    "aprobada": "Aprobada",
+    "rechazada": "Rechazada",
+    "reservada": "Reservada",
+    "completada": "Completada",
+    "cancelada": "Cancelada",
+}
+_UPDATE_VERBS = {
+    "aprueba": "Aprobada", "aprobar": "Aprobada",
+    "rechaza": "Rechazada", "rechazar": "Rechazada",
+    "cancela": "Cancelada", "cancelar": "Cancelada",
+    "reserva": "Reservada", "reservar": "Reservada",
+    "completa": "Completada", "completar": "Completada",
+}
+
+_UUID = r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+_LOOKUP_STATUS = r"(?P<status>registradas?|pendientes?|nuevas?|sin aprobar|aprobadas?|rechazadas?|reservadas?|completadas?|canceladas?)"
+_REQUESTS = r"(?:solicitudes|peticiones)(?: de viaje)?"
+_IN_STATUS = r"(?:(?:en|con) (?:el )?estado |que (?:estan|hay|esten) )?"
+_REQUEST = r"(?:la )?(?:solicitud|peticion)(?: de viaje)?(?: (?:con )?id)?:?"
+
+_SHOW = r"(?:muestrame|muestra|ensename|ensena|dame|lista|listame|consulta|busca|buscame|quiero ver|ver)"
+_LOOKUP_PATTERNS = [
+    re.compile(rf"^(?:{_SHOW} )?(?:(?:todas )?las )?{_REQUESTS} {_IN_STATUS}{_LOOKUP_STATUS}$"),
+    re.compile(rf"^{_SHOW} (?:todas )?las {_LOOKUP_STATUS}$"),
+    re.compile(rf"^(?:que|cuales son las) {_REQUESTS} (?:hay |estan )?{_LOOKUP_STATUS}(?: hay)?$"),
+]
+_COUNT_PATTERNS = [
+    re.compile(rf"^cuantas {_REQUESTS} (?:hay )?{_IN_STATUS}{_LOOKUP_STATUS}(?: hay)?$"),
+    re.compile(rf"^cuantas {_LOOKUP_STATUS} hay$"),
+]
+_NEXT_PAGE_PATTERN = re.compile(
+    r"^(?:(?:si|vale|ok|claro) )?(?:(?:muestrame|ensename|dame|ver|quiero ver) )?(?:las )?(?:siguientes|mas)(?: solicitudes)?$"
+    r"|^(?:si|vale|ok|claro)$"
+)
+_UPDATE_PATTERNS = [
+    re.compile(rf"^(?P<verb>{'|'.join(_UPDATE_VERBS)}) {_REQUEST} (?P<request_id>{_UUID})$"),
+    re.compile(
+        rf"^(?:cambia|actualiza|pon|pasa|marca)(?: el estado de)? {_REQUEST} (?P<request_id>{_UUID}) "
+        rf"(?:a|como|en)(?: el)?(?: estado)? (?P<status>{'|'.join(sorted(_UPDATE_STATUSES, key=len, reverse=True))})$"
+    ),
+]
+_COURTESY_PREFIX = re.compile(r"^(?:hola|buenas|buenos dias|buenas tardes|por favor|oye)\b ?")
+_COURTESY_SUFFIX = re.compile(r" ?\b(?:por favor|gracias)$")
+
+def normalize_message(text: str) -> str:
+    """Minúsculas, sin tildes ni signos de puntuación y sin cortesías al principio o al final."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[¿¡?!.,;]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    while True:
+        stripped = _COURTESY_SUFFIX.sub("", _COURTESY_PREFIX.sub("", text)).strip()
+        if stripped == text: return text
+        text = stripped
+
+def _lookup_term(status_word: str) -> Tuple[str, str, str]:
+    return _LOOKUP_TERMS[status_word if status_word == "sin aprobar" else status_word.rstrip("s")]
+
+def _count_label(count: int, term: Tuple[str, str, str]) -> str:
+    return f"{count} solicitud {term[1]}" if count == 1 else f"{count} solicitudes {term[2]}"
+
+def render_requests(result: Dict[str, Any], term: Tuple[str, str, str]) -> str:
+    """Respuesta en el formato que el prompt pide al modelo para get_travel_requests_by_status."""
+    if "error" in result:
+        return f"Hubo un error al consultar las solicitudes: {result['error']}"
+    if not result.get("requests"):
+        return result.get("message") or f"No se encontraron solicitudes de viaje {term[2]}."
+    lines = [f"He encontrado {_count_label(result['count'], term)}. Aquí están:"]
+    for request in result["requests"]:
+        lines.append(
+            f"- ID: {request['request_id']}, Empleado: {request['employee_name']}, Destino: {request['destination_city']}, "
+            f"Fechas: {request['start_date']} a {request['end_date']}, Motivo: {request['reason']}"
+        )
+    if result.get("next_cursor"):
+        lines.append("Hay más solicitudes; ¿quieres ver las siguientes?")
+    return "\n".join(lines)
+
+class IntentRouter:
+    def __init__(self, lookup_tool: Callable[..., str], count_tool: Callable[..., str], update_tool: Callable[..., str]):
+        self._lookup_tool = lookup_tool
+        self._count_tool = count_tool
+        self._update_tool = update_tool
+        self._lock = threading.Lock()
+        self._counters = {"status_lookup": 0, "status_count": 0, "next_page": 0, "status_update": 0, "fallback": 0}
+
+    def route(self, text: str, state: Dict[str, Any]) -> Optional[str]:
+        """Respuesta para el mensaje si es inequívoco, o None si debe resolverlo el modelo.
+        `state` es el estado de la sesión: se lee y actualiza el cursor de "ver más".
+        """
+        message = normalize_message(text)
+        intent, reply = self._dispatch(message, state)
+        if intent != "next_page" and intent != "status_lookup":
+            # El cursor solo vale para responder a la pregunta que acompaña a la última página
+            if state.get(_STATE_NEXT_CURSOR): state[_STATE_NEXT_CURSOR] = None
+        with self._lock: self._counters[intent or "fallback"] += 1
+        if intent: print(f"[LOG intent_router]: '{message}' resuelto sin modelo ({intent}).")
+        return reply
+
+    def _dispatch(self, message, state):
+        for pattern in _LOOKUP_PATTERNS:
+            match = pattern.match(message)
+            if match:
+                term = _lookup_term(match.group("status"))
+                return "status_lookup", self._lookup(term, None, state)
+        for pattern in _COUNT_PATTERNS:
+            match = pattern.match(message)
+            if match:
+                term = _lookup_term(match.group("status"))
+                result = json.loads(self._count_tool(term[0]))
+                if "error" in result: return "status_count", f"Hubo un error al contar las solicitudes: {result['error']}"
+                return "status_count", f"Hay {_count_label(result['total'], term)}."
+        if state.get(_STATE_NEXT_CURSOR) and _NEXT_PAGE_PATTERN.match(message):
+            term = next(t for t in _LOOKUP_TERMS.values() if t[0] == state.get(_STATE_SEARCH_TERM))
+            return "next_page", self._lookup(term, state[_STATE_NEXT_CURSOR], state)
+        for pattern in _UPDATE_PATTERNS:
+            match = pattern.match(message)
+            if match:
+                groups = match.groupdict()
+                new_status = _UPDATE_VERBS[groups["verb"]] if groups.get("verb") else _UPDATE_STATUSES[groups["status"]]
+                return "status_update", self._update_tool(match.group("request_id"), new_status)
+        return None, None
+
+    def _lookup(self, term, cursor, state):
+        result = json.loads(self._lookup_tool(term[0], cursor=cursor))
+        state[_STATE_SEARCH_TERM] = term[0]
+        state[_STATE_NEXT_CURSOR] = result.get("next_cursor")
+        return render_requests(result, term)
+
+    async def before_agent_callback(self, callback_context) -> Optional[types.Content]:
+        """before_agent_callback de ADK: devolver contenido termina el turno sin llamar al modelo.
+        Las herramientas se ejecutan en el pool de herramientas para no bloquear el bucle de eventos.
+        """
+        user_content = callback_context.user_content
+        if user_content is None or not user_content.parts or any(part.text is None for part in user_content.parts):
+            return None
+        try:
+            text = "".join(part.text for part in user_content.parts)
+            bind_session(callback_context.session.id)
+            reply = await run_in_tool_executor(self.route, text, callback_context.state)
+        except Exception as e:  # ante cualquier fallo del router, el modelo atiende la petición
+            print(f"[LOG intent_router - ERROR]: {e}")
+            return None
+        if reply is None: return None
+        return types.Content(role="model", parts=[types.Part(text=reply)])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            routed = sum(count for intent, count in self._counters.items() if intent != "fallback")
+            total = routed + self._counters["fallback"]
+            return dict(self._counters, routed_ratio=round(routed / total, 3) if total else None)
+
+_router = None
+
+def build_intent_router(lookup_tool, count_tool, update_tool) -> Optional[IntentRouter]:
+    """Crea el router del proceso con las herramientas del agente (None si INTENT_ROUTER_ENABLED=false)."""
+    global _router
+    if not INTENT_ROUTER_ENABLED: return None
+    _router = IntentRouter(lookup_tool, count_tool, update_tool)
+    return _router
+
+def get_intent_router_stats() -> Dict[str, Any]:
+    return dict(_router.stats(), enabled=True) if _router else {"enabled": False}
@@ -0,0 +1,81 @@
+# mi_agente_de_viajes/sistema_de_reservas/pagination.py
+# Paginación por clave (keyset) y proyección de columnas para las consultas por estado.
+#
+# Las páginas se ordenan por (timestamp DESC, request_id DESC). El cursor es opaco para el
+# modelo: codifica la última fila mostrada y una huella del filtro, de modo que un cursor
+# no se puede reutilizar con otra búsqueda. Pedir la página siguiente no vuelve a leer las
+# anteriores (a diferencia de OFFSET).
+import base64
+import datetime
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+
+# Campo del JSON de las herramientas -> columnas de BigQuery que necesita
+PROJECTABLE_FIELDS = {
+    "request_id": ["request_id"],
+    "employee_name": ["employee_first_name", "employee_last_name"],
+    "employee_id": ["employee_id"],
+    "origin_city": ["origin_city"],
+    "destination_city": ["destination_city"],
+    "start_date": ["start_date"],
+    "end_date": ["end_date"],
+    "transport_mode": ["transport_mode"],
+    "car_type": ["car_type"],
+    "reason": ["reason"],
+    "status": ["status"],
+}
+DEFAULT_FIELDS = [
+    "request_id", "employee_name", "origin_city", "destination_city", "start_date", "end_date",
+    "transport_mode", "car_type", "reason", "status",
+]
+
+class InvalidCursorError(ValueError):
+    pass
+
+def resolve_fields(fields: Optional[List[str]]) -> List[str]:
+    """Campos pedidos (request_id siempre incluido). Lanza ValueError si alguno no existe."""
+    if not fields: return list(DEFAULT_FIELDS)
+    unknown = [field for field in fields if field not in PROJECTABLE_FIELDS]
+    if unknown:
+        raise ValueError(f"Campos no válidos: {', '.join(unknown)}. Válidos: {', '.join(PROJECTABLE_FIELDS)}.")
+    return ["request_id"] + [field for field in dict.fromkeys(fields) if field != "request_id"]
+
+def select_columns(fields: List[str]) -> List[str]:
+    """Columnas del SELECT: las de los campos pedidos más la clave de paginación."""
+    columns = ["timestamp", "request_id"]
+    for field in fields:
+        columns.extend(column for column in PROJECTABLE_FIELDS[field] if column not in columns)
+    return columns
+
+def filter_fingerprint(match_mode: str, values: List[Any]) -> str:
+    return hashlib.sha256(json.dumps([match_mode, values], default=str).encode("utf-8")).hexdigest()[:12]
+
+def _as_datetime(value) -> datetime.datetime:
+    if isinstance(value, datetime.datetime): return value
+    return datetime.datetime.fromisoformat(str(value))
+
+def keyset(row: Dict[str, Any]) -> Tuple[datetime.datetime, str]:
+    """Clave de orden de una fila, tanto si viene de BigQuery como del búfer de ingesta (ISO 8601)."""
+    return _as_datetime(row["timestamp"]), str(row["request_id"])
+
+def encode_cursor(row: Dict[str, Any], fingerprint: str) -> str:
+    timestamp, request_id = keyset(row)
+    payload = json.dumps({"t": timestamp.isoformat(), "i": request_id, "f": fingerprint}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, fingerprint: str) -> Tuple[datetime.datetime, str]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        position = (datetime.datetime.fromisoformat(payload["t"]), payload["i"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError("Cursor no válido.") from e
+    if payload.get("f") != fingerprint:
+        raise InvalidCursorError("El cursor pertenece a otra búsqueda.")
+    return position
+
+def project_row(formatted_row: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    return {field: formatted_row.get(field) for field in fields}
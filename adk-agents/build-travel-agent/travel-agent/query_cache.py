@@ -0,0 +1,93 @@
+# mi_agente_de_viajes/sistema_de_reservas/query_cache.py
+# Caché TTL+LRU de las consultas por estado de get_travel_requests_by_status.
+#
+# Los responsables piden "pendientes" o "aprobadas" varias veces en pocos minutos; cada
+# consulta era un job de BigQuery nuevo. La clave es el conjunto de estados resuelto y el
+# límite. Las escrituras del propio proceso invalidan con precisión:
+# - un INSERT o UPDATE invalida las entradas que incluyen el estado escrito (la fila pasa a
+#   ser la más reciente de ese estado);
+# - un UPDATE invalida además las entradas que contienen la solicitud (su estado anterior).
+#   Una entrada del estado anterior que no contenga la fila no cambia: la fila no estaba
+#   entre las mostradas y el resto del orden se mantiene.
+# El TTL acota lo que pueden tardar en verse las escrituras de otras instancias.
+import collections
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+STATUS_CACHE_ENABLED = os.environ.get("STATUS_CACHE_ENABLED", "true").lower() == "true"
+STATUS_CACHE_TTL_SECONDS = float(os.environ.get("STATUS_CACHE_TTL_SECONDS", "120"))
+STATUS_CACHE_MAX_ENTRIES = int(os.environ.get("STATUS_CACHE_MAX_ENTRIES", "64"))
+
+_CacheEntry = collections.namedtuple("_CacheEntry", "expires_at statuses rows bytes_processed")
+
+class StatusQueryCache:
+    def __init__(self, max_entries, ttl_seconds):
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # clave -> _CacheEntry, la menos usada primero
+        # Cada invalidación incrementa la generación: un resultado calculado antes de una
+        # escritura no se guarda aunque la consulta termine después
+        self._generation = 0
+        self._counters = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0, "bytes_saved": 0}
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def get(self, key) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                if entry is not None: del self._entries[key]
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            self._counters["bytes_saved"] += entry.bytes_processed or 0
+            return entry.rows
+
+    def put(self, key, statuses: Iterable[str], rows: List[Dict[str, Any]], bytes_processed: Optional[int], generation: int) -> None:
+        with self._lock:
+            if generation != self._generation: return
+            self._entries[key] = _CacheEntry(
+                time.monotonic() + self._ttl, frozenset(s.lower() for s in statuses), rows, bytes_processed,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def invalidate(self, statuses: Iterable[str] = (), request_ids: Iterable[str] = ()) -> int:
+        """Elimina las entradas que incluyen alguno de los estados o alguna de las solicitudes indicadas."""
+        lowered = {s.lower() for s in statuses if s}
+        request_ids = set(request_ids)
+        with self._lock:
+            self._generation += 1
+            stale = [
+                key for key, entry in self._entries.items()
+                if entry.statuses & lowered or any(row.get("request_id") in request_ids for row in entry.rows)
+            ]
+            for key in stale: del self._entries[key]
+            self._counters["invalidations"] += len(stale)
+            return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return dict(
+                self._counters,
+                entries=len(self._entries),
+                hit_ratio=round(self._counters["hits"] / lookups, 3) if lookups else None,
+            )
+
+_status_query_cache = StatusQueryCache(STATUS_CACHE_MAX_ENTRIES, STATUS_CACHE_TTL_SECONDS)
+
+def get_status_query_cache() -> Optional[StatusQueryCache]:
+    """Caché del proceso, o None si STATUS_CACHE_ENABLED=false."""
+    return _status_query_cache if STATUS_CACHE_ENABLED else None
+
+def get_status_query_cache_stats() -> Dict[str, Any]:
+    return dict(_status_query_cache.stats(), enabled=STATUS_CACHE_ENABLED, ttl_seconds=STATUS_CACHE_TTL_SECONDS)
@@ -0,0 +1,211 @@
+# mi_agente_de_viajes/sistema_de_reservas/request_index.py
+# Réplica en memoria de travel_requests, indexada por request_id, status y employee_id.
+#
+# La tabla es pequeña: se carga entera una vez y después se mantiene al día consultando
+# solo las filas con `timestamp` posterior a la última marca de agua (el UPDATE de estado
+# ya actualiza `timestamp`). Cada consulta incremental se solapa INDEX_SYNC_OVERLAP_SECONDS
+# con la anterior para recoger filas confirmadas con un timestamp algo anterior (p. ej. los
+# lotes de la ingesta diferida, que se cargan segundos después de generarse la fila).
+# Una recarga completa periódica recoge cualquier fila fuera de esa ventana.
+#
+# Las lecturas solo usan el índice si la última sincronización correcta es más reciente que
+# INDEX_MAX_STALENESS_SECONDS; si no, las herramientas vuelven a consultar BigQuery.
+#
+# Las consultas de sincronización ocupan un hueco de bigquery_job_slot() como las de las
+# herramientas (y cuentan en get_bigquery_job_stats); sus bytes y slot-ms se acumulan en stats().
+import heapq
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from .bigquery_client import TABLE_REF_STR, bigquery_job_slot, get_bigquery_client
+from .storage import bigquery_backend
+from .telemetry import record_bigquery_job
+
+INDEX_ENABLED = os.environ.get("TRAVEL_INDEX_ENABLED", "true").lower() == "true"
+INDEX_SYNC_INTERVAL_SECONDS = float(os.environ.get("INDEX_SYNC_INTERVAL_SECONDS", "5"))
+INDEX_MAX_STALENESS_SECONDS = float(os.environ.get("INDEX_MAX_STALENESS_SECONDS", "30"))
+INDEX_SYNC_OVERLAP_SECONDS = float(os.environ.get("INDEX_SYNC_OVERLAP_SECONDS", "120"))
+INDEX_FULL_RESYNC_SECONDS = float(os.environ.get("INDEX_FULL_RESYNC_SECONDS", "3600"))
+
+_COLUMNS = (
+    "request_id, timestamp, employee_first_name, employee_last_name, employee_id, "
+    "origin_city, destination_city, start_date, end_date, transport_mode, car_type, reason, status"
+)
+
+class TravelRequestIndex:
+    def __init__(self, sync_interval_seconds, max_staleness_seconds, overlap_seconds, full_resync_seconds):
+        self._sync_interval = sync_interval_seconds
+        self._max_staleness = max_staleness_seconds
+        self._overlap = overlap_seconds
+        self._full_resync = full_resync_seconds
+        self._lock = threading.Lock()
+        self._rows = {}          # request_id -> fila
+        self._by_status = {}     # status -> {request_id}
+        self._by_employee = {}   # employee_id -> {request_id}
+        self._watermark = None   # mayor timestamp visto en BigQuery
+        self._last_sync_ok = None
+        self._last_full_sync = None
+        self._thread = None
+        self._counters = {"full_syncs": 0, "incremental_syncs": 0, "rows_applied": 0, "sync_errors": 0, "bytes_processed": 0, "slot_ms": 0}
+
+    # --- Sincronización ---
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None: return
+            self._thread = threading.Thread(target=self._run, name="travel-index-sync", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                full = self._last_full_sync is None or time.monotonic() - self._last_full_sync >= self._full_resync
+                self.sync(full=full)
+            except Exception as e:
+                with self._lock: self._counters["sync_errors"] += 1
+                print(f"[LOG request_index - ERROR]: Fallo al sincronizar el índice: {e}")
+            time.sleep(self._sync_interval)
+
+    def sync(self, full: bool = False) -> int:
+        """Carga la tabla entera (full) o las filas nuevas desde la marca de agua. Devuelve las filas aplicadas."""
+        client = get_bigquery_client()
+        if full or self._watermark is None:
+            query = f"SELECT {_COLUMNS} FROM `{TABLE_REF_STR}`"
+            job_config = None
+        else:
+            query = f"""
+                SELECT {_COLUMNS} FROM `{TABLE_REF_STR}`
+                WHERE timestamp > TIMESTAMP_SUB(@watermark, INTERVAL {int(self._overlap)} SECOND)
+            """
+            from google.cloud import bigquery
+            job_config = bigquery.QueryJobConfig(
+                query_parameters=[bigquery.ScalarQueryParameter("watermark", "TIMESTAMP", self._watermark)]
+            )
+        synced_at = time.monotonic()
+        with bigquery_job_slot():
+            query_job = client.query(query, job_config=job_config)
+            rows = [dict(row.items()) for row in query_job.result()]
+        record_bigquery_job(query_job)
+
+        if full or self._watermark is None:
+            self._replace_all(rows)
+        else:
+            with self._lock:
+                for row in rows: self._upsert_locked(row)
+        with self._lock:
+            for row in rows:
+                if row.get("timestamp") and (self._watermark is None or row["timestamp"] > self._watermark):
+                    self._watermark = row["timestamp"]
+            self._last_sync_ok = synced_at
+            self._counters["rows_applied"] += len(rows)
+            self._counters["bytes_processed"] += query_job.total_bytes_processed or 0
+            self._counters["slot_ms"] += query_job.slot_millis or 0
+            if full or self._last_full_sync is None:
+                self._last_full_sync = synced_at
+                self._counters["full_syncs"] += 1
+            else:
+                self._counters["incremental_syncs"] += 1
+        return len(rows)
+
+    def _replace_all(self, rows):
+        by_id, by_status, by_employee = {}, {}, {}
+        for row in rows:
+            by_id[row["request_id"]] = row
+            by_status.setdefault(row.get("status"), set()).add(row["request_id"])
+            by_employee.setdefault(row.get("employee_id"), set()).add(row["request_id"])
+        with self._lock:
+            self._rows, self._by_status, self._by_employee = by_id, by_status, by_employee
+            self._watermark = None
+
+    def _upsert_locked(self, row):
+        request_id = row["request_id"]
+        previous = self._rows.get(request_id)
+        if previous is not None:
+            # Una fila más antigua que la ya indexada (p. ej. del solape) no la sustituye
+            if previous.get("timestamp") and row.get("timestamp") and row["timestamp"] < previous["timestamp"]: return
+            self._by_status.get(previous.get("status"), set()).discard(request_id)
+            self._by_employee.get(previous.get("employee_id"), set()).discard(request_id)
+        self._rows[request_id] = row
+        self._by_status.setdefault(row.get("status"), set()).add(request_id)
+        self._by_employee.setdefault(row.get("employee_id"), set()).add(request_id)
+
+    # --- Escrituras locales (write-through tras confirmarse en BigQuery) ---
+    def upsert(self, row: Dict[str, Any]) -> None:
+        with self._lock: self._upsert_locked(dict(row))
+
+    def apply_status_update(self, request_id: str, new_status: str, timestamp) -> None:
+        with self._lock:
+            previous = self._rows.get(request_id)
+            if previous is not None: self._upsert_locked(dict(previous, status=new_status, timestamp=timestamp))
+
+    # --- Lecturas ---
+    def is_fresh(self) -> bool:
+        with self._lock:
+            return self._last_sync_ok is not None and time.monotonic() - self._last_sync_ok <= self._max_staleness
+
+    def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._rows.get(request_id)
+
+    def find_by_status(self, statuses: Iterable[str], case_insensitive: bool, limit: int, after=None) -> List[Dict[str, Any]]:
+        """Filas con alguno de los estados, de la más reciente a la más antigua (ORDER BY timestamp DESC,
+        request_id DESC). `after` es la clave (timestamp, request_id) de la última fila de la página anterior.
+        """
+        with self._lock:
+            return self._newest_locked(self._status_ids_locked(statuses, case_insensitive), limit, after)
+
+    def count_by_status(self, statuses: Iterable[str], case_insensitive: bool) -> int:
+        with self._lock:
+            return len(self._status_ids_locked(statuses, case_insensitive))
+
+    def _status_ids_locked(self, statuses, case_insensitive):
+        wanted = {s.lower() for s in statuses} if case_insensitive else set(statuses)
+        ids = set()
+        for status, status_ids in self._by_status.items():
+            key = status.lower() if case_insensitive and status else status
+            if key in wanted: ids |= status_ids
+        return ids
+
+    def find_by_employee(self, employee_id: str, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self._newest_locked(self._by_employee.get(employee_id, ()), limit)
+
+    def _newest_locked(self, ids, limit, after=None):
+        rows = (self._rows[request_id] for request_id in ids if self._rows[request_id].get("timestamp") is not None)
+        if after is not None: rows = (row for row in rows if (row["timestamp"], row["request_id"]) < after)
+        return heapq.nlargest(limit, rows, key=lambda row: (row["timestamp"], row["request_id"]))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(
+                self._counters,
+                rows=len(self._rows),
+                watermark=self._watermark,
+                seconds_since_sync=round(time.monotonic() - self._last_sync_ok, 1) if self._last_sync_ok else None,
+                fresh=self._last_sync_ok is not None and time.monotonic() - self._last_sync_ok <= self._max_staleness,
+            )
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_request_index() -> Optional[TravelRequestIndex]:
+    """Índice del proceso (None si TRAVEL_INDEX_ENABLED=false o el backend no es BigQuery).
+    La primera llamada arranca la sincronización.
+    """
+    global _index
+    if not INDEX_ENABLED or not bigquery_backend(): return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = TravelRequestIndex(
+                    INDEX_SYNC_INTERVAL_SECONDS, INDEX_MAX_STALENESS_SECONDS,
+                    INDEX_SYNC_OVERLAP_SECONDS, INDEX_FULL_RESYNC_SECONDS,
+                )
+                _index.start()
+    return _index
+
+def get_fresh_request_index() -> Optional[TravelRequestIndex]:
+    """El índice solo si está dentro de la cota de antigüedad; None indica que hay que ir a BigQuery."""
+    index = get_request_index()
+    return index if index is not None and index.is_fresh() else None
@@ -0,0 +1,379 @@
+# mi_agente_de_viajes/sistema_de_reservas/storage.py
+# Almacenamiento de las solicitudes de viaje detrás de una interfaz común.
+#
+# Las herramientas solo conocen TravelRequestStore: insertar una solicitud, leer por estado
+# (paginación por clave) o por empleado, contar, cambiar estados y mantener la tabla de
+# resumen (recuentos agregados, ver travel_summary.py). TRAVEL_STORAGE_BACKEND
+# elige la implementación:
+# - "bigquery" (por defecto): la tabla travel_requests de BigQuery, como hasta ahora;
+# - "sqlite": un fichero SQLite local (SQLITE_DB_PATH) con índices por status, request_id y
+#   employee_id. Sin red ni credenciales: sirve para desarrollo, pruebas de carga y para
+#   comparar backends con la misma carga de trabajo.
+# El índice en memoria y la ingesta diferida existen para ocultar la latencia de BigQuery y
+# solo se activan con ese backend.
+import abc
+import datetime
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .bigquery_client import SUMMARY_TABLE_REF_STR, TABLE_REF_STR, bigquery_job_slot, get_bigquery_client, warm_up as warm_up_bigquery
+from .telemetry import record_bigquery_job
+
+STORAGE_BACKEND = os.environ.get("TRAVEL_STORAGE_BACKEND", "bigquery").lower()
+SQLITE_DB_PATH = os.environ.get("SQLITE_DB_PATH", "./travel_requests.db")
+
+COLUMNS = [
+    "request_id", "timestamp", "employee_first_name", "employee_last_name", "employee_id",
+    "origin_city", "destination_city", "start_date", "end_date", "transport_mode", "car_type", "reason", "status",
+]
+# Posición de la última fila de la página anterior: (timestamp, request_id)
+Keyset = Tuple[datetime.datetime, str]
+# Columnas de la tabla de resumen, además de `total`. `month` es el mes de inicio del viaje (YYYY-MM)
+SUMMARY_DIMENSIONS = ["status", "destination_city", "transport_mode", "month"]
+
+class StorageError(Exception):
+    pass
+
+class TravelRequestStore(abc.ABC):
+    """Operaciones que usan las herramientas. Las filas son dicts con las columnas de COLUMNS.
+    Un backend que no implemente alguna falla al instanciarse (TypeError), no en la primera llamada.
+    """
+    name = "base"
+
+    @abc.abstractmethod
+    def insert_request(self, row: Dict[str, Any]) -> int:
+        """Inserta la solicitud y devuelve las filas insertadas."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def find_by_status(self, statuses: List[str], case_insensitive: bool, columns: List[str], limit: int,
+                       after: Optional[Keyset] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Filas con alguno de los estados, ORDER BY timestamp DESC, request_id DESC, a partir de `after`.
+        Devuelve las filas y los bytes procesados (None si el backend no los mide).
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def count_by_status(self, statuses: List[str], case_insensitive: bool) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def find_by_employee(self, employee_id: str, columns: List[str], limit: int) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def update_status(self, request_id: str, new_status: str, updated_at: datetime.datetime) -> Tuple[Optional[str], int]:
+        """Cambia el estado si es distinto. Devuelve (estado anterior o None si no existe, filas cambiadas)."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def bulk_update_status(self, request_ids: List[str], new_status: str, updated_at: datetime.datetime) -> Dict[str, Optional[str]]:
+        """Cambia el estado de las que lo tengan distinto. Devuelve request_id -> estado anterior de las que existen."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def refresh_summary(self) -> Optional[int]:
+        """Recalcula la tabla de resumen (una fila por combinación de SUMMARY_DIMENSIONS con su total)
+        con una sola consulta GROUP BY. Devuelve los bytes procesados (None si el backend no los mide).
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def read_summary(self) -> Tuple[List[Dict[str, Any]], Optional[datetime.datetime]]:
+        """Filas de la tabla de resumen y cuándo se calculó (UTC). ([], None) si aún no existe."""
+        raise NotImplementedError
+
+    def warm_up(self) -> Optional[float]:
+        return None
+
+# --- BigQuery ---
+# google.cloud.bigquery se importa dentro de los métodos: con el backend SQLite no se carga nunca
+# y con BigQuery se carga en el calentamiento, no al arrancar el servidor
+class BigQueryStore(TravelRequestStore):
+    name = "bigquery"
+
+    def _run(self, query, query_parameters, **result_kwargs):
+        from google.cloud import bigquery
+        job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
+        with bigquery_job_slot():
+            query_job = get_bigquery_client().query(query, job_config=job_config)
+            rows = query_job.result(**result_kwargs)
+            if query_job.errors:
+                raise StorageError("; ".join(str(error["message"]) for error in query_job.errors))
+            rows = [dict(row.items()) for row in rows]
+        record_bigquery_job(query_job)
+        return query_job, rows
+
+    @staticmethod
+    def _status_filter(statuses, case_insensitive):
+        from google.cloud import bigquery
+        column = "LOWER(status)" if case_insensitive else "status"
+        values = [s.lower() for s in statuses] if case_insensitive else list(statuses)
+        return f"{column} IN UNNEST(@statuses_param)", bigquery.ArrayQueryParameter("statuses_param", "STRING", values)
+
+    def insert_request(self, row):
+        from google.cloud import bigquery
+        query = f"""
+            INSERT INTO `{TABLE_REF_STR}` ({', '.join(COLUMNS)})
+            VALUES ({', '.join('@' + column for column in COLUMNS)})
+        """
+        types = {"timestamp": "TIMESTAMP", "start_date": "DATE", "end_date": "DATE"}
+        params = [
+            bigquery.ScalarQueryParameter(column, types.get(column, "STRING"),
+                                          row[column].isoformat() if column == "timestamp" else row[column])
+            for column in COLUMNS
+        ]
+        query_job, _ = self._run(query, params)
+        return query_job.num_dml_affected_rows or 0
+
+    def find_by_status(self, statuses, case_insensitive, columns, limit, after=None):
+        from google.cloud import bigquery
+        condition, statuses_param = self._status_filter(statuses, case_insensitive)
+        params = [statuses_param]
+        keyset_clause = ""
+        if after is not None:
+            keyset_clause = "AND (timestamp < @cursor_timestamp OR (timestamp = @cursor_timestamp AND request_id < @cursor_request_id))"
+            params += [
+                bigquery.ScalarQueryParameter("cursor_timestamp", "TIMESTAMP", after[0].isoformat()),
+                bigquery.ScalarQueryParameter("cursor_request_id", "STRING", after[1]),
+            ]
+        query = f"""
+            SELECT {', '.join(columns)}
+            FROM `{TABLE_REF_STR}` WHERE {condition} {keyset_clause}
+            ORDER BY timestamp DESC, request_id DESC LIMIT {int(limit)}
+        """
+        # Las filas se leen de la respuesta según llegan (una sola página de la API como máximo)
+        query_job, rows = self._run(query, params, page_size=limit, max_results=limit)
+        return rows, query_job.total_bytes_processed
+
+    def count_by_status(self, statuses, case_insensitive):
+        condition, statuses_param = self._status_filter(statuses, case_insensitive)
+        # Solo lee la columna status: mucho más barato que la consulta de filas
+        _, rows = self._run(f"SELECT COUNT(*) AS total FROM `{TABLE_REF_STR}` WHERE {condition}", [statuses_param])
+        return rows[0]["total"]
+
+    def find_by_employee(self, employee_id, columns, limit):
+        from google.cloud import bigquery
+        query = f"""
+            SELECT {', '.join(columns)}
+            FROM `{TABLE_REF_STR}` WHERE employee_id = @employee_id_param ORDER BY timestamp DESC LIMIT {int(limit)}
+        """
+        _, rows = self._run(query, [bigquery.ScalarQueryParameter("employee_id_param", "STRING", employee_id)])
+        return rows
+
+    def update_status(self, request_id, new_status, updated_at):
+        from google.cloud import bigquery
+        # Un único job (script): lee el estado anterior, actualiza solo si cambia y devuelve ambos datos
+        query = f"""
+            DECLARE previous_status STRING DEFAULT (
+                SELECT ANY_VALUE(status) FROM `{TABLE_REF_STR}` WHERE request_id = @request_id_param
+            );
+            UPDATE `{TABLE_REF_STR}`
+            SET status = @new_status_param, timestamp = @current_timestamp_param
+            WHERE request_id = @request_id_param AND (status IS NULL OR status != @new_status_param);
+            SELECT previous_status, @@row_count AS changed_rows;
+        """
+        _, rows = self._run(query, [
+            bigquery.ScalarQueryParameter("new_status_param", "STRING", new_status),
+            bigquery.ScalarQueryParameter("request_id_param", "STRING", request_id),
+            bigquery.ScalarQueryParameter("current_timestamp_param", "TIMESTAMP", updated_at.isoformat()),
+        ])
+        return rows[0]["previous_status"], rows[0]["changed_rows"] or 0
+
+    def bulk_update_status(self, request_ids, new_status, updated_at):
+        from google.cloud import bigquery
+        query = f"""
+            DECLARE previous ARRAY<STRUCT<request_id STRING, status STRING>> DEFAULT (
+                SELECT ARRAY_AGG(STRUCT(request_id, status)) FROM `{TABLE_REF_STR}` WHERE request_id IN UNNEST(@request_ids_param)
+            );
+            UPDATE `{TABLE_REF_STR}`
+            SET status = @new_status_param, timestamp = @current_timestamp_param
+            WHERE request_id IN UNNEST(@request_ids_param) AND (status IS NULL OR status != @new_status_param);
+            SELECT request_id, status AS previous_status FROM UNNEST(previous);
+        """
+        _, rows = self._run(query, [
+            bigquery.ArrayQueryParameter("request_ids_param", "STRING", request_ids),
+            bigquery.ScalarQueryParameter("new_status_param", "STRING", new_status),
+            bigquery.ScalarQueryParameter("current_timestamp_param", "TIMESTAMP", updated_at.isoformat()),
+        ])
+        return {row["request_id"]: row["previous_status"] for row in rows}
+
+    def refresh_summary(self):
+        # Tabla normal reemplazada en cada recálculo: se lee con tabledata.list, sin job ni bytes facturados
+        query = f"""
+            CREATE OR REPLACE TABLE `{SUMMARY_TABLE_REF_STR}` AS
+            SELECT status, destination_city, transport_mode, FORMAT_DATE('%Y-%m', start_date) AS month, COUNT(*) AS total
+            FROM `{TABLE_REF_STR}`
+            GROUP BY status, destination_city, transport_mode, month
+        """
+        query_job, _ = self._run(query, [])
+        return query_job.total_bytes_processed
+
+    def read_summary(self):
+        from google.api_core import exceptions as google_exceptions
+        client = get_bigquery_client()
+        try:
+            table = client.get_table(SUMMARY_TABLE_REF_STR)
+        except google_exceptions.NotFound:
+            return [], None
+        return [dict(row.items()) for row in client.list_rows(table)], table.modified
+
+    def warm_up(self):
+        return warm_up_bigquery()
+
+# --- SQLite ---
+_SQLITE_SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS travel_requests (
+        request_id TEXT PRIMARY KEY, timestamp TEXT NOT NULL,
+        {', '.join(f'{column} TEXT' for column in COLUMNS[2:])}
+    );
+    CREATE INDEX IF NOT EXISTS travel_requests_status ON travel_requests (status, timestamp DESC, request_id DESC);
+    CREATE INDEX IF NOT EXISTS travel_requests_status_lower ON travel_requests (LOWER(status), timestamp DESC, request_id DESC);
+    CREATE INDEX IF NOT EXISTS travel_requests_employee ON travel_requests (employee_id, timestamp DESC);
+    CREATE TABLE IF NOT EXISTS travel_requests_summary (
+        {', '.join(f'{column} TEXT' for column in SUMMARY_DIMENSIONS)}, total INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS travel_requests_summary_refresh (
+        id INTEGER PRIMARY KEY CHECK (id = 1), refreshed_at TEXT NOT NULL
+    );
+"""
+
+def _sqlite_timestamp(value: datetime.datetime) -> str:
+    # Ancho fijo en UTC: el orden de las cadenas es el orden cronológico (ORDER BY y cursores)
+    return value.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+
+class SQLiteStore(TravelRequestStore):
+    name = "sqlite"
+
+    def __init__(self, path):
+        self._path = path
+        self._local = threading.local()  # una conexión por hilo
+        with self._connection() as conn:
+            conn.executescript(_SQLITE_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _query(self, sql, params=()) -> List[Dict[str, Any]]:
+        rows = [dict(row) for row in self._connection().execute(sql, params)]
+        for row in rows:
+            if row.get("timestamp"): row["timestamp"] = datetime.datetime.fromisoformat(row["timestamp"])
+        return rows
+
+    @staticmethod
+    def _status_filter(statuses, case_insensitive):
+        placeholders = ", ".join("?" for _ in statuses)
+        if case_insensitive: return f"LOWER(status) IN ({placeholders})", [s.lower() for s in statuses]
+        return f"status IN ({placeholders})", list(statuses)
+
+    def insert_request(self, row):
+        values = [_sqlite_timestamp(row[c]) if c == "timestamp" else row[c] for c in COLUMNS]
+        with self._connection() as conn:
+            return conn.execute(
+                f"INSERT INTO travel_requests ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})", values,
+            ).rowcount
+
+    def find_by_status(self, statuses, case_insensitive, columns, limit, after=None):
+        condition, params = self._status_filter(statuses, case_insensitive)
+        if after is not None:
+            condition += " AND (timestamp < ? OR (timestamp = ? AND request_id < ?))"
+            cursor_timestamp = _sqlite_timestamp(after[0])
+            params += [cursor_timestamp, cursor_timestamp, after[1]]
+        sql = f"""
+            SELECT {', '.join(columns)} FROM travel_requests WHERE {condition}
+            ORDER BY timestamp DESC, request_id DESC LIMIT {int(limit)}
+        """
+        return self._query(sql, params), None
+
+    def count_by_status(self, statuses, case_insensitive):
+        condition, params = self._status_filter(statuses, case_insensitive)
+        return self._connection().execute(f"SELECT COUNT(*) FROM travel_requests WHERE {condition}", params).fetchone()[0]
+
+    def find_by_employee(self, employee_id, columns, limit):
+        sql = f"""
+            SELECT {', '.join(columns)} FROM travel_requests WHERE employee_id = ?
+            ORDER BY timestamp DESC LIMIT {int(limit)}
+        """
+        return self._query(sql, [employee_id])
+
+    def update_status(self, request_id, new_status, updated_at):
+        previous = self.bulk_update_status([request_id], new_status, updated_at)
+        previous_status = previous.get(request_id)
+        changed = 1 if request_id in previous and previous_status != new_status else 0
+        return previous_status, changed
+
+    def bulk_update_status(self, request_ids, new_status, updated_at):
+        placeholders = ", ".join("?" for _ in request_ids)
+        conn = self._connection()
+        with conn:
+            # BEGIN IMMEDIATE: la lectura del estado anterior y el UPDATE forman una sola transacción de escritura
+            conn.execute("BEGIN IMMEDIATE")
+            previous = {
+                row["request_id"]: row["status"]
+                for row in conn.execute(f"SELECT request_id, status FROM travel_requests WHERE request_id IN ({placeholders})", request_ids)
+            }
+            conn.execute(
+                f"UPDATE travel_requests SET status = ?, timestamp = ? "
+                f"WHERE request_id IN ({placeholders}) AND (status IS NULL OR status != ?)",
+                [new_status, _sqlite_timestamp(updated_at), *request_ids, new_status],
+            )
+        return previous
+
+    def refresh_summary(self):
+        conn = self._connection()
+        with conn:
+            # Una sola transacción: los lectores ven el resumen anterior o el nuevo, nunca uno a medias
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM travel_requests_summary")
+            conn.execute(f"""
+                INSERT INTO travel_requests_summary ({', '.join(SUMMARY_DIMENSIONS)}, total)
+                SELECT status, destination_city, transport_mode, substr(start_date, 1, 7) AS month, COUNT(*)
+                FROM travel_requests GROUP BY status, destination_city, transport_mode, month
+            """)
+            conn.execute(
+                "INSERT OR REPLACE INTO travel_requests_summary_refresh (id, refreshed_at) VALUES (1, ?)",
+                [_sqlite_timestamp(datetime.datetime.now(datetime.timezone.utc))],
+            )
+        return None
+
+    def read_summary(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN")  # La marca de tiempo y las filas, de la misma instantánea
+            refreshed = conn.execute("SELECT refreshed_at FROM travel_requests_summary_refresh WHERE id = 1").fetchone()
+            if refreshed is None: return [], None
+            rows = [dict(row) for row in conn.execute(f"SELECT {', '.join(SUMMARY_DIMENSIONS)}, total FROM travel_requests_summary")]
+        return rows, datetime.datetime.fromisoformat(refreshed["refreshed_at"])
+
+    def warm_up(self):
+        self._connection()
+        return 0.0
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store() -> TravelRequestStore:
+    """Backend configurado en TRAVEL_STORAGE_BACKEND, creado en la primera llamada."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if STORAGE_BACKEND == "bigquery":
+                    _store = BigQueryStore()
+                elif STORAGE_BACKEND == "sqlite":
+                    _store = SQLiteStore(SQLITE_DB_PATH)
+                else:
+                    raise ValueError(f"TRAVEL_STORAGE_BACKEND no válido: '{STORAGE_BACKEND}' (bigquery o sqlite).")
+    return _store
+
+def bigquery_backend() -> bool:
+    return STORAGE_BACKEND == "bigquery"
@@ -0,0 +1,160 @@
+# mi_agente_de_viajes/sistema_de_reservas/telemetry.py
+# Perfilado por herramienta: tiempos, jobs de BigQuery y origen de los datos de cada llamada.
+#
+# @instrument_tool envuelve cada herramienta. Durante la llamada, un registro vive en una
+# contextvar; el resto del código le añade datos sin recibirlo como argumento:
+# - bigquery_job_slot() suma la espera por un hueco de BigQuery y record_bigquery_job()
+#   anota job_id, bytes procesados, slot-ms y si BigQuery sirvió el resultado de su caché;
+# - las herramientas de lectura anotan de dónde salieron las filas (índice, caché o BigQuery);
+# - el pool de herramientas (async_tools.py) anota cuánto esperó la llamada a un hilo libre.
+# Al terminar, se emite un evento JSON (Cloud Logging lo ingiere como entrada estructurada)
+# con el ID de sesión de ADK y se acumula en el resumen por herramienta de /stats/tools.
+import collections
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+TOOL_TELEMETRY_LOG_EVENTS = os.environ.get("TOOL_TELEMETRY_LOG_EVENTS", "true").lower() == "true"
+# Duraciones recientes por herramienta usadas para los percentiles del resumen
+TOOL_TELEMETRY_WINDOW = int(os.environ.get("TOOL_TELEMETRY_WINDOW", "500"))
+
+_current_call = contextvars.ContextVar("travel_tool_call", default=None)
+_session_id = contextvars.ContextVar("travel_session_id", default=None)
+_executor_wait_ms = contextvars.ContextVar("travel_tool_executor_wait_ms", default=0.0)
+
+# --- Contexto de la llamada ---
+def bind_session(session_id: Optional[str]) -> None:
+    """Asocia las llamadas siguientes de esta tarea (y de los hilos a los que se pase el contexto) a la sesión."""
+    _session_id.set(session_id)
+
+def bind_tool_session(tool, args, tool_context) -> None:
+    """before_tool_callback de ADK: toma el ID de sesión del contexto de la herramienta. No altera la llamada."""
+    bind_session(tool_context.session.id)
+    return None
+
+def note_executor_wait(wait_ms: float) -> None:
+    _executor_wait_ms.set(wait_ms)
+
+def record_queue_wait(wait_ms: float) -> None:
+    call = _current_call.get()
+    if call is not None: call["queue_ms"] += wait_ms
+
+def record_bigquery_job(job) -> None:
+    call = _current_call.get()
+    if call is None: return
+    call["jobs"].append({
+        "job_id": job.job_id,
+        "bytes_processed": job.total_bytes_processed,
+        "slot_ms": job.slot_millis,
+        "cache_hit": job.cache_hit,
+    })
+
+def record_data_source(source: str) -> None:
+    """Origen de las filas de una lectura: "index", "status_cache", "travel_summary" o el backend ("bigquery", "sqlite")."""
+    call = _current_call.get()
+    if call is not None: call["source"] = source
+
+# --- Instrumentación ---
+def _is_error_result(result) -> bool:
+    if not isinstance(result, str): return False
+    if result.startswith("Error"): return True
+    return result.startswith("{") and '"error"' in result and "error" in json.loads(result)
+
+def instrument_tool(tool: Callable[..., str]) -> Callable[..., str]:
+    """Decorador: mide cada llamada a la herramienta. Conserva nombre, firma y docstring."""
+    @functools.wraps(tool)
+    def instrumented(*args, **kwargs):
+        executor_wait_ms = _executor_wait_ms.get()
+        call = {
+            "tool": tool.__name__,
+            "session_id": _session_id.get(),
+            "queue_ms": executor_wait_ms,  # espera por un hilo del pool más la espera por huecos de BigQuery
+            "jobs": [],
+            "source": None,
+        }
+        token = _current_call.set(call)
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            result = tool(*args, **kwargs)
+            if _is_error_result(result): outcome = "error"
+            return result
+        except Exception:
+            outcome = "exception"
+            raise
+        finally:
+            _current_call.reset(token)
+            call["wall_ms"] = (time.perf_counter() - started) * 1000 + executor_wait_ms
+            call["outcome"] = outcome
+            _telemetry.record(call)
+    return instrumented
+
+# --- Agregación ---
+class ToolTelemetry:
+    def __init__(self, window):
+        self._window = window
+        self._lock = threading.Lock()
+        self._tools = {}  # herramienta -> acumulados
+
+    def record(self, call: Dict[str, Any]) -> None:
+        with self._lock:
+            summary = self._tools.get(call["tool"])
+            if summary is None:
+                summary = self._tools[call["tool"]] = {
+                    "calls": 0, "errors": 0, "wall_ms_total": 0.0, "queue_ms_total": 0.0,
+                    "bigquery_jobs": 0, "bytes_processed": 0, "slot_ms": 0, "bigquery_cache_hits": 0,
+                    "sources": collections.Counter(), "recent_wall_ms": collections.deque(maxlen=self._window),
+                }
+            summary["calls"] += 1
+            if call["outcome"] != "ok": summary["errors"] += 1
+            summary["wall_ms_total"] += call["wall_ms"]
+            summary["queue_ms_total"] += call["queue_ms"]
+            summary["recent_wall_ms"].append(call["wall_ms"])
+            if call["source"]: summary["sources"][call["source"]] += 1
+            for job in call["jobs"]:
+                summary["bigquery_jobs"] += 1
+                summary["bytes_processed"] += job["bytes_processed"] or 0
+                summary["slot_ms"] += job["slot_ms"] or 0
+                if job["cache_hit"]: summary["bigquery_cache_hits"] += 1
+        if TOOL_TELEMETRY_LOG_EVENTS:
+            print(json.dumps({
+                "severity": "ERROR" if call["outcome"] == "exception" else "INFO",
+                "message": "tool_call",
+                "tool": call["tool"],
+                "session_id": call["session_id"],
+                "outcome": call["outcome"],
+                "wall_ms": round(call["wall_ms"], 1),
+                "queue_ms": round(call["queue_ms"], 1),
+                "source": call["source"],
+                "bigquery_jobs": call["jobs"],
+            }), flush=True)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {}
+            for tool_name, summary in self._tools.items():
+                recent = sorted(summary["recent_wall_ms"])
+                calls = summary["calls"]
+                result[tool_name] = {
+                    "calls": calls,
+                    "errors": summary["errors"],
+                    "wall_ms_mean": round(summary["wall_ms_total"] / calls, 1),
+                    "wall_ms_p50": round(recent[len(recent) // 2], 1),
+                    "wall_ms_p95": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 1),
+                    "queue_ms_mean": round(summary["queue_ms_total"] / calls, 1),
+                    "bigquery_jobs": summary["bigquery_jobs"],
+                    "bytes_processed": summary["bytes_processed"],
+                    "slot_ms": summary["slot_ms"],
+                    "bigquery_cache_hits": summary["bigquery_cache_hits"],
+                    "sources": dict(summary["sources"]),
+                }
+            return result
+
+_telemetry = ToolTelemetry(TOOL_TELEMETRY_WINDOW)
+
+def get_tool_telemetry_summary() -> Dict[str, Any]:
+    return _telemetry.summary()
@@ -0,0 +1,193 @@
+# mi_agente_de_viajes/sistema_de_reservas/travel_summary.py
+# Recuentos agregados de las solicitudes: por estado, destino, medio de transporte y mes.
+#
+# Preguntas como "¿cuántas solicitudes hay por estado?" o "¿a qué destinos viajamos más este
+# mes?" obligaban al modelo a paginar get_travel_requests_by_status y a contar filas él mismo.
+# El almacenamiento mantiene una tabla de resumen (una fila por combinación de estado,
+# destino, transporte y mes de inicio, con su total; ver refresh_summary en storage.py) y
+# este módulo:
+# - la recalcula en segundo plano cada TRAVEL_SUMMARY_REFRESH_SECONDS, salvo que otra
+#   instancia lo haya hecho hace menos (se mira cuándo se calculó);
+# - guarda sus filas en memoria: get_travel_request_summary filtra y agrega sobre ellas sin
+#   ir al almacenamiento (son como mucho estados × destinos × transportes × meses), y cada
+#   combinación de filtros se agrega una sola vez por recarga;
+# - adelanta el recálculo tras una escritura del propio proceso, como mucho una vez cada
+#   TRAVEL_SUMMARY_MIN_REFRESH_SECONDS.
+# Los recuentos son los de `refreshed_at`, que la herramienta devuelve junto a ellos.
+import collections
+import datetime
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .storage import SUMMARY_DIMENSIONS, get_store
+
+TRAVEL_SUMMARY_REFRESH_SECONDS = float(os.environ.get("TRAVEL_SUMMARY_REFRESH_SECONDS", "300"))
+TRAVEL_SUMMARY_MIN_REFRESH_SECONDS = float(os.environ.get("TRAVEL_SUMMARY_MIN_REFRESH_SECONDS", "30"))
+TRAVEL_SUMMARY_TOP = 10  # Destinos devueltos por defecto, de más a menos solicitudes
+TRAVEL_SUMMARY_MAX_CACHED_RESULTS = 64  # Agregados distintos guardados entre dos recargas
+
+_MISSING = "Sin dato"
+
+def _age_seconds(refreshed_at: Optional[datetime.datetime]) -> Optional[float]:
+    if refreshed_at is None: return None
+    return (datetime.datetime.now(datetime.timezone.utc) - refreshed_at).total_seconds()
+
+class TravelSummary:
+    def __init__(self, refresh_seconds, min_refresh_seconds):
+        self._refresh_seconds = refresh_seconds
+        self._min_refresh_seconds = min_refresh_seconds
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # un solo recálculo a la vez en el proceso
+        self._rows = None
+        self._refreshed_at = None
+        self._results = {}  # filtros -> agregado de las filas actuales
+        self._stale = False  # hay escrituras del proceso posteriores al último recálculo
+        self._next_refresh_in = refresh_seconds
+        self._wake = threading.Event()
+        self._thread = None
+        self._counters = {"lookups": 0, "result_hits": 0, "refreshes": 0, "reloads": 0, "refresh_errors": 0, "writes_seen": 0, "bytes_processed": 0}
+
+    # --- Recálculo ---
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None: return
+            self._thread = threading.Thread(target=self._run, name="travel-summary-refresh", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self._next_refresh_in)
+            self._wake.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                with self._lock:
+                    self._counters["refresh_errors"] += 1
+                    self._next_refresh_in = self._min_refresh_seconds
+                print(f"[LOG travel_summary - ERROR]: Fallo al recalcular el resumen: {e}")
+
+    def refresh(self, only_if_missing: bool = False) -> None:
+        """Recalcula la tabla de resumen si toca (o solo si aún no existe) y carga sus filas en memoria."""
+        store = get_store()
+        with self._refresh_lock:
+            rows, refreshed_at = store.read_summary()
+            age = _age_seconds(refreshed_at)
+            with self._lock:
+                due = self._min_refresh_seconds if self._stale else self._refresh_seconds
+            if age is None or (age >= due and not only_if_missing):
+                # Las escrituras que lleguen durante el recálculo vuelven a marcarlo
+                with self._lock: self._stale = False
+                bytes_processed = store.refresh_summary()
+                rows, refreshed_at = store.read_summary()
+                age, due = 0.0, self._refresh_seconds
+                with self._lock:
+                    self._counters["refreshes"] += 1
+                    self._counters["bytes_processed"] += bytes_processed or 0
+                print(f"[LOG travel_summary]: Resumen recalculado ({len(rows)} combinaciones).")
+            with self._lock:
+                self._rows, self._refreshed_at = rows, refreshed_at
+                self._results = {}
+                self._next_refresh_in = max(1.0, due - age)
+                self._counters["reloads"] += 1
+
+    def mark_stale(self) -> None:
+        """Una escritura del proceso cambió los recuentos: adelanta el próximo recálculo."""
+        with self._lock:
+            self._stale = True
+            self._counters["writes_seen"] += 1
+            running = self._thread is not None
+        if running: self._wake.set()
+
+    # --- Lecturas ---
+    def snapshot(self) -> Tuple[List[Dict[str, Any]], Optional[datetime.datetime]]:
+        """Filas del resumen y cuándo se calcularon. La primera llamada las carga y arranca el recálculo periódico."""
+        with self._lock:
+            self._counters["lookups"] += 1
+            loaded = self._rows is not None
+        if not loaded:
+            # Una tabla antigua se sirve ya y se recalcula en segundo plano; solo se espera si no existe
+            self.refresh(only_if_missing=True)
+            self.start()
+        with self._lock:
+            return self._rows, self._refreshed_at
+
+    def summarize(self, statuses: Optional[List[str]] = None, case_insensitive: bool = False, month: Optional[str] = None,
+                  destination_city: Optional[str] = None, transport_mode: Optional[str] = None,
+                  top: int = TRAVEL_SUMMARY_TOP) -> Tuple[Dict[str, Any], Optional[datetime.datetime]]:
+        """aggregate() sobre el resumen en memoria, y cuándo se calculó. El resultado no debe modificarse."""
+        rows, refreshed_at = self.snapshot()
+        key = (
+            tuple(statuses) if statuses is not None else None, case_insensitive, month,
+            destination_city.strip().lower() if destination_city else None,
+            transport_mode.strip().lower() if transport_mode else None, top,
+        )
+        with self._lock:
+            result = self._results.get(key) if self._rows is rows else None
+            if result is not None:
+                self._counters["result_hits"] += 1
+                return result, refreshed_at
+        result = aggregate(rows, statuses, case_insensitive, month, destination_city, transport_mode, top)
+        with self._lock:
+            if self._rows is rows:  # no se guarda si el resumen se recargó mientras tanto
+                if len(self._results) >= TRAVEL_SUMMARY_MAX_CACHED_RESULTS: self._results.clear()
+                self._results[key] = result
+        return result, refreshed_at
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(
+                self._counters,
+                combinations=len(self._rows) if self._rows is not None else None,
+                refreshed_at=self._refreshed_at.isoformat() if self._refreshed_at else None,
+                stale=self._stale,
+                refresh_seconds=self._refresh_seconds,
+            )
+
+def _matches(value: Optional[str], wanted: Optional[str]) -> bool:
+    return wanted is None or (value or "").strip().lower() == wanted.strip().lower()
+
+def _ranked(counter: collections.Counter, top: Optional[int] = None) -> Dict[str, int]:
+    return {key: total for key, total in counter.most_common(top)}
+
+def aggregate(rows: List[Dict[str, Any]], statuses: Optional[List[str]] = None, case_insensitive: bool = False,
+              month: Optional[str] = None, destination_city: Optional[str] = None, transport_mode: Optional[str] = None,
+              top: int = TRAVEL_SUMMARY_TOP) -> Dict[str, Any]:
+    """Total y recuentos por estado, destino (los `top` primeros), transporte y mes de las filas que cumplen los filtros."""
+    if statuses is not None:
+        wanted = {s.lower() for s in statuses} if case_insensitive else set(statuses)
+    counters = {dimension: collections.Counter() for dimension in SUMMARY_DIMENSIONS}
+    total = 0
+    for row in rows:
+        if statuses is not None and ((row["status"] or "").lower() if case_insensitive else row["status"]) not in wanted: continue
+        if month is not None and row["month"] != month: continue
+        if not _matches(row["destination_city"], destination_city) or not _matches(row["transport_mode"], transport_mode): continue
+        total += row["total"]
+        for dimension, counter in counters.items():
+            counter[row[dimension] or _MISSING] += row["total"]
+    return {
+        "total": total,
+        "by_status": _ranked(counters["status"]),
+        "by_destination_city": _ranked(counters["destination_city"], top),
+        "by_transport_mode": _ranked(counters["transport_mode"]),
+        "by_month": dict(sorted(counters["month"].items())),
+    }
+
+_summary = None
+_summary_lock = threading.Lock()
+
+def get_travel_summary() -> TravelSummary:
+    """Resumen del proceso, creado en la primera llamada."""
+    global _summary
+    if _summary is None:
+        with _summary_lock:
+            if _summary is None:
+                _summary = TravelSummary(TRAVEL_SUMMARY_REFRESH_SECONDS, TRAVEL_SUMMARY_MIN_REFRESH_SECONDS)
+    return _summary
+
+def mark_travel_summary_stale() -> None:
+    """Para las escrituras de las herramientas; no crea el resumen si nadie lo ha consultado."""
+    if _summary is not None: _summary.mark_stale()
+
+def get_travel_summary_stats() -> Dict[str, Any]:
+    return _summary.stats() if _summary else {"loaded": False}
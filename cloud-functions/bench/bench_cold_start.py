@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Cold start of the gateway: time from process launch to the first answered POST.
+
+Starts the stubs from stub_servers.py, then launches each engine --runs times against
+them (TRAVEL_AGENT_URL, GCE_METADATA_HOST):
+    functions-framework  `functions-framework --target foncorp_cff_gateway` (as on Cloud Functions)
+    async                the GOOGLE_ENTRYPOINT of deploy-async.sh (gunicorn + aiohttp, as on Cloud Run)
+and measures the first successful POST with a new conversation, which also fetches the
+first ID token and creates the first session. Reports median and p95 per engine, and the
+cumulative import time of each entry module (`python -X importtime`).
+
+Usage (from cloud-functions/, with the gateway requirements installed):
+    python bench/bench_cold_start.py --runs 5
+    python bench/bench_cold_start.py --engines async --json results.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+GATEWAY_DIR = os.path.join(BENCH_DIR, "..", "cff-gateway")
+sys.path.insert(0, BENCH_DIR)
+from smoke_async_entrypoint import deploy_entrypoint  # noqa: E402
+from stub_servers import StubConfig, StubServers  # noqa: E402
+
+AGENT_ID = "foncorp-travel-agent"
+POLL_INTERVAL_SECONDS = 0.02
+ENGINES = {
+    "functions-framework": ("main", lambda port: ["functions-framework", "--target", "foncorp_cff_gateway", "--source", "main.py", "--port", str(port)]),
+    "async": ("async_gateway", deploy_entrypoint),
+}
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def gateway_env(stubs, port):
+    env = dict(os.environ)
+    env.update({
+        "TRAVEL_AGENT_URL": stubs.adk_url,
+        "GCE_METADATA_HOST": stubs.metadata_host,
+        "PORT": str(port),
+        "LOG_PAYLOAD_SAMPLE_RATE": "0",
+        "PYTHONUNBUFFERED": "1",
+    })
+    return env
+
+def first_post(url):
+    body = json.dumps({"message": "¿Cuántas solicitudes aprobadas hay?", "agentId": AGENT_ID}).encode("utf-8")
+    request = urllib.request.Request(url, data=body, method="POST", headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+def cold_start(engine, stubs, timeout):
+    port = free_port()
+    command = ENGINES[engine][1](port)
+    started = time.perf_counter()
+    gateway = subprocess.Popen(command, cwd=GATEWAY_DIR, env=gateway_env(stubs, port), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if gateway.poll() is not None:
+                raise RuntimeError(f"{engine} exited with code {gateway.returncode}")
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError(f"{engine} did not answer within {timeout}s")
+            try:
+                payload = first_post(f"http://127.0.0.1:{port}/")
+                break
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(POLL_INTERVAL_SECONDS)
+        if payload.get("error"):
+            raise RuntimeError(f"{engine} answered with an error: {payload['error']}")
+        return (time.perf_counter() - started) * 1000
+    finally:
+        gateway.terminate()
+        gateway.wait(timeout=10)
+
+def import_ms(module):
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=GATEWAY_DIR, capture_output=True, text=True,
+    ).stderr
+    for line in reversed(output.splitlines()):
+        if line.startswith("import time:") and line.rsplit("|", 1)[-1].strip() == module:
+            return round(int(line.split("|")[1]) / 1000, 1)
+    return None
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts per engine")
+    parser.add_argument("--engines", nargs="+", choices=sorted(ENGINES), default=sorted(ENGINES))
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds to wait for the first answer")
+    parser.add_argument("--json", dest="json_output", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    # Stub latencies at zero: the measurement is the gateway's own start-up
+    with StubServers(StubConfig(run_latency_ms=0, run_jitter_ms=0, session_latency_ms=0, metadata_latency_ms=0)) as stubs:
+        for engine in args.engines:
+            first_answer = [cold_start(engine, stubs, args.timeout) for _ in range(args.runs)]
+            result = {
+                "engine": engine,
+                "import_ms": import_ms(ENGINES[engine][0]),
+                "first_answer_p50_ms": round(statistics.median(first_answer), 1),
+                "first_answer_p95_ms": round(percentile(first_answer, 0.95), 1),
+            }
+            results.append(result)
+            print(
+                f"{engine:>20}  import={result['import_ms']} ms  first answer "
+                f"p50={result['first_answer_p50_ms']:.1f} p95={result['first_answer_p95_ms']:.1f} ms"
+            )
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump({"runs": args.runs, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
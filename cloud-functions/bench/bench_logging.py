@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmark: per-request CPU spent on gateway logging, eager vs lazy.
+
+Replays the log statements the gateway issued per request before the switch to lazy
+logging (f-strings, json.dumps(payload), str(raw)[:500], full debug f-strings) against
+the current ones (LazyPayload + log_payload), at the production level (INFO) and with
+a handler that really formats every emitted record.
+
+Usage (from cloud-functions/, with the gateway requirements installed):
+    python bench/bench_logging.py --events 10 100 1000 5000 --iterations 200
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cff-gateway"))
+import main  # noqa: E402
+
+TARGET_URL = "https://adk-travel-agent.example.run.app/run"
+
+class _FormattingNullHandler(logging.Handler):
+    # Formats like a real handler would, but discards the output
+    def emit(self, record):
+        self.format(record)
+
+def build_request(num_events, text_size):
+    payload = main._build_run_payload("travel-agent", "gateway_user", "session-123", "muéstrame las solicitudes aprobadas")
+    events = [
+        {"type": "OUTPUT", "author": "CompanyTravelAgent", "data": {"text": f"evento {i} " + "x" * text_size}}
+        for i in range(num_events)
+    ]
+    raw_adk_response = {"id": "session-123", "events": events}
+    formatted = {"response": events[-1]["data"]["text"], "error": None, "session_id": "session-123"}
+    return payload, raw_adk_response, formatted
+
+def eager_log_calls(payload, raw_adk_response, formatted):
+    # Statements as they were before lazy logging (formatted even when the level is disabled)
+    logging.info(f"Sending payload to {TARGET_URL}: {json.dumps(payload)}")
+    logging.info(f"Raw data received from call_adk_endpoint: type={type(raw_adk_response)}, value={str(raw_adk_response)[:500]}")
+    logging.debug(f"Formatting ADK response: {raw_adk_response}")
+    logging.debug(f"Looking for response in events: {raw_adk_response['events']}")
+    logging.info(f"Extracted response from OUTPUT event: {str(formatted['response'])[:100]}...")
+    logging.info(f"Final data being sent to frontend: {formatted}")
+
+def lazy_log_calls(payload, raw_adk_response, formatted):
+    main.sample_payload_logging()
+    logging.info("Sending request to %s for session %s", TARGET_URL, payload.get("session_id"))
+    main.log_payload("Payload for %s: %s", TARGET_URL, main.LazyPayload(payload))
+    logging.info("Raw data received from call_adk_endpoint: type=%s", type(raw_adk_response).__name__)
+    main.log_payload("Raw ADK response: %s", main.LazyPayload(raw_adk_response))
+    main.log_payload("Formatting ADK response: %s", main.LazyPayload(raw_adk_response))
+    main.log_payload("Looking for response in events: %s", main.LazyPayload(raw_adk_response["events"]))
+    logging.info("Extracted response from OUTPUT event: %s", main.LazyPayload(formatted["response"], 100))
+    main.log_payload("Final data being sent to frontend: %s", main.LazyPayload(formatted))
+
+def measure_us(fn, args, iterations):
+    started = time.process_time()
+    for _ in range(iterations): fn(*args)
+    return (time.process_time() - started) / iterations * 1e6
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, nargs="+", default=[10, 100, 1000, 5000], help="Event list sizes to test")
+    parser.add_argument("--text-size", type=int, default=400, help="Characters of text per event")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--level", default="INFO", choices=["DEBUG", "INFO", "WARNING"])
+    parser.add_argument("--json", dest="json_output", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers): root.removeHandler(handler)
+    root.addHandler(_FormattingNullHandler())
+    root.setLevel(args.level)
+
+    results = []
+    print(f"level={args.level} text_size={args.text_size} iterations={args.iterations}")
+    print(f"{'events':>8} {'eager us/req':>14} {'lazy us/req':>13} {'saved us/req':>14} {'speedup':>8}")
+    for num_events in args.events:
+        request = build_request(num_events, args.text_size)
+        eager_us = measure_us(eager_log_calls, request, args.iterations)
+        lazy_us = measure_us(lazy_log_calls, request, args.iterations)
+        results.append({"events": num_events, "eager_us": round(eager_us, 1), "lazy_us": round(lazy_us, 1), "saved_us": round(eager_us - lazy_us, 1)})
+        print(f"{num_events:>8} {eager_us:>14.1f} {lazy_us:>13.1f} {eager_us - lazy_us:>14.1f} {eager_us / lazy_us if lazy_us else float('inf'):>7.1f}x")
+
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump({"level": args.level, "text_size": args.text_size, "iterations": args.iterations, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
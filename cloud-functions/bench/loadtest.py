@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""Offline load test for foncorp_cff_gateway.
+
+Starts the stubs from stub_servers.py, points the gateway at them (TRAVEL_AGENT_URL,
+GCE_METADATA_HOST) and calls the function in-process from `--concurrency` threads,
+once per scenario:
+    new       no sessionId: session from the pool or created inline
+    existing  every virtual user keeps its own pre-created session
+
+Reports throughput, p50/p90/p95/p99 latency and status counts per scenario, and writes
+them with the git commit and the full configuration to a JSON file. Pass a previous
+result with --compare to print the deltas.
+
+Usage (from cloud-functions/, with the gateway requirements installed):
+    python bench/loadtest.py --concurrency 20 --requests 400 --output results/$(git rev-parse --short HEAD).json
+    python bench/loadtest.py --error-rate 0.05 --compare results/baseline.json
+"""
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from stub_servers import StubConfig, StubServers  # noqa: E402
+
+AGENT_ID = "foncorp-travel-agent"
+PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values: return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def import_gateway(stubs, session_pool):
+    """Imports main.py with its configuration pointed at the stubs (read at import time)."""
+    os.environ["TRAVEL_AGENT_URL"] = stubs.adk_url
+    os.environ["GCE_METADATA_HOST"] = stubs.metadata_host
+    os.environ["SESSION_POOL_ENABLED"] = "true" if session_pool else "false"
+    os.environ.setdefault("LOG_PAYLOAD_SAMPLE_RATE", "0")
+    sys.path.insert(0, os.path.join(BENCH_DIR, "..", "cff-gateway"))
+    import flask
+    import main
+    app = flask.Flask("loadtest")
+    app.add_url_rule("/", "gateway", lambda: main.foncorp_cff_gateway(flask.request), methods=["POST"])
+    return main, app
+
+class ScenarioRunner:
+    def __init__(self, app, concurrency):
+        self._app = app
+        self._concurrency = concurrency
+        self._local = threading.local()
+
+    def _client(self):
+        # Flask test clients keep per-client state: one per worker thread
+        if not hasattr(self._local, "client"): self._local.client = self._app.test_client()
+        return self._local.client
+
+    def _one_request(self, body):
+        started = time.perf_counter()
+        response = self._client().post("/", json=body)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        return elapsed_ms, response.status_code, response.headers.get("Server-Timing", "")
+
+    def run(self, name, bodies):
+        latencies, statuses, stage_totals = [], collections.Counter(), collections.defaultdict(list)
+        started = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            for elapsed_ms, status, server_timing in executor.map(self._one_request, bodies):
+                latencies.append(elapsed_ms)
+                statuses[status] += 1
+                for entry in filter(None, server_timing.split(",")):
+                    stage, _, duration = entry.strip().partition(";dur=")
+                    if duration: stage_totals[stage].append(float(duration))
+        duration_s = time.perf_counter() - started
+
+        latencies.sort()
+        ok = sum(count for status, count in statuses.items() if status < 400)
+        return {
+            "scenario": name,
+            "requests": len(bodies),
+            "ok": ok,
+            "error_rate": round(1 - ok / len(bodies), 4) if bodies else 0.0,
+            "status_counts": {str(status): count for status, count in sorted(statuses.items())},
+            "duration_s": round(duration_s, 3),
+            "throughput_rps": round(len(bodies) / duration_s, 2) if duration_s else None,
+            "latency_ms": dict(
+                {f"p{int(fraction * 100)}": round(_percentile(latencies, fraction), 2) for fraction in PERCENTILES},
+                mean=round(sum(latencies) / len(latencies), 2),
+                max=round(latencies[-1], 2),
+            ) if latencies else {},
+            # Mean per-stage time reported by the gateway itself (Server-Timing)
+            "server_timing_mean_ms": {stage: round(sum(values) / len(values), 2) for stage, values in sorted(stage_totals.items())},
+        }
+
+def build_bodies(scenario, count, session_ids):
+    # Messages are unique per request so derived idempotency keys never replay a response
+    if scenario == "new":
+        return [{"message": f"nueva consulta {i}", "agentId": AGENT_ID} for i in range(count)]
+    return [{"message": f"seguimiento {i}", "agentId": AGENT_ID, "sessionId": session_ids[i % len(session_ids)]} for i in range(count)]
+
+def create_sessions(main, count):
+    agent_conf = main.AGENT_CONFIG[AGENT_ID]
+    token = main.get_google_id_token(agent_conf["url"])
+    return [main.create_adk_session(agent_conf["url"], agent_conf["app_name"], "loadtest_user", token) for _ in range(count)]
+
+def print_report(results):
+    print(f"{'scenario':>10} {'reqs':>6} {'ok':>6} {'rps':>8} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for r in results:
+        lat = r["latency_ms"]
+        print(f"{r['scenario']:>10} {r['requests']:>6} {r['ok']:>6} {r['throughput_rps']:>8} "
+              f"{lat['p50']:>8} {lat['p90']:>8} {lat['p95']:>8} {lat['p99']:>8} {lat['max']:>8}")
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path) as f: baseline = json.load(f)
+    previous = {r["scenario"]: r for r in baseline["results"]}
+    print(f"\nvs {baseline_path} (commit {str(baseline.get('git_commit'))[:12]}): positive latency delta = slower")
+    for r in results:
+        old = previous.get(r["scenario"])
+        if not old: continue
+        deltas = [f"rps {r['throughput_rps'] - old['throughput_rps']:+.2f}"]
+        for key in ("p50", "p95", "p99"):
+            before, after = old["latency_ms"].get(key), r["latency_ms"].get(key)
+            if before: deltas.append(f"{key} {after - before:+.1f}ms ({(after - before) / before:+.1%})")
+        deltas.append(f"errors {r['error_rate'] - old['error_rate']:+.2%}")
+        print(f"{r['scenario']:>10}  " + "  ".join(deltas))
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=["new", "existing"], choices=["new", "existing"])
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests before each scenario")
+    parser.add_argument("--sessions", type=int, default=0, help="Sessions shared by the 'existing' scenario (default: --concurrency)")
+    parser.add_argument("--no-session-pool", action="store_true", help="Create every new session inline (SESSION_POOL_ENABLED=false)")
+    parser.add_argument("--run-latency-ms", type=float, default=StubConfig.run_latency_ms)
+    parser.add_argument("--run-jitter-ms", type=float, default=StubConfig.run_jitter_ms)
+    parser.add_argument("--session-latency-ms", type=float, default=StubConfig.session_latency_ms)
+    parser.add_argument("--metadata-latency-ms", type=float, default=StubConfig.metadata_latency_ms)
+    parser.add_argument("--events", type=int, default=StubConfig.event_count, help="Events per /run response")
+    parser.add_argument("--event-text-size", type=int, default=StubConfig.event_text_size)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of /run calls that fail")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--gateway-logs", action="store_true", help="Keep the gateway's per-request structured log lines on stdout")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Previous --output file to diff against")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)  # injected errors are expected; keep the report readable
+    config = StubConfig(
+        run_latency_ms=args.run_latency_ms, run_jitter_ms=args.run_jitter_ms,
+        session_latency_ms=args.session_latency_ms, metadata_latency_ms=args.metadata_latency_ms,
+        event_count=args.events, event_text_size=args.event_text_size,
+        error_rate=args.error_rate, error_status=args.error_status,
+    )
+    with StubServers(config) as stubs:
+        main, app = import_gateway(stubs, session_pool=not args.no_session_pool)
+        runner = ScenarioRunner(app, args.concurrency)
+        session_ids = create_sessions(main, args.sessions or args.concurrency) if "existing" in args.scenarios else []
+
+        results = []
+        # The gateway prints one structured log line per request to stdout
+        quiet = contextlib.nullcontext() if args.gateway_logs else contextlib.redirect_stdout(open(os.devnull, "w"))
+        with quiet:
+            for scenario in args.scenarios:
+                if args.warmup:
+                    runner.run("warmup", [dict(body, message="warmup " + body["message"]) for body in build_bodies(scenario, args.warmup, session_ids)])
+                results.append(runner.run(scenario, build_bodies(scenario, args.requests, session_ids)))
+        gateway_stats = main.collect_gateway_stats()
+        stub_counters = stubs.counters.snapshot()
+
+    print_report(results)
+    if args.compare: print_comparison(results, args.compare)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({
+                "git_commit": _git_commit(),
+                "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "config": vars(args),
+                "results": results,
+                "stub_counters": stub_counters,
+                "gateway_stats": gateway_stats,
+            }, f, indent=2, default=str)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Smoke check: boot the async engine exactly as deploy-async.sh does and answer one request.
+
+Reads GOOGLE_ENTRYPOINT from deploy-async.sh, replaces $PORT with a free local port and runs
+that command from cff-gateway/ against the stubs from stub_servers.py (TRAVEL_AGENT_URL,
+GCE_METADATA_HOST). Passes if the engine answers an OPTIONS preflight and a POST with a
+new conversation; otherwise prints the engine's output and exits with status 1.
+
+Usage (from cloud-functions/, with the gateway requirements and gunicorn installed):
+    python bench/smoke_async_entrypoint.py
+"""
+import json
+import os
+import re
+import shlex
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+GATEWAY_DIR = os.path.join(BENCH_DIR, "..", "cff-gateway")
+DEPLOY_SCRIPT = os.path.join(BENCH_DIR, "..", "deploy-async.sh")
+sys.path.insert(0, BENCH_DIR)
+from stub_servers import StubConfig, StubServers  # noqa: E402
+
+AGENT_ID = "foncorp-travel-agent"
+BOOT_TIMEOUT_SECONDS = 30
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def deploy_entrypoint(port):
+    """The GOOGLE_ENTRYPOINT command of deploy-async.sh, as an argument list, listening on `port`."""
+    with open(DEPLOY_SCRIPT) as f:
+        match = re.search(r'GOOGLE_ENTRYPOINT="(?P<command>[^"]+)"', f.read())
+    if match is None:
+        raise RuntimeError(f"No GOOGLE_ENTRYPOINT in {DEPLOY_SCRIPT}")
+    # The script escapes $PORT so Cloud Run expands it at start-up; ":$PORT" binds every interface
+    args = shlex.split(match.group("command").replace("\\$PORT", "$PORT"))
+    return [arg.replace(":$PORT", f"127.0.0.1:{port}") if arg.startswith(":") else arg.replace("$PORT", str(port)) for arg in args]
+
+def request(method, url, body=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=10) as response:
+        return response.status, response.read()
+
+def main():
+    with StubServers(StubConfig(run_latency_ms=0, run_jitter_ms=0, session_latency_ms=0, metadata_latency_ms=0)) as stubs:
+        port = free_port()
+        command = deploy_entrypoint(port)
+        env = dict(os.environ, TRAVEL_AGENT_URL=stubs.adk_url, GCE_METADATA_HOST=stubs.metadata_host, PORT=str(port), LOG_PAYLOAD_SAMPLE_RATE="0")
+        print(f"Booting: {' '.join(command)}")
+        engine = subprocess.Popen(command, cwd=GATEWAY_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        try:
+            started = time.monotonic()
+            while True:
+                if engine.poll() is not None:
+                    raise RuntimeError(f"The entrypoint exited with code {engine.returncode}")
+                if time.monotonic() - started > BOOT_TIMEOUT_SECONDS:
+                    raise RuntimeError(f"No answer within {BOOT_TIMEOUT_SECONDS}s")
+                try:
+                    status, _ = request("OPTIONS", f"http://127.0.0.1:{port}/")
+                    break
+                except (urllib.error.URLError, ConnectionError, socket.timeout):
+                    time.sleep(0.1)
+            if status != 204:
+                raise RuntimeError(f"OPTIONS answered {status}, expected 204")
+            status, body = request("POST", f"http://127.0.0.1:{port}/", {"message": "¿Cuántas solicitudes aprobadas hay?", "agentId": AGENT_ID})
+            payload = json.loads(body)
+            if status != 200 or payload.get("error") or not payload.get("session_id"):
+                raise RuntimeError(f"POST answered {status}: {payload}")
+            print(f"OK: booted and answered in {time.monotonic() - started:.2f}s")
+            return 0
+        except (RuntimeError, urllib.error.HTTPError) as e:
+            print(f"FAILED: {e}")
+            engine.terminate()
+            print(engine.communicate(timeout=10)[0][-4000:])
+            return 1
+        finally:
+            if engine.poll() is None:
+                engine.terminate()
+                engine.wait(timeout=10)
+
+if __name__ == "__main__":
+    sys.exit(main())
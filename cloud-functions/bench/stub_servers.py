@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Local stand-ins for the ADK agent API and the GCE metadata identity endpoint.
+
+Used by loadtest.py so the gateway can be driven without Cloud Run or GCP credentials.
+Both servers run in daemon threads on 127.0.0.1 and an ephemeral port.
+
+ADK stub:
+    POST /apps/{app}/users/{user}/sessions  -> {"id": ...}
+    POST /run                               -> list of `event_count` ADK events
+Metadata stub:
+    GET /computeMetadata/v1/instance/service-accounts/default/identity -> unsigned JWT
+
+Latency, event-list size and error injection are read from a StubConfig on every
+request, so a running load test can change them between scenarios.
+"""
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+@dataclass
+class StubConfig:
+    run_latency_ms: float = 300.0         # median /run latency
+    run_jitter_ms: float = 50.0           # uniform +/- jitter around run_latency_ms
+    session_latency_ms: float = 40.0      # create_session latency
+    metadata_latency_ms: float = 5.0      # identity token latency
+    event_count: int = 5                  # events returned by /run
+    event_text_size: int = 200            # characters of text per event
+    error_rate: float = 0.0               # fraction of /run calls answered with error_status
+    error_status: int = 500
+    token_ttl_seconds: int = 3600         # exp claim of the issued ID tokens
+
+class _Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {"sessions": 0, "runs": 0, "injected_errors": 0, "tokens": 0}
+
+    def incr(self, name):
+        with self._lock: self.values[name] += 1
+
+    def snapshot(self):
+        with self._lock: return dict(self.values)
+
+def _sleep_ms(ms):
+    if ms > 0: time.sleep(ms / 1000.0)
+
+def _fake_id_token(audience, ttl_seconds):
+    def segment(obj):
+        return base64.urlsafe_b64encode(json.dumps(obj).encode("utf-8")).rstrip(b"=").decode("ascii")
+    claims = {"aud": audience, "exp": int(time.time()) + ttl_seconds, "iss": "stub-metadata"}
+    return f"{segment({'alg': 'none', 'typ': 'JWT'})}.{segment(claims)}.stub"
+
+def _build_events(config, message):
+    events = []
+    for i in range(max(config.event_count, 1)):
+        text = f"respuesta {i} a {message} " + "x" * config.event_text_size
+        events.append({
+            "id": uuid.uuid4().hex,
+            "author": "CompanyTravelAgent",
+            "content": {"role": "model", "parts": [{"text": text}]},
+        })
+    return events
+
+def _make_adk_handler(config, counters):
+    class AdkHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the Cloud Run front end
+
+        def log_message(self, *args): pass
+
+        def _send_json(self, status, body):
+            encoded = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(encoded)))
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if self.path.endswith("/sessions"):
+                _sleep_ms(config.session_latency_ms)
+                counters.incr("sessions")
+                self._send_json(200, {"id": f"stub-{uuid.uuid4().hex}", "state": {}, "events": []})
+            elif self.path == "/run":
+                counters.incr("runs")
+                _sleep_ms(config.run_latency_ms + random.uniform(-config.run_jitter_ms, config.run_jitter_ms))
+                if config.error_rate and random.random() < config.error_rate:
+                    counters.incr("injected_errors")
+                    self._send_json(config.error_status, {"detail": "Injected error"})
+                    return
+                try:
+                    message = body["new_message"]["parts"][0]["text"]
+                except (KeyError, IndexError, TypeError):
+                    message = ""
+                self._send_json(200, _build_events(config, message))
+            else:
+                self._send_json(404, {"detail": "Not Found"})
+    return AdkHandler
+
+def _make_metadata_handler(config, counters):
+    class MetadataHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args): pass
+
+        def do_GET(self):
+            if self.headers.get("Metadata-Flavor") != "Google" or "/service-accounts/default/identity" not in self.path:
+                self.send_response(403 if "identity" in self.path else 404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            _sleep_ms(config.metadata_latency_ms)
+            counters.incr("tokens")
+            audience = self.path.split("audience=", 1)[-1]
+            token = _fake_id_token(audience, config.token_ttl_seconds).encode("ascii")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(token)))
+            self.end_headers()
+            self.wfile.write(token)
+    return MetadataHandler
+
+class StubServers:
+    """Starts both stubs; use as a context manager or call start()/stop()."""
+    def __init__(self, config=None):
+        self.config = config or StubConfig()
+        self.counters = _Counters()
+        self._servers = []
+
+    def start(self):
+        for handler in (_make_adk_handler(self.config, self.counters), _make_metadata_handler(self.config, self.counters)):
+            server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+    def __enter__(self): return self.start()
+    def __exit__(self, *exc_info): self.stop()
+
+    @property
+    def adk_url(self):
+        return f"http://127.0.0.1:{self._servers[0].server_port}"
+
+    @property
+    def metadata_host(self):
+        """host:port, the format GCE_METADATA_HOST expects."""
+        return f"127.0.0.1:{self._servers[1].server_port}"
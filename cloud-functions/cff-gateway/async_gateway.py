@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""Asyncio engine for the Foncorp gateway.
+
+Same request/response contract as `foncorp_cff_gateway` (and the same
+format_response_for_frontend logic, token cache and session pool from main.py),
+but served by aiohttp so one instance keeps many conversations in flight
+instead of holding a worker for the whole backend call.
+
+Adds an optional fan-out request:
+    {"message": "...", "agentIds": ["a", "b"], "fanout": "first" | "all",
+     "sessionIds": {"a": "<session id>"}}
+"first" returns the first successful answer (plus "agent_id"), "all" returns
+{"responses": {agentId: {response, error, session_id}}}.
+
+Single-agent turns are deduplicated like in main.py (Idempotency-Key header /
+"idempotencyKey" field, or agentId+sessionId+message): duplicates await the in-flight
+turn or replay its recent result, with an Idempotency-Status response header.
+Fan-out requests are not deduplicated.
+
+Local run:   python async_gateway.py
+Cloud Run:   gunicorn 'async_gateway:create_app()' --bind :$PORT --worker-class aiohttp.GunicornWebWorker
+"""
+import asyncio
+import json
+import logging
+import os
+
+import aiohttp
+from aiohttp import web
+
+import main as gateway
+
+# --- Async engine configuration ---
+ASYNC_MAX_CONNECTIONS = int(os.environ.get("ASYNC_MAX_CONNECTIONS", "200"))
+ASYNC_MAX_CONNECTIONS_PER_HOST = int(os.environ.get("ASYNC_MAX_CONNECTIONS_PER_HOST", "100"))
+ASYNC_KEEPALIVE_SECONDS = float(os.environ.get("ASYNC_KEEPALIVE_SECONDS", "60"))
+ASYNC_BACKEND_TIMEOUT_SECONDS = float(os.environ.get("ASYNC_BACKEND_TIMEOUT_SECONDS", "45"))
+FANOUT_MAX_AGENTS = int(os.environ.get("FANOUT_MAX_AGENTS", "5"))
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Latency-Budget-Ms, Idempotency-Key',
+}
+ADK_USER_ID = "gateway_user"
+# -----------------------------------------
+
+class AsyncAdkClient:
+    """aiohttp client for ADK backends, with the same error semantics as main.call_adk_endpoint."""
+    def __init__(self):
+        self._session = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def start(self, app=None):
+        connector = aiohttp.TCPConnector(
+            limit=ASYNC_MAX_CONNECTIONS,
+            limit_per_host=ASYNC_MAX_CONNECTIONS_PER_HOST,
+            keepalive_timeout=ASYNC_KEEPALIVE_SECONDS,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=ASYNC_BACKEND_TIMEOUT_SECONDS))
+
+    async def close(self, app=None):
+        if self._session: await self._session.close()
+
+    async def post_json(self, target_url, payload, auth_token, timer=None, stage="adk", deadline=None):
+        timer = timer or gateway._NULL_TIMER
+        timeout = deadline.timeout_for(ASYNC_BACKEND_TIMEOUT_SECONDS) if deadline else ASYNC_BACKEND_TIMEOUT_SECONDS
+        breaker = gateway.get_circuit_breaker(target_url)
+        probe = breaker.before_call()
+        headers = {'Content-Type': 'application/json'}
+        if auth_token: headers['Authorization'] = f'Bearer {auth_token}'
+        logging.info("Sending request to %s for session %s", target_url, payload.get("session_id"))
+        gateway.log_payload("Payload for %s: %s", target_url, gateway.LazyPayload(payload))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        recorded = False
+        try:
+            with timer.stage(stage):
+                async with self._session.post(target_url, json=payload, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    response_text = await response.text()
+                    response_status_code = response.status
+            breaker.record(response_status_code < 500); recorded = True
+        except asyncio.TimeoutError:
+            breaker.record(False); recorded = True
+            logging.error("Timeout calling %s", target_url)
+            raise ValueError("Backend agent timed out")
+        except aiohttp.ClientError as e:
+            breaker.record(False); recorded = True
+            logging.error("Network error calling %s: %s", target_url, e)
+            raise ValueError(f"Backend error (502): {e}") from e
+        finally:
+            self.in_flight -= 1
+            # A fan-out loser is cancelled mid-call (CancelledError): no outcome, but the probe must go back
+            if probe and not recorded: breaker.release_probe()
+
+        logging.info("Backend response (%s): Status %s", target_url, response_status_code)
+        if response_status_code >= 400:
+            error_detail = response_text
+            try:
+                error_json = json.loads(response_text)
+                if isinstance(error_json.get('detail'), list): error_detail = json.dumps(error_json['detail'][0])
+                else: error_detail = json.dumps(error_json.get('detail', response_text))
+            except (json.JSONDecodeError, AttributeError): pass
+            logging.error("Backend error detail (%s): %s", response_status_code, gateway.LazyPayload(error_detail, 1000))
+            raise ValueError(f"Backend error ({response_status_code}): {error_detail}")
+        if response_status_code == 204 or not response_text:
+            return {}
+        try:
+            with timer.stage("decode"):
+                return json.loads(response_text)
+        except json.JSONDecodeError:
+            logging.error("Backend (%s) did not return valid JSON. Status: %s. Text: %s", target_url, response_status_code, gateway.LazyPayload(response_text))
+            return None
+
+class AsyncIdempotencyCache(gateway.IdempotencyCache):
+    """main.IdempotencyCache for coroutines: duplicates await the leader's future instead of blocking a thread."""
+    async def run(self, key_and_ttl, fn):
+        """Returns (await fn() result, origin) where origin is executed/coalesced/replayed."""
+        key, ttl_seconds = key_and_ttl
+        with self._lock:
+            cached = self._replay_locked(key)
+            if cached is not None: return cached, "replayed"
+            inflight = self._inflight.get(key)
+            is_leader = inflight is None
+            if is_leader: inflight = self._inflight[key] = asyncio.get_running_loop().create_future()
+
+        if not is_leader:
+            try:
+                # shield: a duplicate that gives up must not cancel the leader's future
+                result = await asyncio.wait_for(asyncio.shield(inflight), gateway.GATEWAY_LATENCY_BUDGET_SECONDS + 5)
+            except asyncio.TimeoutError:
+                result = None
+            if result is not None:
+                with self._lock: self._counters["coalesced"] += 1
+                return result, "coalesced"
+            # The leader failed, was cancelled or is stuck: run independently rather than fail the duplicate
+            return await fn(), "executed"
+
+        result = None
+        try:
+            result = await fn()
+            return result, "executed"
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                self._store_locked(key, ttl_seconds, result)
+            inflight.set_result(result)
+
+_idempotency_cache = AsyncIdempotencyCache(gateway.IDEMPOTENCY_CACHE_SIZE)
+
+async def create_adk_session(client, target_base_url, app_name, auth_token, timer=None, deadline=None):
+    create_session_url = f"{target_base_url.rstrip('/')}/apps/{app_name}/users/{ADK_USER_ID}/sessions"
+    create_response_data = await client.post_json(create_session_url, {}, auth_token, timer=timer, stage="create_session", deadline=deadline)
+    if not isinstance(create_response_data, dict):
+        raise ValueError("Failed to create session: Invalid response from ADK.")
+    new_session_id = create_response_data.get("id")
+    if not new_session_id:
+        raise ValueError("Failed to create session: No ID returned.")
+    return new_session_id
+
+async def run_agent_turn(client, agent_id, message, session_id=None, timer=None, deadline=None):
+    """One conversation turn against one agent. Returns ({response, error, session_id}, status_code)."""
+    timer = timer or gateway._NULL_TIMER
+    agent_conf = gateway.AGENT_CONFIG.get(agent_id)
+    if not agent_conf or not agent_conf.get("url") or not agent_conf.get("app_name"):
+        return {'error': f"AgentId '{agent_id}' not recognized or misconfigured."}, 404
+    target_base_url = agent_conf["url"]
+    adk_app_name = agent_conf["app_name"]
+    try:
+        with timer.stage("token"):
+            # The token cache is thread-safe and blocks on misses, so keep it off the event loop
+            auth_token = await asyncio.to_thread(gateway.get_google_id_token, target_base_url)
+        if not auth_token: logging.warning("Could not obtain ID token for %s. Calling without auth.", target_base_url)
+
+        run_url = f"{target_base_url.rstrip('/')}/run"
+        pooled_session = False
+        if not session_id:
+            session_pool = gateway.get_session_pool(agent_id, agent_conf, ADK_USER_ID)
+            session_id = session_pool.acquire() if session_pool else None
+            pooled_session = session_id is not None
+        if not session_id:
+            session_id = await create_adk_session(client, target_base_url, adk_app_name, auth_token, timer, deadline)
+
+        run_payload = gateway._build_run_payload(adk_app_name, ADK_USER_ID, session_id, message)
+        try:
+            raw_adk_response = await client.post_json(run_url, run_payload, auth_token, timer=timer, stage="run", deadline=deadline)
+        except ValueError as ve:
+            if not (pooled_session and "Backend error (404)" in str(ve)): raise
+            logging.warning("Pooled session %s not found on backend, creating a new one", session_id)
+            session_id = await create_adk_session(client, target_base_url, adk_app_name, auth_token, timer, deadline)
+            run_payload = gateway._build_run_payload(adk_app_name, ADK_USER_ID, session_id, message)
+            raw_adk_response = await client.post_json(run_url, run_payload, auth_token, timer=timer, stage="run", deadline=deadline)
+
+        processed_adk_data = gateway.normalize_adk_response(raw_adk_response)
+        return gateway.build_frontend_payload(processed_adk_data, session_id, timer)
+    except ValueError as ve:
+        logging.error("ValueError during ADK interaction (%s): %s", agent_id, ve)
+        return {'error': str(ve)}, gateway.status_code_for_error(ve)
+
+async def _timed_agent_turn(client, agent_id, message, session_id, deadline):
+    # Each agent gets its own timer so fan-out stages are not summed across agents
+    timer = gateway.StageTimer()
+    result = await run_agent_turn(client, agent_id, message, session_id, timer, deadline)
+    if agent_id in gateway.AGENT_CONFIG:
+        gateway._latency_recorder.record(agent_id, dict(timer.timings_ms, total=timer.total_ms()))
+    return result
+
+async def fan_out(client, agent_ids, message, session_ids, mode, deadline):
+    """Runs the same message against several agents concurrently."""
+    tasks = {
+        asyncio.create_task(_timed_agent_turn(client, agent_id, message, session_ids.get(agent_id), deadline)): agent_id
+        for agent_id in agent_ids
+    }
+    if mode == "all":
+        results = await asyncio.gather(*tasks)
+        return {"responses": {agent_id: body for agent_id, (body, _) in zip(tasks.values(), results)}}, 200
+
+    errors = {}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                body, status_code = task.result()
+                if status_code == 200 and body.get("response") is not None:
+                    return dict(body, agent_id=tasks[task]), 200
+                errors[tasks[task]] = body.get("error")
+    finally:
+        for task in pending: task.cancel()
+    return {"error": "No agent returned a response.", "errors": errors}, 502
+
+def _json_response(body, status_code, timer=None, extra_headers=None):
+    headers = dict(CORS_HEADERS, **(extra_headers or {}))
+    if timer is not None:
+        headers['Server-Timing'] = timer.server_timing_header()
+        headers['Timing-Allow-Origin'] = '*'
+    return web.json_response(body, status=status_code, headers=headers)
+
+async def handle_gateway(request):
+    if request.method == 'OPTIONS': return web.Response(status=204, headers=CORS_HEADERS)
+    if request.method == 'GET' and gateway.ENABLE_STATS_ENDPOINT and request.path.rstrip('/').endswith('/stats'):
+        stats = gateway.collect_gateway_stats()
+        stats["idempotency"] = _idempotency_cache.stats()
+        adk_client = request.app["adk_client"]
+        stats["async_engine"] = {"in_flight": adk_client.in_flight, "max_in_flight": adk_client.max_in_flight}
+        return _json_response(stats, 200)
+    if request.method != 'POST': return _json_response({'error': 'Method Not Allowed'}, 405)
+
+    timer = gateway.StageTimer()
+    gateway.sample_payload_logging()
+    try:
+        data = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        data = None
+    if not isinstance(data, dict) or not data: return _json_response({'error': 'Request body must be valid JSON'}, 400)
+    deadline = gateway.Deadline.from_request(request, data)
+
+    message = data.get('message')
+    agent_ids = data.get('agentIds')
+    if agent_ids is not None:
+        # --- Fan-out request ---
+        mode = data.get('fanout', 'first')
+        if not message or not isinstance(agent_ids, list) or not agent_ids:
+            return _json_response({'error': 'Missing required fields: message, agentIds'}, 400)
+        if mode not in ('first', 'all'):
+            return _json_response({'error': "fanout must be 'first' or 'all'"}, 400)
+        if len(agent_ids) > FANOUT_MAX_AGENTS:
+            return _json_response({'error': f"At most {FANOUT_MAX_AGENTS} agents per fan-out request"}, 400)
+        session_ids = data.get('sessionIds') if isinstance(data.get('sessionIds'), dict) else {}
+        logging.info("Fan-out (%s) request for agentIds: %s", mode, agent_ids)
+        body, status_code = await fan_out(request.app["adk_client"], list(dict.fromkeys(agent_ids)), message, session_ids, mode, deadline)
+        return _json_response(body, status_code, timer)
+
+    agent_id = data.get('agentId')
+    missing_fields = [name for name, value in (('message', message), ('agentId', agent_id)) if not value]
+    if missing_fields:
+        return _json_response({'error': f"Missing required fields: {', '.join(missing_fields)}"}, 400)
+    session_id = data.get('sessionId')
+    logging.info("Received request for agentId: %s, sessionId: %s", agent_id, session_id)
+
+    async def execute_turn():
+        result = await run_agent_turn(request.app["adk_client"], agent_id, message, session_id, timer, deadline)
+        # Only executed turns are recorded: a replayed or coalesced one never reached the backend
+        if agent_id in gateway.AGENT_CONFIG:
+            gateway._latency_recorder.record(agent_id, dict(timer.timings_ms, total=timer.total_ms()))
+        return result
+
+    idempotency_key = gateway.idempotency_key_for(request, data, agent_id, session_id)
+    if not idempotency_key:
+        body, status_code = await execute_turn()
+        return _json_response(body, status_code, timer)
+    (body, status_code), origin = await _idempotency_cache.run(idempotency_key, execute_turn)
+    if origin != "executed": logging.info("Idempotency key %s: %s result", idempotency_key[0][:16], origin)
+    return _json_response(body, status_code, timer, {'Idempotency-Status': origin})
+
+def create_app():
+    # Application factory: gunicorn calls it once per worker ('async_gateway:create_app()', see deploy-async.sh)
+    app = web.Application()
+    adk_client = AsyncAdkClient()
+    app["adk_client"] = adk_client
+    app.on_startup.append(adk_client.start)
+    app.on_cleanup.append(adk_client.close)
+    app.router.add_route("*", "/{tail:.*}", handle_gateway)
+    return app
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host="0.0.0.0", port=int(os.environ.get("PORT", 8080)))
@@ -1,12 +1,29 @@
 # -*- coding: utf-8 -*-
-import functions_framework
-import flask
+# flask and functions_framework are imported where they are used: the Functions runtime has both
+# loaded before it imports this module, and async_gateway.py (aiohttp) does not need either, so
+# its cold start skips them (~170 ms).
 import requests
+import requests.adapters
+import urllib3
 import os
 import json
 import logging
 import uuid # Import uuid for fallback session ID generation
 import re # Import regex for error parsing
+import base64
+import contextlib
+import contextvars
+import collections
+import concurrent.futures
+import hashlib
+import http.client
+import math
+import random
+import reprlib
+import sys
+import threading
+import time
+import urllib.parse
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,33 +37,245 @@ AGENT_CONFIG = {
 }
 # -----------------------------------------
 
+# --- Lazy, bounded payload logging --- 
+# Full payloads (requests, ADK events, formatted responses) are only rendered at DEBUG,
+# for a sampled fraction of requests, and never beyond LOG_PAYLOAD_MAX_CHARS.
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get("LOG_PAYLOAD_MAX_CHARS", "500"))
+
+# reprlib stops descending once these limits are hit, so a long event list is never formatted in full
+_bounded_repr = reprlib.Repr()
+_bounded_repr.maxlevel = 4
+_bounded_repr.maxlist = 5
+_bounded_repr.maxtuple = 5
+_bounded_repr.maxdict = 10
+_bounded_repr.maxstring = 200
+_bounded_repr.maxother = 200
+
+_payload_log_sampled = contextvars.ContextVar("payload_log_sampled", default=False)
+
+class LazyPayload:
+    """Log argument rendered only when a handler emits the record, with a bounded repr."""
+    __slots__ = ("_value", "_max_chars")
+    def __init__(self, value, max_chars=LOG_PAYLOAD_MAX_CHARS):
+        self._value = value
+        self._max_chars = max_chars
+
+    def __str__(self):
+        if isinstance(self._value, str): text = self._value[:self._max_chars + 1]
+        else: text = _bounded_repr.repr(self._value)
+        return text if len(text) <= self._max_chars else f"{text[:self._max_chars]}...[truncated]"
+
+def sample_payload_logging():
+    """Decides once per request whether its payloads may be logged (DEBUG enabled + sampling)."""
+    sampled = logging.getLogger().isEnabledFor(logging.DEBUG) and random.random() < LOG_PAYLOAD_SAMPLE_RATE
+    _payload_log_sampled.set(sampled)
+    return sampled
+
+def log_payload(msg, *args):
+    # Lazy %-args: nothing is formatted unless this request was sampled
+    if _payload_log_sampled.get(): logging.debug(msg, *args)
+# -----------------------------------------
+
+# --- Per-stage latency instrumentation --- 
+# Samples kept per (agent, stage) for the in-process percentile dump
+LATENCY_WINDOW_SIZE = int(os.environ.get("LATENCY_WINDOW_SIZE", "1000"))
+
+class StageTimer:
+    """Monotonic wall-clock timings for the stages of one gateway request."""
+    def __init__(self):
+        self._started_at = time.perf_counter()
+        self.timings_ms = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings_ms[name] = self.timings_ms.get(name, 0.0) + (time.perf_counter() - started_at) * 1000
+
+    def total_ms(self):
+        return (time.perf_counter() - self._started_at) * 1000
+
+    def server_timing_header(self):
+        entries = [f"{name};dur={duration:.1f}" for name, duration in self.timings_ms.items()]
+        entries.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(entries)
+
+class _NullTimer:
+    @contextlib.contextmanager
+    def stage(self, name):
+        yield
+
+_NULL_TIMER = _NullTimer()
+
+def _percentile(sorted_values, fraction):
+    # Nearest-rank percentile over an already sorted list
+    index = max(int(math.ceil(fraction * len(sorted_values))) - 1, 0)
+    return sorted_values[index]
+
+class LatencyRecorder:
+    """Sliding window of recent stage latencies per agent ID, summarised as p50/p95/p99 on demand."""
+    def __init__(self, window_size):
+        self._window_size = window_size
+        self._lock = threading.Lock()
+        self._samples = {}  # agent_id -> {stage -> deque of ms}
+
+    def record(self, agent_id, timings_ms):
+        with self._lock:
+            agent_samples = self._samples.setdefault(agent_id, {})
+            for stage_name, duration in timings_ms.items():
+                agent_samples.setdefault(stage_name, collections.deque(maxlen=self._window_size)).append(duration)
+
+    def percentile(self, agent_id, stage_name, fraction, min_samples=1):
+        with self._lock:
+            values = sorted(self._samples.get(agent_id, {}).get(stage_name, ()))
+        return _percentile(values, fraction) if len(values) >= min_samples else None
+
+    def snapshot(self):
+        with self._lock:
+            copied = {agent_id: {stage_name: sorted(values) for stage_name, values in stages.items()} for agent_id, stages in self._samples.items()}
+        return {
+            agent_id: {
+                stage_name: {
+                    "count": len(values),
+                    "p50": round(_percentile(values, 0.50), 1),
+                    "p95": round(_percentile(values, 0.95), 1),
+                    "p99": round(_percentile(values, 0.99), 1),
+                    "max": round(values[-1], 1),
+                }
+                for stage_name, values in stages.items() if values
+            }
+            for agent_id, stages in copied.items()
+        }
+
+_latency_recorder = LatencyRecorder(LATENCY_WINDOW_SIZE)
+
+def dump_latency_histograms():
+    """p50/p95/p99 (ms) per agent ID and stage over the last LATENCY_WINDOW_SIZE requests."""
+    return _latency_recorder.snapshot()
+# -----------------------------------------
+
 # --- Authentication --- 
-def get_google_id_token(target_audience_url):
-    # ... (existing function body, no changes here) ...
-    if not target_audience_url:
-        logging.warning("Target audience URL is empty, cannot get ID token.")
+# GCE_METADATA_HOST (same variable google-auth honours) points the gateway at a stand-in server for load tests
+METADATA_HOST = os.environ.get("GCE_METADATA_HOST", "metadata.google.internal")
+METADATA_IDENTITY_URL = f"http://{METADATA_HOST}/computeMetadata/v1/instance/service-accounts/default/identity"
+METADATA_TIMEOUT_SECONDS = 3
+# Refresh tokens this many seconds before their `exp` claim (Google ID tokens live ~1h)
+ID_TOKEN_REFRESH_MARGIN_SECONDS = int(os.environ.get("ID_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+# Lifetime assumed when a token's `exp` claim cannot be decoded
+ID_TOKEN_FALLBACK_TTL_SECONDS = int(os.environ.get("ID_TOKEN_FALLBACK_TTL_SECONDS", "600"))
+
+# Reused across invocations inside a warm instance (keeps the metadata server connection alive)
+_metadata_session = requests.Session()
+
+def _decode_jwt_exp(token):
+    """Returns the `exp` claim (epoch seconds) of a JWT, or None if it cannot be read.
+       The signature is not verified: the token comes straight from the metadata server.
+    """
+    try:
+        payload_segment = token.split(".")[1]
+        payload_segment += "=" * (-len(payload_segment) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload_segment))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError) as e:
+        logging.warning("Could not read exp claim from ID token: %s", e)
         return None
+
+def _fetch_google_id_token(target_audience_url):
     try:
-        metadata_server_url = "http://metadata.google.internal/computeMetadata/v1/instance/service-accounts/default/identity"
         auth_req = requests.Request(
             "GET",
-            metadata_server_url,
+            METADATA_IDENTITY_URL,
             params={"audience": target_audience_url},
             headers={"Metadata-Flavor": "Google"},
         )
-        prepped = auth_req.prepare()
-        response = requests.Session().send(prepped, timeout=3)
+        prepped = _metadata_session.prepare_request(auth_req)
+        response = _metadata_session.send(prepped, timeout=METADATA_TIMEOUT_SECONDS)
         response.raise_for_status()
         return response.text
     except requests.exceptions.Timeout:
-        logging.error(f"Timeout getting ID token for {target_audience_url} from metadata server.")
+        logging.error("Timeout getting ID token for %s from metadata server.", target_audience_url)
         return None
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error getting ID token for {target_audience_url}: {e}")
+        logging.error("Error getting ID token for %s: %s", target_audience_url, e)
         return None
     except Exception as e:
-        logging.error(f"Unexpected error getting ID token: {e}")
+        logging.error("Unexpected error getting ID token: %s", e)
+        return None
+
+class IdTokenCache:
+    """Per-audience cache of metadata-server ID tokens.
+       Tokens are served until their `exp` claim; inside the refresh margin the cached
+       token is still returned while a background thread fetches a new one. Concurrent
+       misses for the same audience wait on a single in-flight fetch.
+    """
+    def __init__(self, fetch_fn, refresh_margin_seconds, fallback_ttl_seconds):
+        self._fetch_fn = fetch_fn
+        self._refresh_margin = refresh_margin_seconds
+        self._fallback_ttl = fallback_ttl_seconds
+        self._lock = threading.Lock()
+        self._tokens = {}    # audience -> (token, expires_at)
+        self._inflight = {}  # audience -> threading.Event set when the fetch finishes
+        self._counters = {"hits": 0, "misses": 0, "refreshes": 0, "background_refreshes": 0, "shared_waits": 0, "failures": 0}
+
+    def get(self, audience):
+        now = time.time()
+        with self._lock:
+            cached = self._tokens.get(audience)
+            if cached and cached[1] > now:
+                self._counters["hits"] += 1
+                if cached[1] - now <= self._refresh_margin and audience not in self._inflight:
+                    self._counters["background_refreshes"] += 1
+                    done_event = self._inflight[audience] = threading.Event()
+                    threading.Thread(target=self._refresh, args=(audience, done_event), daemon=True).start()
+                return cached[0]
+            self._counters["misses"] += 1
+            done_event = self._inflight.get(audience)
+            is_owner = done_event is None
+            if is_owner:
+                done_event = self._inflight[audience] = threading.Event()
+            else:
+                self._counters["shared_waits"] += 1
+
+        if is_owner: self._refresh(audience, done_event)
+        else: done_event.wait(timeout=METADATA_TIMEOUT_SECONDS + 1)
+
+        with self._lock:
+            cached = self._tokens.get(audience)
+            return cached[0] if cached and cached[1] > time.time() else None
+
+    def _refresh(self, audience, done_event):
+        try:
+            token = self._fetch_fn(audience)
+            if not token:
+                with self._lock: self._counters["failures"] += 1
+                return
+            expires_at = _decode_jwt_exp(token) or (time.time() + self._fallback_ttl)
+            with self._lock:
+                self._tokens[audience] = (token, expires_at)
+                self._counters["refreshes"] += 1
+        finally:
+            with self._lock: self._inflight.pop(audience, None)
+            done_event.set()
+
+    def stats(self):
+        with self._lock:
+            now = time.time()
+            return dict(self._counters, cached_audiences={aud: round(exp - now, 1) for aud, (_, exp) in self._tokens.items()})
+
+_id_token_cache = IdTokenCache(_fetch_google_id_token, ID_TOKEN_REFRESH_MARGIN_SECONDS, ID_TOKEN_FALLBACK_TTL_SECONDS)
+
+def get_google_id_token(target_audience_url):
+    if not target_audience_url:
+        logging.warning("Target audience URL is empty, cannot get ID token.")
         return None
+    return _id_token_cache.get(target_audience_url)
+
+def get_id_token_cache_stats():
+    """Hit/miss/refresh counters plus seconds-to-expiry per cached audience."""
+    return _id_token_cache.stats()
 # -------------------------------------------------------------
 
 # --- Helper to format response for frontend --- 
@@ -57,12 +286,12 @@ def format_response_for_frontend(adk_response_data, session_id_override=None):
        Prioritizes extracting text from the last OUTPUT event after potential function calls.
        session_id_override allows passing the id from the create_session call.
     """
-    logging.debug(f"Formatting ADK response: {adk_response_data}")
+    log_payload("Formatting ADK response: %s", LazyPayload(adk_response_data))
     final_response = {"response": None, "error": None, "session_id": session_id_override}
 
     if not isinstance(adk_response_data, dict):
         final_response["error"] = "Internal Gateway Error: ADK response structure was not a dictionary."
-        logging.error(f"Format helper received non-dict data: {type(adk_response_data)} - {str(adk_response_data)[:200]}")
+        logging.error("Format helper received non-dict data: %s - %s", type(adk_response_data), LazyPayload(adk_response_data, 200))
         return final_response
 
     # --- Extract Session ID --- 
@@ -75,7 +304,7 @@ def format_response_for_frontend(adk_response_data, session_id_override=None):
 
     # 1. Look in events (specifically the last relevant OUTPUT event)
     if "events" in adk_response_data and isinstance(adk_response_data["events"], list):
-        logging.debug(f"Looking for response in events: {adk_response_data['events']}")
+        log_payload("Looking for response in events: %s", LazyPayload(adk_response_data['events']))
         for event in reversed(adk_response_data["events"]):
              if isinstance(event, dict) and event.get("type") == "OUTPUT" and "data" in event:
                  output_data = event["data"]
@@ -87,7 +316,7 @@ def format_response_for_frontend(adk_response_data, session_id_override=None):
                  
                  if candidate_text is not None: # Found text in an OUTPUT event
                       agent_text_response = candidate_text
-                      logging.info(f"Extracted response from OUTPUT event: {str(agent_text_response)[:100]}...")
+                      logging.info("Extracted response from OUTPUT event: %s", LazyPayload(agent_text_response, 100))
                       break # Stop after finding the latest relevant text
 
     # 2. Fallback: Check top-level content.parts (often contains initial agent text before tool use)
@@ -114,7 +343,7 @@ def format_response_for_frontend(adk_response_data, session_id_override=None):
     # --- Assign final response or error --- 
     if agent_text_response is not None:
          if not isinstance(agent_text_response, str):
-             logging.warning(f"Agent response was not a string, converting: {agent_text_response}")
+             logging.warning("Agent response was not a string, converting: %s", LazyPayload(agent_text_response))
              final_response["response"] = json.dumps(agent_text_response)
          else: final_response["response"] = agent_text_response
     else:
@@ -122,7 +351,7 @@ def format_response_for_frontend(adk_response_data, session_id_override=None):
         is_session_creation_response = session_id_override is not None and not adk_response_data.get("events") and not adk_response_data.get("content")
         if not is_session_creation_response and "error" not in adk_response_data:
             final_response["error"] = "Agent response text not found in ADK output structure."
-            logging.warning(f"Could not find agent response text in ADK output: {adk_response_data}")
+            logging.warning("Could not find agent response text in ADK output: %s", LazyPayload(adk_response_data))
 
     if "error" in adk_response_data:
         error_val = adk_response_data['error']
@@ -135,71 +364,780 @@ def format_response_for_frontend(adk_response_data, session_id_override=None):
         if final_response["error"]: 
             final_response["response"] = None 
 
-    logging.info(f"Formatted response for frontend: session_id={final_response.get('session_id')}, has_response={final_response.get('response') is not None}, has_error={final_response.get('error') is not None}")
+    logging.info("Formatted response for frontend: session_id=%s, has_response=%s, has_error=%s", final_response.get('session_id'), final_response.get('response') is not None, final_response.get('error') is not None)
     return final_response
 # --------------------------------------------------
 
+# --- Pooled keep-alive transport for ADK backends ---
+# Number of distinct backend hosts kept in the pool manager
+ADK_POOL_CONNECTIONS = int(os.environ.get("ADK_POOL_CONNECTIONS", "10"))
+# Keep-alive connections kept per backend host
+ADK_POOL_MAXSIZE = int(os.environ.get("ADK_POOL_MAXSIZE", "20"))
+# Per-host overrides, e.g. "adk-travel-agent-xyz.a.run.app=50,other-host=5"
+ADK_POOL_MAXSIZE_BY_HOST = os.environ.get("ADK_POOL_MAXSIZE_BY_HOST", "")
+# Retries applied only when a pooled connection is reset/dropped by the backend
+ADK_RESET_RETRIES = int(os.environ.get("ADK_RESET_RETRIES", "2"))
+ADK_RESET_BACKOFF_SECONDS = float(os.environ.get("ADK_RESET_BACKOFF_SECONDS", "0.1"))
+
+def _parse_pool_overrides(raw_overrides):
+    overrides = {}
+    for item in raw_overrides.split(","):
+        if "=" not in item: continue
+        host, size = item.split("=", 1)
+        try: overrides[host.strip()] = int(size)
+        except ValueError: logging.warning("Ignoring invalid ADK_POOL_MAXSIZE_BY_HOST entry: %s", item)
+    return overrides
+
+def _is_connection_reset(exc, _depth=0):
+    """True if the exception chain contains a reset/dropped connection (e.g. an idle
+       keep-alive socket closed by Cloud Run). Timeouts and refused connections are not resets.
+    """
+    if exc is None or _depth > 5: return False
+    if isinstance(exc, (ConnectionResetError, http.client.RemoteDisconnected, urllib3.exceptions.ProtocolError)):
+        return True
+    nested = [arg for arg in getattr(exc, "args", ()) if isinstance(arg, BaseException)]
+    nested.append(exc.__cause__)
+    return any(_is_connection_reset(inner, _depth + 1) for inner in nested)
+
+class PooledTransport:
+    """Module-level requests.Session with sized keep-alive pools per backend host.
+       Lives as long as the function instance, so warm invocations reuse TCP+TLS connections.
+    """
+    def __init__(self, pool_connections, pool_maxsize, maxsize_by_host, reset_retries, reset_backoff_seconds):
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._maxsize_by_host = maxsize_by_host
+        self._reset_retries = reset_retries
+        self._reset_backoff = reset_backoff_seconds
+        self._session = requests.Session()
+        self._adapters = [self._mount("https://", pool_maxsize), self._mount("http://", pool_maxsize)]
+        for host, maxsize in maxsize_by_host.items():
+            self._adapters.append(self._mount(f"https://{host}", maxsize))
+            self._adapters.append(self._mount(f"http://{host}", maxsize))
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "reset_retries": 0}
+
+    def _mount(self, prefix, maxsize):
+        # max_retries=0: retries are handled in post() so that only resets are retried
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self._pool_connections, pool_maxsize=maxsize, max_retries=0)
+        self._session.mount(prefix, adapter)
+        return adapter
+
+    def post(self, url, **kwargs):
+        attempt = 0
+        while True:
+            with self._lock: self._counters["requests"] += 1
+            try:
+                return self._session.post(url, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                if attempt >= self._reset_retries or not _is_connection_reset(e): raise
+                attempt += 1
+                with self._lock: self._counters["reset_retries"] += 1
+                delay = self._reset_backoff * (2 ** (attempt - 1))
+                logging.warning("Connection to %s was reset, retry %s/%s in %.2fs", url, attempt, self._reset_retries, delay)
+                time.sleep(delay)
+
+    def stats(self):
+        """Connection reuse per host, from urllib3's per-pool connection/request counters."""
+        hosts = {}
+        for adapter in self._adapters:
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None: continue
+                host_stats = hosts.setdefault(f"{pool.scheme}://{pool.host}:{pool.port}", {"new_connections": 0, "requests": 0, "pool_maxsize": pool.pool.maxsize if pool.pool else None})
+                host_stats["new_connections"] += pool.num_connections
+                host_stats["requests"] += pool.num_requests
+        for host_stats in hosts.values():
+            host_stats["reused_connections"] = max(host_stats["requests"] - host_stats["new_connections"], 0)
+            host_stats["reuse_ratio"] = round(host_stats["reused_connections"] / host_stats["requests"], 3) if host_stats["requests"] else None
+        with self._lock:
+            return dict(self._counters, hosts=hosts)
+
+_adk_transport = PooledTransport(
+    ADK_POOL_CONNECTIONS, ADK_POOL_MAXSIZE, _parse_pool_overrides(ADK_POOL_MAXSIZE_BY_HOST),
+    ADK_RESET_RETRIES, ADK_RESET_BACKOFF_SECONDS,
+)
+
+def get_adk_transport_stats():
+    return _adk_transport.stats()
+# --------------------------------------------------
+
+# --- Backend resilience: circuit breakers, latency budget, hedged requests --- 
+ADK_REQUEST_TIMEOUT_SECONDS = 45
+# End-to-end budget per gateway request; clients may lower it with X-Latency-Budget-Ms or "latencyBudgetMs"
+GATEWAY_LATENCY_BUDGET_SECONDS = float(os.environ.get("GATEWAY_LATENCY_BUDGET_SECONDS", str(ADK_REQUEST_TIMEOUT_SECONDS)))
+# A backend's breaker opens when >= BREAKER_FAILURE_RATE of the calls in the last
+# BREAKER_WINDOW_SECONDS failed (timeouts, connection errors, 5xx) and there were at least BREAKER_MIN_REQUESTS
+BREAKER_WINDOW_SECONDS = float(os.environ.get("BREAKER_WINDOW_SECONDS", "30"))
+BREAKER_MIN_REQUESTS = int(os.environ.get("BREAKER_MIN_REQUESTS", "10"))
+BREAKER_FAILURE_RATE = float(os.environ.get("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.environ.get("BREAKER_OPEN_SECONDS", "15"))
+# Hedging re-sends idempotent calls (session creation) if the first attempt is slower than the backend's p95
+ADK_HEDGE_ENABLED = os.environ.get("ADK_HEDGE_ENABLED", "false").lower() == "true"
+ADK_HEDGE_MIN_SAMPLES = int(os.environ.get("ADK_HEDGE_MIN_SAMPLES", "20"))
+ADK_HEDGE_DEFAULT_DELAY_MS = float(os.environ.get("ADK_HEDGE_DEFAULT_DELAY_MS", "1000"))
+ADK_HEDGE_MIN_DELAY_MS = float(os.environ.get("ADK_HEDGE_MIN_DELAY_MS", "50"))
+
+class Deadline:
+    """Remaining share of a request's latency budget, used to size every downstream timeout."""
+    def __init__(self, budget_seconds):
+        self.budget_seconds = budget_seconds
+        self._expires_at = time.monotonic() + budget_seconds
+
+    @classmethod
+    def from_request(cls, request, data):
+        requested_ms = request.headers.get('X-Latency-Budget-Ms') or (data or {}).get('latencyBudgetMs')
+        budget_seconds = GATEWAY_LATENCY_BUDGET_SECONDS
+        try:
+            if requested_ms is not None: budget_seconds = min(max(float(requested_ms) / 1000, 0.0), GATEWAY_LATENCY_BUDGET_SECONDS)
+        except (TypeError, ValueError):
+            logging.warning("Ignoring invalid latency budget: %s", requested_ms)
+        return cls(budget_seconds)
+
+    def remaining(self):
+        return self._expires_at - time.monotonic()
+
+    def timeout_for(self, cap_seconds):
+        """Timeout for the next backend call; raises the gateway's timeout error once the budget is spent."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise ValueError(f"Backend agent timed out: latency budget of {self.budget_seconds:.1f}s exhausted")
+        return min(cap_seconds, remaining)
+
+class CircuitBreaker:
+    """Per-backend breaker over a sliding time window of call outcomes.
+       closed -> open when the failure rate crosses the threshold; open -> half_open after
+       BREAKER_OPEN_SECONDS, letting a single probe through; the probe closes or re-opens it.
+       Rejections surface as "Backend error (503)", which the gateway maps to a 503 response.
+       A probe that ends without an outcome (cancelled, unexpected error) must be handed back
+       with release_probe(), or the breaker would stay half-open and reject every call.
+    """
+    def __init__(self, name, window_seconds, min_requests, failure_rate, open_seconds):
+        self.name = name
+        self._window_seconds = window_seconds
+        self._min_requests = min_requests
+        self._failure_rate = failure_rate
+        self._open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._outcomes = collections.deque()  # (timestamp, succeeded)
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._counters = {"rejected": 0, "opened": 0}
+
+    def before_call(self):
+        """Raises if the call is rejected; returns True if it is the half-open probe."""
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self._open_seconds:
+                self._state = "half_open"
+            if self._state == "closed": return False
+            if self._state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._counters["rejected"] += 1
+            retry_in = max(self._open_seconds - (time.monotonic() - self._opened_at), 0)
+        raise ValueError(f"Backend error (503): circuit open for {self.name}, retry in {retry_in:.0f}s")
+
+    def record(self, succeeded):
+        now = time.monotonic()
+        with self._lock:
+            if self._state == "half_open":
+                self._probe_in_flight = False
+                if succeeded:
+                    self._state = "closed"
+                    self._outcomes.clear()
+                else:
+                    self._trip_locked(now)
+                return
+            self._outcomes.append((now, succeeded))
+            while self._outcomes and self._outcomes[0][0] < now - self._window_seconds:
+                self._outcomes.popleft()
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if self._state == "closed" and len(self._outcomes) >= self._min_requests and failures / len(self._outcomes) >= self._failure_rate:
+                logging.error("Circuit breaker for %s opened: %s/%s failures in %.0fs", self.name, failures, len(self._outcomes), self._window_seconds)
+                self._trip_locked(now)
+
+    def release_probe(self):
+        """The probe ended without recording an outcome: let the next call probe instead."""
+        with self._lock:
+            if self._state == "half_open": self._probe_in_flight = False
+
+    def _trip_locked(self, now):
+        self._state = "open"
+        self._opened_at = now
+        self._counters["opened"] += 1
+
+    def stats(self):
+        with self._lock:
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return dict(self._counters, state=self._state, window_calls=len(self._outcomes), window_failures=failures)
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(target_url):
+    backend = urllib.parse.urlsplit(target_url).netloc
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(backend)
+        if breaker is None:
+            breaker = _circuit_breakers[backend] = CircuitBreaker(backend, BREAKER_WINDOW_SECONDS, BREAKER_MIN_REQUESTS, BREAKER_FAILURE_RATE, BREAKER_OPEN_SECONDS)
+        return breaker
+
+def get_circuit_breaker_stats():
+    with _circuit_breakers_lock: breakers = list(_circuit_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+_hedge_executor = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="adk-hedge")
+_hedge_counters = {"calls": 0, "hedged": 0, "hedge_wins": 0}
+_hedge_lock = threading.Lock()
+
+def hedge_delay_seconds(agent_id, stage_name):
+    """The stage's p95 for this agent once enough samples exist, otherwise ADK_HEDGE_DEFAULT_DELAY_MS."""
+    p95_ms = _latency_recorder.percentile(agent_id, stage_name, 0.95, min_samples=ADK_HEDGE_MIN_SAMPLES)
+    return max(p95_ms if p95_ms is not None else ADK_HEDGE_DEFAULT_DELAY_MS, ADK_HEDGE_MIN_DELAY_MS) / 1000
+
+def call_hedged(fn, delay_seconds):
+    """Runs an idempotent call; if it has not finished after delay_seconds, starts a second
+       identical attempt and returns whichever succeeds first."""
+    with _hedge_lock: _hedge_counters["calls"] += 1
+    primary = _hedge_executor.submit(fn)
+    try:
+        return primary.result(timeout=delay_seconds)
+    except concurrent.futures.TimeoutError:
+        pass
+    with _hedge_lock: _hedge_counters["hedged"] += 1
+    hedge = _hedge_executor.submit(fn)
+    last_error = None
+    for future in concurrent.futures.as_completed([primary, hedge]):
+        if future.exception() is None:
+            if future is hedge:
+                with _hedge_lock: _hedge_counters["hedge_wins"] += 1
+            return future.result()
+        last_error = future.exception()
+    raise last_error
+
+def get_hedge_stats():
+    with _hedge_lock: return dict(_hedge_counters, enabled=ADK_HEDGE_ENABLED)
+# --------------------------------------------------
+
 # --- Helper to call ADK endpoint --- 
-def call_adk_endpoint(target_url, payload, auth_token):
-    # ... (existing function body, no changes here) ...
+def _raise_backend_error(target_url, e, response_status_code=None):
+    """Re-raises a requests error as the ValueError("Backend error (NNN): ...") the gateway maps to a status code."""
+    logging.error("Network error calling %s: %s", target_url, e)
+    error_detail = str(e); status_code = response_status_code if response_status_code else 502
+    if e.response is not None:
+         status_code = e.response.status_code
+         response_text = e.response.text
+         try: 
+             error_json = e.response.json()
+             if isinstance(error_json.get('detail'), list): error_detail = json.dumps(error_json['detail'][0])
+             else: error_detail = json.dumps(error_json.get('detail', response_text))
+         except json.JSONDecodeError: error_detail = response_text
+    logging.error("Backend error detail (%s): %s", status_code, error_detail[:1000])
+    raise ValueError(f"Backend error ({status_code}): {error_detail}") from e
+
+def _build_run_payload(app_name, user_id, session_id, message, streaming=False):
+    # Payload for /run and /run_sse - MATCHING ADK WEB UI PAYLOAD
+    return {
+        "app_name": app_name,
+        "user_id": user_id,
+        "session_id": session_id,
+        "new_message": {
+            "role": "user",
+            "parts": [{"text": message}]
+        },
+        "streaming": streaming
+    }
+
+def call_adk_endpoint(target_url, payload, auth_token, timer=None, stage="adk", deadline=None):
+    """POSTs to an ADK endpoint. `stage` names the network time in `timer`; JSON parsing is timed as "decode".
+       The timeout is bounded by `deadline` and the call goes through the backend's circuit breaker.
+    """
+    timer = timer or _NULL_TIMER
+    timeout = deadline.timeout_for(ADK_REQUEST_TIMEOUT_SECONDS) if deadline else ADK_REQUEST_TIMEOUT_SECONDS
+    breaker = get_circuit_breaker(target_url)
+    probe = breaker.before_call()
     headers = {'Content-Type': 'application/json'}
     if auth_token: headers['Authorization'] = f'Bearer {auth_token}'
-    logging.info(f"Sending payload to {target_url}: {json.dumps(payload)}")
+    logging.info("Sending request to %s for session %s", target_url, payload.get("session_id"))
+    log_payload("Payload for %s: %s", target_url, LazyPayload(payload))
     response_text = None
     response_status_code = None
+    recorded = False
     try:
-        response = requests.post(target_url, headers=headers, json=payload, timeout=45)
-        response_text = response.text 
+        with timer.stage(stage):
+            response = _adk_transport.post(target_url, headers=headers, json=payload, timeout=timeout)
+            response_text = response.text 
         response_status_code = response.status_code
-        logging.info(f"Backend response ({target_url}): Status {response_status_code}")
+        breaker.record(response_status_code < 500); recorded = True
+        logging.info("Backend response (%s): Status %s", target_url, response_status_code)
         response.raise_for_status()
         if response_status_code == 204 or not response.content: 
-             logging.info(f"Backend ({target_url}) returned empty response body (Status {response_status_code})")
+             logging.info("Backend (%s) returned empty response body (Status %s)", target_url, response_status_code)
              return {} 
-        return response.json()
+        with timer.stage("decode"):
+            return json.loads(response_text)
     except requests.exceptions.Timeout:
-        logging.error(f"Timeout calling {target_url}")
+        breaker.record(False); recorded = True
+        logging.error("Timeout calling %s", target_url)
         raise ValueError("Backend agent timed out")
     except requests.exceptions.RequestException as e:
-        logging.error(f"Network error calling {target_url}: {e}")
-        error_detail = str(e); status_code = response_status_code if response_status_code else 502
-        if e.response is not None:
-             status_code = e.response.status_code
-             response_text = e.response.text
-             try: 
-                 error_json = e.response.json()
-                 if isinstance(error_json.get('detail'), list): error_detail = json.dumps(error_json['detail'][0])
-                 else: error_detail = json.dumps(error_json.get('detail', response_text))
-             except json.JSONDecodeError: error_detail = response_text
-        logging.error(f"Backend error detail ({status_code}): {error_detail[:1000]}")
-        raise ValueError(f"Backend error ({status_code}): {error_detail}") from e
+        if not recorded: breaker.record(False); recorded = True # No HTTP response at all
+        _raise_backend_error(target_url, e, response_status_code)
     except json.JSONDecodeError as e:
-         logging.error(f"Backend ({target_url}) did not return valid JSON. Status: {response_status_code}. Text: {response_text[:500]}") 
+         logging.error("Backend (%s) did not return valid JSON. Status: %s. Text: %s", target_url, response_status_code, LazyPayload(response_text))
          return None # Return None instead of raising an error
+    finally:
+        if probe and not recorded: breaker.release_probe()
+# --------------------------------------------------
+
+# --- ADK session creation and pre-created session pool --- 
+# New conversations take a session from the pool so they only need the /run call.
+# Refills run in background threads; on Cloud Functions this relies on the instance
+# still having CPU after the response (the pool degrades to on-demand creation otherwise).
+SESSION_POOL_ENABLED = os.environ.get("SESSION_POOL_ENABLED", "true").lower() == "true"
+SESSION_POOL_LOW_WATERMARK = int(os.environ.get("SESSION_POOL_LOW_WATERMARK", "2"))
+SESSION_POOL_HIGH_WATERMARK = int(os.environ.get("SESSION_POOL_HIGH_WATERMARK", "5"))
+SESSION_POOL_TTL_SECONDS = int(os.environ.get("SESSION_POOL_TTL_SECONDS", "1800"))
+
+def create_adk_session(target_base_url, app_name, user_id, auth_token, timer=None, deadline=None, agent_id=None):
+    """Creates an ADK session and returns its id. Raises ValueError like call_adk_endpoint.
+       Session creation is idempotent enough to hedge (a losing attempt only leaves an unused session).
+    """
+    create_session_url = f"{target_base_url.rstrip('/')}/apps/{app_name}/users/{user_id}/sessions"
+    if ADK_HEDGE_ENABLED and agent_id:
+        with (timer or _NULL_TIMER).stage("create_session"):
+            create_response_data = call_hedged(
+                lambda: call_adk_endpoint(create_session_url, {}, auth_token, deadline=deadline),
+                hedge_delay_seconds(agent_id, "create_session"),
+            )
+    else:
+        create_response_data = call_adk_endpoint(create_session_url, {}, auth_token, timer=timer, stage="create_session", deadline=deadline)
+    if not isinstance(create_response_data, dict):
+         logging.error("Create session call returned non-dict: %s", type(create_response_data))
+         raise ValueError("Failed to create session: Invalid response from ADK.")
+    new_session_id = create_response_data.get("id")
+    if not new_session_id:
+         logging.error("Could not get session ID from create_session response: %s", LazyPayload(create_response_data))
+         raise ValueError("Failed to create session: No ID returned.")
+    return new_session_id
+
+class SessionPool:
+    """Pre-created ADK sessions for one agent, refilled up to the high watermark by a
+       background thread whenever the depth drops below the low watermark.
+       Sessions older than the TTL are discarded instead of being handed out.
+    """
+    def __init__(self, agent_id, target_base_url, app_name, user_id, low_watermark, high_watermark, ttl_seconds):
+        self.agent_id = agent_id
+        self._target_base_url = target_base_url
+        self._app_name = app_name
+        self._user_id = user_id
+        self._low_watermark = low_watermark
+        self._high_watermark = max(high_watermark, low_watermark)
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._sessions = collections.deque()  # (session_id, created_at), oldest first
+        self._refilling = False
+        self._counters = {"served": 0, "empty": 0, "created": 0, "stale_discarded": 0, "refill_failures": 0}
+        self._refill_latencies_ms = collections.deque(maxlen=100)
+
+    def acquire(self):
+        """Returns a pooled session id, or None if the pool is empty (caller creates one)."""
+        with self._lock:
+            self._discard_stale_locked()
+            session_id = self._sessions.popleft()[0] if self._sessions else None
+            self._counters["served" if session_id else "empty"] += 1
+            self._maybe_start_refill_locked()
+        return session_id
+
+    def _discard_stale_locked(self):
+        cutoff = time.time() - self._ttl
+        while self._sessions and self._sessions[0][1] < cutoff:
+            self._sessions.popleft()
+            self._counters["stale_discarded"] += 1
+
+    def _maybe_start_refill_locked(self):
+        if self._refilling or len(self._sessions) >= self._low_watermark: return
+        self._refilling = True
+        threading.Thread(target=self._refill, name=f"session-pool-{self.agent_id}", daemon=True).start()
+
+    def _refill(self):
+        try:
+            while True:
+                with self._lock:
+                    self._discard_stale_locked()
+                    if len(self._sessions) >= self._high_watermark: return
+                try:
+                    auth_token = get_google_id_token(self._target_base_url)
+                    started_at = time.monotonic()
+                    session_id = create_adk_session(self._target_base_url, self._app_name, self._user_id, auth_token)
+                except ValueError as e:
+                    logging.warning("Session pool refill for %s failed: %s", self.agent_id, e)
+                    with self._lock: self._counters["refill_failures"] += 1
+                    return
+                refill_latency_ms = (time.monotonic() - started_at) * 1000
+                _latency_recorder.record(self.agent_id, {"create_session": refill_latency_ms})
+                with self._lock:
+                    self._sessions.append((session_id, time.time()))
+                    self._counters["created"] += 1
+                    self._refill_latencies_ms.append(refill_latency_ms)
+        finally:
+            with self._lock: self._refilling = False
+
+    def stats(self):
+        with self._lock:
+            latencies = list(self._refill_latencies_ms)
+            return dict(
+                self._counters,
+                depth=len(self._sessions),
+                refilling=self._refilling,
+                refill_latency_ms={
+                    "last": round(latencies[-1], 1) if latencies else None,
+                    "avg": round(sum(latencies) / len(latencies), 1) if latencies else None,
+                    "max": round(max(latencies), 1) if latencies else None,
+                },
+            )
+
+_session_pools = {}
+_session_pools_lock = threading.Lock()
+
+def get_session_pool(agent_id, agent_conf, user_id):
+    if not SESSION_POOL_ENABLED: return None
+    with _session_pools_lock:
+        pool = _session_pools.get(agent_id)
+        if pool is None:
+            pool = _session_pools[agent_id] = SessionPool(
+                agent_id, agent_conf["url"], agent_conf["app_name"], user_id,
+                SESSION_POOL_LOW_WATERMARK, SESSION_POOL_HIGH_WATERMARK, SESSION_POOL_TTL_SECONDS,
+            )
+        return pool
+
+def get_session_pool_stats():
+    with _session_pools_lock: pools = list(_session_pools.values())
+    return {pool.agent_id: pool.stats() for pool in pools}
+# --------------------------------------------------
+
+# --- Streaming (SSE) relay --- 
+def open_adk_event_stream(target_url, payload, auth_token, timer=None, deadline=None):
+    """POSTs to ADK /run_sse and returns the open streaming response.
+       Errors before the first byte raise the same ValueErrors as call_adk_endpoint,
+       so they still reach the client as a regular JSON error with the mapped status.
+    """
+    headers = {'Content-Type': 'application/json', 'Accept': 'text/event-stream'}
+    if auth_token: headers['Authorization'] = f'Bearer {auth_token}'
+    logging.info("Opening event stream to %s for session %s", target_url, payload.get('session_id'))
+    timeout = deadline.timeout_for(ADK_REQUEST_TIMEOUT_SECONDS) if deadline else ADK_REQUEST_TIMEOUT_SECONDS
+    breaker = get_circuit_breaker(target_url)
+    probe = breaker.before_call()
+    recorded = False
+    try:
+        # With stream=True the timeout bounds the wait between chunks, not the whole turn
+        with (timer or _NULL_TIMER).stage("run_sse_open"):
+            response = _adk_transport.post(target_url, headers=headers, json=payload, timeout=timeout, stream=True)
+        breaker.record(response.status_code < 500); recorded = True
+        response.raise_for_status()
+        return response
+    except requests.exceptions.Timeout:
+        breaker.record(False); recorded = True
+        logging.error("Timeout calling %s", target_url)
+        raise ValueError("Backend agent timed out")
+    except requests.exceptions.RequestException as e:
+        if not recorded: breaker.record(False); recorded = True
+        _raise_backend_error(target_url, e)
+    finally:
+        if probe and not recorded: breaker.release_probe()
+
+def _iter_sse_events(response):
+    """Yields the JSON payload of each `data:` event in an SSE response."""
+    data_lines = []
+    for line in response.iter_lines(decode_unicode=True):
+        if line:
+            if line.startswith("data:"): data_lines.append(line[5:].lstrip())
+            continue
+        if not data_lines: continue
+        raw_event = "\n".join(data_lines); data_lines = []
+        try: yield json.loads(raw_event)
+        except json.JSONDecodeError: logging.warning("Skipping non-JSON SSE event: %s", LazyPayload(raw_event, 200))
+    if data_lines:
+        try: yield json.loads("\n".join(data_lines))
+        except json.JSONDecodeError: logging.warning("Skipping truncated trailing SSE event")
+
+def _event_text(event):
+    """Concatenated text parts of an ADK event (function calls and thoughts are skipped)."""
+    content = event.get("content")
+    parts = content.get("parts") if isinstance(content, dict) else None
+    if not isinstance(parts, list): return None
+    texts = [part["text"] for part in parts if isinstance(part, dict) and isinstance(part.get("text"), str) and not part.get("thought")]
+    return "".join(texts) if texts else None
+
+def _sse_frame(event_name, data):
+    return f"event: {event_name}\ndata: {json.dumps(data)}\n\n"
+
+def relay_adk_stream(response, session_id, request_started_at):
+    """Relays ADK events as `chunk` frames ({"text"}) and ends with one `done` frame carrying
+       the same { response, error, session_id } contract as the non-streaming gateway.
+       With streaming=True ADK emits partial deltas followed by a non-partial event holding the
+       aggregated text; that aggregate is not re-sent, it only becomes the final response.
+    """
+    final_text = None
+    partial_texts = []
+    error_msg = None
+    first_chunk_at = None
+    try:
+        for event in _iter_sse_events(response):
+            if not isinstance(event, dict): continue
+            if "error" in event and not event.get("content"):
+                error_val = event["error"]
+                error_msg = f"ADK Error: {error_val['message'] if isinstance(error_val, dict) and 'message' in error_val else error_val}"
+                break
+            text = _event_text(event)
+            if text is None: continue
+            if event.get("partial"):
+                partial_texts.append(text)
+                chunk = text
+            else:
+                chunk = None if partial_texts else text
+                final_text = text
+                partial_texts = []
+            if chunk:
+                if first_chunk_at is None:
+                    first_chunk_at = time.monotonic()
+                    logging.info("Time to first token for session %s: %.0f ms", session_id, (first_chunk_at - request_started_at) * 1000)
+                yield _sse_frame("chunk", {"text": chunk})
+        if final_text is None and partial_texts: final_text = "".join(partial_texts)
+    except requests.exceptions.Timeout:
+        logging.error("Timeout while streaming session %s", session_id)
+        error_msg = "Backend agent timed out"
+    except requests.exceptions.RequestException as e:
+        logging.error("Event stream for session %s interrupted: %s", session_id, e)
+        error_msg = f"Backend stream interrupted: {e}"
+    finally:
+        response.close()
+
+    if final_text is None and error_msg is None:
+        error_msg = "Agent response text not found in ADK output structure."
+    logging.info("Stream finished for session %s in %.0f ms, has_error=%s", session_id, (time.monotonic() - request_started_at) * 1000, error_msg is not None)
+    yield _sse_frame("done", {"response": None if error_msg else final_text, "error": error_msg, "session_id": session_id})
+# --------------------------------------------------
+
+# --- ADK response -> frontend payload (shared by the sync and async engines) --- 
+def normalize_adk_response(raw_adk_response):
+    """Reduces the list/dict returned by /run to the dict format_response_for_frontend expects."""
+    logging.info("Raw data received from call_adk_endpoint: type=%s", type(raw_adk_response).__name__)
+    log_payload("Raw ADK response: %s", LazyPayload(raw_adk_response))
+    if isinstance(raw_adk_response, list):
+        if len(raw_adk_response) > 0 and isinstance(raw_adk_response[0], dict):
+            logging.info("ADK response was a list, using the first element.")
+            return raw_adk_response[0]
+        logging.error("ADK response was a list but empty or first element not a dict: %s", LazyPayload(raw_adk_response))
+        raise ValueError("Internal Gateway Error: Received invalid list structure from ADK.")
+    elif isinstance(raw_adk_response, dict):
+         return raw_adk_response
+    elif raw_adk_response is None: # Handle None returned by call_adk_endpoint on JSONDecodeError
+         raise ValueError("Internal Gateway Error: ADK did not return valid JSON.")
+    logging.error("Unexpected data type received from call_adk_endpoint: %s", type(raw_adk_response))
+    raise ValueError("Internal Gateway Error: Unexpected response type from ADK.")
+
+def build_frontend_payload(processed_adk_data, session_id, timer=None):
+    """Returns ({response, error, session_id}, status_code) for a normalized ADK response."""
+    with (timer or _NULL_TIMER).stage("format"):
+        formatted_data = format_response_for_frontend(processed_adk_data, session_id)
+    log_payload("Final data being sent to frontend: %s", LazyPayload(formatted_data))
+
+    if formatted_data["error"] and not formatted_data["response"]:
+         logging.error("Error formatting ADK response: %s", formatted_data['error'])
+         error_msg = formatted_data["error"]
+         if "ADK Error:" in error_msg: pass
+         else: error_msg = "Gateway could not process agent response."
+         return {"error": error_msg}, 502
+
+    # Ensure we always send a valid JSON structure back
+    return {
+        "response": formatted_data.get("response"),
+        "error": formatted_data.get("error"),
+        "session_id": formatted_data.get("session_id")
+    }, 200
+
+def status_code_for_error(error):
+    """Maps the gateway's ValueError messages onto the HTTP status returned to the client."""
+    status_match_backend = re.search(r"Backend error \((\d{3})\):", str(error))
+    status_match_non_json = re.search(r"\(Status (\d{3})\)\.", str(error))
+    status_code = 502
+    if status_match_backend: status_code = int(status_match_backend.group(1))
+    elif status_match_non_json: status_code = int(status_match_non_json.group(1))
+    elif "timed out" in str(error): status_code = 504
+    return status_code
 # --------------------------------------------------
 
-@functions_framework.http
-def foncorp_cff_gateway(request: flask.Request) -> flask.Response:
+# --- Idempotency keys and in-flight coalescing --- 
+# Duplicate POSTs (double clicks, retried server actions) attach to the in-flight turn or
+# replay its recent result instead of running another LLM turn. Keys come from the
+# Idempotency-Key header / "idempotencyKey" field, or are derived from agentId+sessionId+message.
+# Derived keys get a short TTL: the same text can legitimately be sent again later ("sí").
+IDEMPOTENCY_TTL_SECONDS = float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "600"))
+IDEMPOTENCY_DERIVED_TTL_SECONDS = float(os.environ.get("IDEMPOTENCY_DERIVED_TTL_SECONDS", "15"))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "1000"))
+
+def idempotency_key_for(request, data, agent_id, session_id):
+    """Returns (cache_key, ttl_seconds), or None when the request cannot be safely deduplicated.
+       Without a client key, only turns on an existing session are deduplicated: first
+       messages from different users would otherwise collide on common greetings.
+    """
+    client_key = request.headers.get('Idempotency-Key') or data.get('idempotencyKey')
+    if client_key:
+        return f"client:{agent_id}:{client_key}", IDEMPOTENCY_TTL_SECONDS
+    if not session_id: return None
+    digest = hashlib.sha256("\x00".join([agent_id, session_id, data.get('message', '')]).encode("utf-8")).hexdigest()
+    return f"derived:{digest}", IDEMPOTENCY_DERIVED_TTL_SECONDS
+
+class _InflightTurn:
+    __slots__ = ("done", "result")
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+class IdempotencyCache:
+    """Coalesces concurrent calls per key and replays completed results from a bounded TTL+LRU map.
+       Only results with a status below 500 are kept, so transient backend failures can be retried.
+    """
+    def __init__(self, max_entries):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._results = collections.OrderedDict()  # key -> (expires_at, (body, status))
+        self._counters = {"executed": 0, "coalesced": 0, "replayed": 0}
+
+    def run(self, key_and_ttl, fn):
+        """Returns (fn-style result, origin) where origin is executed/coalesced/replayed."""
+        key, ttl_seconds = key_and_ttl
+        with self._lock:
+            cached = self._replay_locked(key)
+            if cached is not None: return cached, "replayed"
+            inflight = self._inflight.get(key)
+            is_leader = inflight is None
+            if is_leader: inflight = self._inflight[key] = _InflightTurn()
+
+        if not is_leader:
+            inflight.done.wait(timeout=GATEWAY_LATENCY_BUDGET_SECONDS + 5)
+            if inflight.result is not None:
+                with self._lock: self._counters["coalesced"] += 1
+                return inflight.result, "coalesced"
+            # The leader crashed or is stuck: run independently rather than fail the duplicate
+            return fn(), "executed"
+
+        try:
+            result = fn()
+            inflight.result = result
+            return result, "executed"
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                self._store_locked(key, ttl_seconds, inflight.result)
+            inflight.done.set()
+
+    def _replay_locked(self, key):
+        cached = self._results.get(key)
+        if not cached or cached[0] <= time.monotonic(): return None
+        self._results.move_to_end(key)
+        self._counters["replayed"] += 1
+        return cached[1]
+
+    def _store_locked(self, key, ttl_seconds, result):
+        self._counters["executed"] += 1
+        if result is not None and result[1] < 500:
+            self._results[key] = (time.monotonic() + ttl_seconds, result)
+            self._results.move_to_end(key)
+            while len(self._results) > self._max_entries: self._results.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, cached_results=len(self._results), in_flight=len(self._inflight))
+
+_idempotency_cache = IdempotencyCache(IDEMPOTENCY_CACHE_SIZE)
+
+def get_idempotency_stats():
+    return _idempotency_cache.stats()
+# --------------------------------------------------
+
+# --- Gateway stats (GET .../stats, disabled unless ENABLE_STATS_ENDPOINT=true) ---
+ENABLE_STATS_ENDPOINT = os.environ.get("ENABLE_STATS_ENDPOINT", "false").lower() == "true"
+STATS_PROVIDERS = {
+    "id_token_cache": get_id_token_cache_stats,
+    "adk_transport": get_adk_transport_stats,
+    "session_pools": get_session_pool_stats,
+    "latency_ms": dump_latency_histograms,
+    "circuit_breakers": get_circuit_breaker_stats,
+    "hedging": get_hedge_stats,
+    "idempotency": get_idempotency_stats,
+}
+
+def collect_gateway_stats():
+    return {name: provider() for name, provider in STATS_PROVIDERS.items()}
+# --------------------------------------------------
+
+def _http_entry_point(function):
+    """functions_framework.http when the Functions Framework is the one loading this module.
+    Without it the function is returned as is (HTTP is also the framework's default signature type)."""
+    framework = sys.modules.get("functions_framework")
+    return framework.http(function) if framework else function
+
+@_http_entry_point
+def foncorp_cff_gateway(request: "flask.Request") -> "flask.Response":
+    import flask
+    timer = StageTimer()
+    sample_payload_logging()
+    request_log = {"agent_id": None, "session_mode": None, "stream": False, "idempotency": None}
+    response = flask.make_response(_process_gateway_request(request, timer, request_log))
+    if request.method != 'POST': return response
+
+    # Server-Timing header + one structured log line per request (for streams: time until headers)
+    response.headers['Server-Timing'] = timer.server_timing_header()
+    response.headers['Timing-Allow-Origin'] = '*'
+    # Replayed/coalesced duplicates did no backend work and would skew the histograms
+    if request_log["agent_id"] and request_log["idempotency"] in (None, "executed"):
+        _latency_recorder.record(request_log["agent_id"], dict(timer.timings_ms, total=timer.total_ms()))
+    # Printed as JSON so Cloud Logging ingests it as a structured entry
+    print(json.dumps({
+        "severity": "INFO",
+        "message": "gateway_request",
+        "agent_id": request_log["agent_id"],
+        "session_mode": request_log["session_mode"],
+        "stream": request_log["stream"],
+        "idempotency": request_log["idempotency"],
+        "status": response.status_code,
+        "timings_ms": {name: round(duration, 1) for name, duration in timer.timings_ms.items()},
+        "total_ms": round(timer.total_ms(), 1),
+    }), flush=True)
+    return response
+
+def _process_gateway_request(request, timer, request_log):
+    import flask
     cors_headers = {
         'Access-Control-Allow-Origin': '*', 
         'Access-Control-Allow-Methods': 'POST, OPTIONS',
-        'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+        'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Latency-Budget-Ms, Idempotency-Key',
     }
     if request.method == 'OPTIONS': return ('', 204, cors_headers)
     response_headers = cors_headers.copy()
     response_headers['Content-Type'] = 'application/json'
+    if request.method == 'GET' and ENABLE_STATS_ENDPOINT and request.path.rstrip('/').endswith('/stats'):
+        return flask.make_response(json.dumps(collect_gateway_stats()), 200, response_headers)
     if request.method != 'POST': return flask.make_response(json.dumps({'error': 'Method Not Allowed'}), 405, response_headers)
 
-    processed_adk_data = None 
-    session_id_to_return = None
+    request_started_at = time.monotonic()
 
     try:
         data = request.get_json(silent=True)
         if not data: return flask.make_response(json.dumps({'error': 'Request body must be valid JSON'}), 400, response_headers)
+        deadline = Deadline.from_request(request, data)
         message_from_frontend = data.get('message')
         agent_id_from_frontend = data.get('agentId')
         session_id_from_frontend = data.get('sessionId')
-        logging.info(f"Received request for agentId: {agent_id_from_frontend}, sessionId: {session_id_from_frontend}")
+        # Streaming is opt-in: {"stream": true} or an `Accept: text/event-stream` header
+        stream_requested = data.get('stream') is True or 'text/event-stream' in request.headers.get('Accept', '')
+        logging.info("Received request for agentId: %s, sessionId: %s", agent_id_from_frontend, session_id_from_frontend)
+        request_log["stream"] = stream_requested
         if not message_from_frontend or not agent_id_from_frontend:
             missing_fields = []
             if not message_from_frontend: missing_fields.append('message')
@@ -215,111 +1153,86 @@ def foncorp_cff_gateway(request: flask.Request) -> flask.Response:
             logging.error(error_msg)
             return flask.make_response(json.dumps({'error': error_msg}), 404, response_headers)
         
+        request_log["agent_id"] = agent_id_from_frontend
         target_base_url = agent_conf["url"]
         adk_app_name = agent_conf["app_name"]
         adk_user_id = "gateway_user" # Keep using gateway_user unless proven problematic
 
-        auth_token = get_google_id_token(target_base_url)
-        if not auth_token: logging.warning(f"Could not obtain ID token for {target_base_url}. Calling without auth.")
-
-        if session_id_from_frontend:
-            # --- Case 1: Existing Session --- 
-            session_id_to_return = session_id_from_frontend
-            target_url = f"{target_base_url.rstrip('/')}/run"
-            # Payload for /run - MATCHING ADK WEB UI PAYLOAD
-            payload = {
-                "app_name": adk_app_name,
-                "user_id": adk_user_id, # Using gateway_user ID
-                "session_id": session_id_to_return,
-                "new_message": { 
-                    "role": "user", # Added role
-                    "parts": [{"text": message_from_frontend}] 
-                },
-                "streaming": False # Added streaming flag
-            }
-            logging.info(f"Calling ADK /run for existing session {session_id_to_return}")
-            raw_adk_response = call_adk_endpoint(target_url, payload, auth_token)
+        def execute_turn():
+            """Runs the turn; returns a streaming flask.Response or ({response, error, session_id}, status)."""
+            try:
+                with timer.stage("token"):
+                    auth_token = get_google_id_token(target_base_url)
+                if not auth_token: logging.warning("Could not obtain ID token for %s. Calling without auth.", target_base_url)
 
+                def start_turn(session_id):
+                    # Call /run (or /run_sse when the client asked for a stream) with the session ID
+                    if stream_requested:
+                        sse_url = f"{target_base_url.rstrip('/')}/run_sse"
+                        sse_payload = _build_run_payload(adk_app_name, adk_user_id, session_id, message_from_frontend, streaming=True)
+                        sse_response = open_adk_event_stream(sse_url, sse_payload, auth_token, timer=timer, deadline=deadline)
+                        stream_headers = cors_headers.copy()
+                        stream_headers.update({'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+                        return flask.Response(relay_adk_stream(sse_response, session_id, request_started_at), 200, stream_headers)
+                    run_url = f"{target_base_url.rstrip('/')}/run"
+                    run_payload = _build_run_payload(adk_app_name, adk_user_id, session_id, message_from_frontend)
+                    logging.info("Calling ADK /run for session %s", session_id)
+                    return call_adk_endpoint(run_url, run_payload, auth_token, timer=timer, stage="run", deadline=deadline)
+
+                if session_id_from_frontend:
+                    # --- Case 1: Existing Session --- 
+                    session_id_to_return = session_id_from_frontend
+                    request_log["session_mode"] = "existing"
+                    turn_result = start_turn(session_id_to_return)
+
+                else:
+                    # --- Case 2: New Session (pooled session, or create_session + /run) --- 
+                    session_pool = get_session_pool(agent_id_from_frontend, agent_conf, adk_user_id)
+                    with timer.stage("session_pool"):
+                        session_id_to_return = session_pool.acquire() if session_pool else None
+                    if session_id_to_return:
+                        request_log["session_mode"] = "pooled"
+                        logging.info("Using pre-created session %s from pool", session_id_to_return)
+                        try:
+                            turn_result = start_turn(session_id_to_return)
+                        except ValueError as ve:
+                            # The backend may have lost the pooled session (e.g. a new revision); fall back once
+                            if "Backend error (404)" not in str(ve): raise
+                            logging.warning("Pooled session %s not found on backend, creating a new one", session_id_to_return)
+                            session_id_to_return = None
+                    if not session_id_to_return:
+                        logging.info("Calling ADK create_session...")
+                        request_log["session_mode"] = "created"
+                        session_id_to_return = create_adk_session(target_base_url, adk_app_name, adk_user_id, auth_token, timer=timer, deadline=deadline, agent_id=agent_id_from_frontend)
+                        logging.info("Created new session: %s", session_id_to_return)
+                        turn_result = start_turn(session_id_to_return)
+
+                if isinstance(turn_result, flask.Response): return turn_result
+                raw_adk_response = turn_result
+
+                # --- Handle list/dict response from ADK call --- 
+                processed_adk_data = normalize_adk_response(raw_adk_response)
+                return build_frontend_payload(processed_adk_data, session_id_to_return, timer)
+            except ValueError as ve:
+                logging.error("ValueError during ADK interaction: %s", ve)
+                return {'error': str(ve)}, status_code_for_error(ve)
+
+        idempotency_key = None if stream_requested else idempotency_key_for(request, data, agent_id_from_frontend, session_id_from_frontend)
+        if idempotency_key:
+            (frontend_payload, status_code), origin = _idempotency_cache.run(idempotency_key, execute_turn)
+            request_log["idempotency"] = origin
+            if origin != "executed": logging.info("Idempotency key %s: %s result", idempotency_key[0][:16], origin)
+            response_headers['Idempotency-Status'] = origin
         else:
-            # --- Case 2: New Session (Two-step process) --- 
-            # 1. Call create_session endpoint with empty payload
-            create_session_url = f"{target_base_url.rstrip('/')}/apps/{adk_app_name}/users/{adk_user_id}/sessions"
-            create_payload = {} 
-            logging.info(f"Calling ADK create_session...")
-            create_response_data = call_adk_endpoint(create_session_url, create_payload, auth_token)
-            
-            if not isinstance(create_response_data, dict):
-                 logging.error(f"Create session call returned non-dict: {type(create_response_data)}")
-                 raise ValueError("Failed to create session: Invalid response from ADK.")
-            new_session_id = create_response_data.get("id")
-            if not new_session_id:
-                 logging.error(f"Could not get session ID from create_session response: {create_response_data}")
-                 raise ValueError("Failed to create session: No ID returned.")
-            session_id_to_return = new_session_id
-            logging.info(f"Created new session: {session_id_to_return}")
-
-            # 2. Call /run endpoint with the new session ID - MATCHING ADK WEB UI PAYLOAD
-            run_url = f"{target_base_url.rstrip('/')}/run"
-            run_payload = {
-                "app_name": adk_app_name,
-                "user_id": adk_user_id, # Using gateway_user ID
-                "session_id": session_id_to_return, 
-                "new_message": { 
-                    "role": "user", # Added role
-                    "parts": [{"text": message_from_frontend}] 
-                },
-                "streaming": False # Added streaming flag
-            }
-            logging.info(f"Calling ADK /run for newly created session {session_id_to_return}")
-            raw_adk_response = call_adk_endpoint(run_url, run_payload, auth_token)
-        
-        # --- Handle list/dict response from ADK call --- 
-        logging.info(f"Raw data received from call_adk_endpoint: type={type(raw_adk_response)}, value={str(raw_adk_response)[:500]}")
-        if isinstance(raw_adk_response, list):
-            if len(raw_adk_response) > 0 and isinstance(raw_adk_response[0], dict):
-                logging.info("ADK response was a list, using the first element.")
-                processed_adk_data = raw_adk_response[0]
-            else:
-                logging.error(f"ADK response was a list but empty or first element not a dict: {raw_adk_response}")
-                raise ValueError("Internal Gateway Error: Received invalid list structure from ADK.")
-        elif isinstance(raw_adk_response, dict):
-             processed_adk_data = raw_adk_response
-        elif raw_adk_response is None: # Handle None returned by call_adk_endpoint on JSONDecodeError
-             raise ValueError("Internal Gateway Error: ADK did not return valid JSON.")
-        else:
-             logging.error(f"Unexpected data type received from call_adk_endpoint: {type(raw_adk_response)}")
-             raise ValueError("Internal Gateway Error: Unexpected response type from ADK.")
-
-        formatted_data = format_response_for_frontend(processed_adk_data, session_id_to_return)
-        logging.info(f"Final data being sent to frontend: {formatted_data}") # Enhanced logging
-
-        if formatted_data["error"] and not formatted_data["response"]:
-             logging.error(f"Error formatting ADK response: {formatted_data['error']}")
-             error_msg = formatted_data["error"]
-             if "ADK Error:" in error_msg: pass
-             else: error_msg = "Gateway could not process agent response."
-             return flask.make_response(json.dumps({"error": error_msg}), 502, response_headers)
-        
-        # Ensure we always send a valid JSON structure back
-        final_payload_to_frontend = {
-            "response": formatted_data.get("response"),
-            "error": formatted_data.get("error"),
-            "session_id": formatted_data.get("session_id")
-        }
-        response = flask.make_response(json.dumps(final_payload_to_frontend), 200)
-        response.headers = response_headers
-        return response
+            turn_result = execute_turn()
+            if isinstance(turn_result, flask.Response): return turn_result
+            frontend_payload, status_code = turn_result
+        return flask.make_response(json.dumps(frontend_payload), status_code, response_headers)
 
     # --- Global Error Handling --- 
     except ValueError as ve:
-        logging.error(f"ValueError during ADK interaction: {ve}")
-        status_match_backend = re.search(r"Backend error \((\d{3})\):", str(ve))
-        status_match_non_json = re.search(r"\(Status (\d{3})\)\.", str(ve))
-        status_code = 502
-        if status_match_backend: status_code = int(status_match_backend.group(1))
-        elif status_match_non_json: status_code = int(status_match_non_json.group(1))
-        elif "timed out" in str(ve): status_code = 504
-        return flask.make_response(json.dumps({'error': str(ve)}), status_code, response_headers)
+        logging.error("ValueError during ADK interaction: %s", ve)
+        return flask.make_response(json.dumps({'error': str(ve)}), status_code_for_error(ve), response_headers)
     except Exception as e:
-        logging.exception(f"Unexpected error processing request: {e}")
+        logging.exception("Unexpected error processing request: %s", e)
         return flask.make_response(json.dumps({'error': 'Internal server error in gateway'}), 500, response_headers)
@@ -0,0 +1,9 @@
+source .env
+# Async engine (async_gateway.py) on Cloud Run: one instance serves many in-flight conversations
+gcloud run deploy foncorp-async-gateway \
+  --source ./cff-gateway/ \
+  --region $GOOGLE_CLOUD_LOCATION \
+  --allow-unauthenticated \
+  --concurrency 250 \
+  --set-build-env-vars=GOOGLE_ENTRYPOINT="gunicorn 'async_gateway:create_app()' --bind :\$PORT --worker-class aiohttp.GunicornWebWorker" \
+  --set-env-vars=TRAVEL_AGENT_URL=$TRAVEL_AGENT_URL